@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Событийный движок достижений.
+
+Правила индексируются по полям состояния игрока, за которыми они следят
+(balance, level, businesses). GameDatabase сообщает, какие поля изменил каждый
+метод записи (subscribe_player_changes), и движок проверяет только правила этих
+полей и только еще не полученные игроком. Если таких правил нет, база не
+читается вовсе. Награды пишутся INSERT OR IGNORE по уникальному индексу
+(user_id, title), поэтому повторная выдача ничего не добавляет.
+
+Полученные достижения кэшируются для max_cached последних активных игроков
+(LRU): вытесненный игрок перечитывается одним запросом при следующем событии.
+События приходят и из потоков (pvp_queue пишет бои через asyncio.to_thread),
+поэтому кэш меняется под threading.Lock.
+
+Существующим игрокам достижения выдаются одним INSERT ... SELECT на правило:
+python achievements.py --db game.db
+"""
+
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set
+
+from database import GameDatabase
+
+
+class AchievementRule:
+    """Достижение выдается, когда все поля состояния не меньше порогов"""
+
+    def __init__(self, achievement_type: str, title: str, description: str, thresholds: Dict[str, float]):
+        self.type = achievement_type
+        self.title = title
+        self.description = description
+        self.thresholds = thresholds
+
+    def matches(self, state: Dict[str, float]) -> bool:
+        return all(state.get(field, 0) >= value for field, value in self.thresholds.items())
+
+    def as_dict(self) -> Dict:
+        return {'type': self.type, 'title': self.title, 'description': self.description}
+
+
+ACHIEVEMENT_RULES = [
+    AchievementRule('balance', 'Миллионер', 'Достиг баланса в 1,000,000 ₽', {'balance': 1000000, 'level': 5}),
+    AchievementRule('balance', 'Сотня тысяч', 'Достиг баланса в 100,000 ₽', {'balance': 100000}),
+    AchievementRule('businesses', 'Бизнес-магнат', 'Владеете 5+ бизнесами', {'businesses': 5}),
+    AchievementRule('businesses', 'Империя', 'Владеете 10+ бизнесами', {'businesses': 10}),
+    AchievementRule('level', 'Эксперт', 'Достигли 10 уровня', {'level': 10}),
+]
+
+
+class AchievementEngine:
+    """Проверка достижений по событиям изменения игроков"""
+
+    def __init__(self, db: GameDatabase, rules: Iterable[AchievementRule] = ACHIEVEMENT_RULES,
+                 max_cached: int = 10000):
+        self.db = db
+        self.max_cached = max_cached
+        self.rules = list(rules)
+        self._by_field: Dict[str, List[AchievementRule]] = {}
+        for rule in self.rules:
+            for field in rule.thresholds:
+                self._by_field.setdefault(field, []).append(rule)
+        # Уже полученные достижения (LRU): загружаются при первом событии игрока
+        self._awarded: 'OrderedDict[int, Set[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Метрики
+        self.events = 0
+        self.evaluations = 0
+        self.awarded = 0
+        db.subscribe_player_changes(self.on_player_changed)
+
+    def _earned(self, user_id: int) -> Set[str]:
+        with self._lock:
+            earned = self._awarded.get(user_id)
+            if earned is not None:
+                self._awarded.move_to_end(user_id)
+                return earned
+        # База читается без блокировки: другие потоки не ждут запроса
+        loaded = {a['title'] for a in self.db.get_player_achievements(user_id)}
+        with self._lock:
+            # Пока шел запрос, того же игрока мог загрузить другой поток
+            earned = self._awarded.setdefault(user_id, loaded)
+            self._awarded.move_to_end(user_id)
+            while len(self._awarded) > self.max_cached:
+                self._awarded.popitem(last=False)
+        return earned
+
+    def on_player_changed(self, user_id: int, fields: Iterable[str] = ()):
+        if 'deleted' in fields:
+            with self._lock:
+                self._awarded.pop(user_id, None)
+            return
+        rules = {rule.title: rule for field in fields for rule in self._by_field.get(field, ())}
+        if not rules:
+            return
+        self.events += 1
+        self._award(user_id, rules.values())
+
+    def evaluate(self, user_id: int) -> List[Dict]:
+        """Проверить все правила игрока; возвращает только что выданные достижения.
+
+        Для скриптов и проверок: бот выдает достижения по событиям и backfill.
+        """
+        return self._award(user_id, self.rules)
+
+    def _award(self, user_id: int, rules: Iterable[AchievementRule]) -> List[Dict]:
+        earned = self._earned(user_id)
+        pending = [rule for rule in rules if rule.title not in earned]
+        if not pending:
+            return []
+        self.evaluations += 1
+        state = self.db.get_achievement_state(user_id)
+        if state is None:
+            return []
+        new = [rule.as_dict() for rule in pending if rule.matches(state)]
+        if new:
+            inserted = self.db.award_achievements(user_id, new)
+            earned.update(a['title'] for a in new)
+            new = [a for a in new if a['title'] in inserted]
+            self.awarded += len(new)
+        return new
+
+    def backfill(self) -> int:
+        """Выдать достижения всем подходящим игрокам; возвращает число новых записей"""
+        added = self.db.backfill_achievements([(rule.as_dict(), rule.thresholds) for rule in self.rules])
+        with self._lock:
+            self._awarded.clear()
+        return added
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_achievement_events_total', {}, self.events),
+            ('bot_achievement_evaluations_total', {}, self.evaluations),
+            ('bot_achievements_awarded_total', {}, self.awarded),
+            ('bot_achievement_cache_size', {}, len(self._awarded)),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='game.db', help='файл базы')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    added = AchievementEngine(GameDatabase(args.db)).backfill()
+    print(f"Выдано достижений: {added:,} за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == '__main__':
+    main()
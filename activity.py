@@ -0,0 +1,159 @@
+"""
+Учет активности игроков.
+
+Раньше каждое изменение баланса, опыта или популярности заодно переписывало
+players.last_active, а просмотр меню без начислений активность не отмечал вовсе.
+Теперь ActivityTracker — outer-middleware на dp.update — запоминает в памяти
+время последнего обновления каждого игрока, а раз в ACTIVITY_FLUSH_SECONDS
+секунд и при остановке бота записывает накопленное одной транзакцией
+(GameDatabase.record_activity): одна строка players на игрока за период, сколько
+бы нажатий он ни сделал.
+
+Та же запись добавляет пару (день, user_id) в player_activity — не больше одной
+на игрока в сутки (дни UTC, как CURRENT_TIMESTAMP). Из нее раз в stats_interval
+секунд считаются DAU и WAU; строки старше недели удаляются при смене дня.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import ACTIVITY_FLUSH_SECONDS
+from database import GameDatabase
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+WEEK_DAYS = 7
+
+
+def _utc_day(ts: float) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(ts))
+
+
+class ActivityTracker(BaseMiddleware):
+    """Время последней активности игроков с пакетной записью в базу, DAU и WAU.
+
+    Регистрируется как outer-middleware на dp.update, после встроенного
+    UserContextMiddleware (он кладет в data 'event_from_user').
+    """
+
+    def __init__(self, db: GameDatabase, flush_interval: float = ACTIVITY_FLUSH_SECONDS,
+                 stats_interval: float = 60.0, clock: Callable[[], float] = time.time):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.stats_interval = stats_interval
+        self.clock = clock
+        # user_id -> время последнего обновления, еще не записанное в базу
+        self._last_seen: Dict[int, float] = {}
+        # Игроки, чей текущий день уже записан в player_activity
+        self._day: Optional[str] = None
+        self._day_recorded: Set[int] = set()
+        self._stats_at = 0.0
+        self._worker: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        # Метрики
+        self.touches = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dau = 0
+        self.wau = 0
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get('event_from_user')
+        if user is not None:
+            self.touch(user.id)
+        return await handler(event, data)
+
+    def touch(self, user_id: int):
+        """Отметить активность игрока сейчас; в базу попадет при следующей записи"""
+        self._last_seen[user_id] = self.clock()
+        self.touches += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._last_seen)
+
+    async def flush(self) -> int:
+        """Записать накопленное; возвращает число обновленных строк players"""
+        async with self._lock:
+            batch, self._last_seen = self._last_seen, {}
+            now = self.clock()
+            today = _utc_day(now)
+            prune_before = None
+            if today != self._day:
+                self._day, self._day_recorded = today, set()
+                prune_before = _utc_day(now - WEEK_DAYS * DAY_SECONDS)
+            last_seen = [(time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)), user_id)
+                         for user_id, ts in batch.items()]
+            new_days = [user_id for user_id, ts in batch.items()
+                        if user_id not in self._day_recorded and _utc_day(ts) == today]
+            days = [(_utc_day(ts), user_id) for user_id, ts in batch.items() if _utc_day(ts) != today]
+            days += [(today, user_id) for user_id in new_days]
+            if batch or prune_before is not None:
+                updated = await asyncio.to_thread(self.db.record_activity, last_seen, days, prune_before)
+                if updated is None:
+                    # Вернуть непринятое, не затирая более свежие отметки
+                    for user_id, ts in batch.items():
+                        if self._last_seen.get(user_id, 0.0) < ts:
+                            self._last_seen[user_id] = ts
+                    self._day = None
+                    self.failed_flushes += 1
+                    return 0
+                self._day_recorded.update(new_days)
+                self.rows_written += updated
+                self.flushes += 1
+            else:
+                updated = 0
+            if now >= self._stats_at:
+                await self.refresh_stats()
+            return updated
+
+    async def refresh_stats(self):
+        """Пересчитать DAU (сегодня, UTC) и WAU (последние 7 дней)"""
+        now = self.clock()
+        self.dau = await asyncio.to_thread(self.db.count_active_players, _utc_day(now))
+        self.wau = await asyncio.to_thread(self.db.count_active_players,
+                                           _utc_day(now - (WEEK_DAYS - 1) * DAY_SECONDS))
+        self._stats_at = now + self.stats_interval
+
+    async def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Запись активности не удалась: {e!r}")
+
+    async def close(self):
+        """Остановить периодическую запись и записать остаток"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_activity_touches_total', {}, self.touches),
+            ('bot_activity_rows_written_total', {}, self.rows_written),
+            ('bot_activity_flushes_total', {}, self.flushes),
+            ('bot_activity_failed_flushes_total', {}, self.failed_flushes),
+            ('bot_activity_pending', {}, self.pending),
+            ('bot_active_players', {'period': 'day'}, self.dau),
+            ('bot_active_players', {'period': 'week'}, self.wau),
+        ]
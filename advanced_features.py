@@ -3,6 +3,19 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from config import BUSINESS_TYPES
 
+# Посетители: диапазон трат по типу бизнеса, доля оставляющих отзыв, веса оценок 1-5
+SPEND_RANGES = {
+    'coffee_shop': (200, 800),
+    'restaurant': (800, 3000),
+    'factory': (2000, 6000),
+    'it_startup': (1000, 5000),
+    'farm': (150, 600)
+}
+DEFAULT_SPEND_RANGE = (300, 1500)
+REVIEW_PROBABILITY = 0.4
+REVIEW_RATING_WEIGHTS = (8, 10, 20, 30, 32)
+REVIEW_SUFFIXES = ["", " Спасибо персоналу!", " Обязательно порекомендую друзьям.", " Приду еще.", " Возможно, вернусь."]
+
 class AdvancedGameFeatures:
     def __init__(self):
         self.loan_rates = {
@@ -296,7 +309,7 @@ class AdvancedGameFeatures:
 
     def generate_review(self) -> dict:
         """Генерация случайного отзыва: рейтинг 1-5 и текст по шаблону."""
-        rating = random.choices([1, 2, 3, 4, 5], weights=[8, 10, 20, 30, 32])[0]
+        rating = random.choices([1, 2, 3, 4, 5], weights=REVIEW_RATING_WEIGHTS)[0]
         if rating >= 4:
             text = random.choice(self.review_templates_positive)
         elif rating == 3:
@@ -304,10 +317,7 @@ class AdvancedGameFeatures:
         else:
             text = random.choice(self.review_templates_negative)
         # Небольшие вариации текста
-        suffixes = [
-            "", " Спасибо персоналу!", " Обязательно порекомендую друзьям.", " Приду еще.", " Возможно, вернусь."
-        ]
-        text = text + random.choice(suffixes)
+        text = text + random.choice(REVIEW_SUFFIXES)
         return { 'rating': rating, 'text': text }
 
     def simulate_visitors(self, business: Dict, max_visitors: int = 10) -> List[Dict]:
@@ -321,20 +331,13 @@ class AdvancedGameFeatures:
         except Exception:
             pop_factor = 1.0
         count = max(1, min(max_visitors, int(random.gauss(base * pop_factor, 2)) ))
+        # Траты зависят от типа бизнеса (для многих бизнесов сразу — visitor_sim.VisitorSimulator)
+        base_spend = SPEND_RANGES.get(business.get('business_type'), DEFAULT_SPEND_RANGE)
         for _ in range(count):
             name = self.generate_full_name()
-            # Траты зависят от типа бизнеса
-            btype = business.get('business_type')
-            base_spend = {
-                'coffee_shop': (200, 800),
-                'restaurant': (800, 3000),
-                'factory': (2000, 6000),
-                'it_startup': (1000, 5000),
-                'farm': (150, 600)
-            }.get(btype, (300, 1500))
             spent = float(random.randint(*base_spend))
             # Не каждый посетитель оставляет отзыв
-            leave_review = random.random() < 0.4
+            leave_review = random.random() < REVIEW_PROBABILITY
             review = None
             if leave_review:
                 review = self.generate_review()
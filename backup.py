@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Резервные копии game.db на ходу.
+
+Копировать файл базы, пока бот пишет в нее, нельзя: копия может захватить
+половину транзакции. BackupManager копирует базу через sqlite3.Connection.backup
+порциями по pages страниц с паузой pause между ними — блокировка чтения
+держится только на время одной порции, и обработчики игроков успевают
+записать свое. Запись в базу из другого соединения начинает копирование
+заново; после max_restarts таких перезапусков остаток копируется одним шагом.
+
+Копия проверяется PRAGMA integrity_check, сжимается gzip в
+<имя>-<ГГГГММДД-ЧЧММССмс>.db.gz (время UTC) и хранится в BACKUP_DIR; снимки
+старше keep последних удаляются. Бот делает копию раз в BACKUP_INTERVAL_HOURS часов и по
+команде /backup.
+
+Восстановление (бот должен быть остановлен):
+python backup.py --restore backups/game-20260101-040000000.db.gz --db game.db
+
+Пример: python backup.py --db game.db --dir backups --keep 7 --pages 256
+"""
+
+import argparse
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import BACKUP_DIR, BACKUP_KEEP, GAME_DB_PATH
+
+
+class _Restarted(Exception):
+    """Копирование слишком часто начиналось заново из-за записи в базу"""
+
+
+def integrity_check(path: str) -> str:
+    """Результат PRAGMA integrity_check: 'ok' или описание первых ошибок"""
+    conn = sqlite3.connect(path)
+    try:
+        return '; '.join(row[0] for row in conn.execute('PRAGMA integrity_check(10)'))
+    finally:
+        conn.close()
+
+
+def _unpack(snapshot: str, directory: str) -> str:
+    """Распаковать снимок во временный файл в directory"""
+    fd, path = tempfile.mkstemp(suffix='.db', dir=directory)
+    with os.fdopen(fd, 'wb') as out, gzip.open(snapshot, 'rb') as src:
+        shutil.copyfileobj(src, out, 1 << 20)
+    return path
+
+
+def verify_snapshot(snapshot: str) -> str:
+    """integrity_check сжатого снимка"""
+    path = _unpack(snapshot, os.path.dirname(os.path.abspath(snapshot)))
+    try:
+        return integrity_check(path)
+    finally:
+        os.remove(path)
+
+
+def restore_snapshot(snapshot: str, target: str) -> Dict:
+    """Заменить содержимое базы target снимком (после проверки); бот должен быть остановлен"""
+    started = time.perf_counter()
+    path = _unpack(snapshot, os.path.dirname(os.path.abspath(target)))
+    try:
+        result = integrity_check(path)
+        if result != 'ok':
+            raise ValueError(f"Снимок {snapshot} поврежден: {result}")
+        src = sqlite3.connect(path)
+        dst = sqlite3.connect(target)
+        try:
+            # Один шаг: читатели target видят либо старую базу, либо восстановленную
+            src.backup(dst)
+            pages = dst.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            dst.close()
+            src.close()
+    finally:
+        os.remove(path)
+    return {'snapshot': snapshot, 'target': target, 'pages': pages, 'seconds': time.perf_counter() - started}
+
+
+class BackupManager:
+    """Снимки базы: копирование порциями, проверка, сжатие, ротация"""
+
+    def __init__(self, db_path: str = GAME_DB_PATH, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+                 pages: int = 256, pause: float = 0.005, max_restarts: int = 3):
+        if keep < 1:
+            raise ValueError("keep должен быть не меньше 1")
+        self.db_path = db_path
+        self.directory = directory
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.max_restarts = max_restarts
+        self._lock = threading.Lock()
+        # Метрики
+        self.completed = 0
+        self.failed = 0
+        self.last_report: Optional[Dict] = None
+
+    @property
+    def prefix(self) -> str:
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+
+    def snapshots(self) -> List[str]:
+        """Снимки этой базы, от старых к новым"""
+        return sorted(glob.glob(os.path.join(self.directory, f'{self.prefix}-*.db.gz')))
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self) -> Optional[Dict]:
+        """Сделать снимок (блокирующий вызов — из потока); None, если копия уже делается"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            report = self._run()
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._lock.release()
+        self.completed += 1
+        self.last_report = report
+        return report
+
+    def _run(self) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(now)) + f'{int(now * 1000) % 1000:03d}'
+        snapshot = os.path.join(self.directory, f'{self.prefix}-{stamp}.db.gz')
+        tmp = os.path.join(self.directory, f'.{self.prefix}-{stamp}.db.tmp')
+        report = {'snapshot': snapshot, 'pages': 0, 'steps': 0, 'restarts': 0, 'single_step': False}
+        try:
+            self._copy(tmp, report)
+            report['copy_seconds'] = time.perf_counter() - started
+            report['integrity'] = integrity_check(tmp)
+            if report['integrity'] != 'ok':
+                raise ValueError(f"Копия не прошла integrity_check: {report['integrity']}")
+            report['size'] = os.path.getsize(tmp)
+            with open(tmp, 'rb') as src, gzip.open(snapshot + '.part', 'wb', compresslevel=6) as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+            os.replace(snapshot + '.part', snapshot)
+        finally:
+            for path in (tmp, snapshot + '.part'):
+                if os.path.exists(path):
+                    os.remove(path)
+        report['compressed_size'] = os.path.getsize(snapshot)
+        report['removed'] = self._rotate()
+        report['seconds'] = time.perf_counter() - started
+        return report
+
+    def _copy(self, tmp: str, report: Dict):
+        state = {'remaining': None}
+
+        def progress(status, remaining, total):
+            report['steps'] += 1
+            report['pages'] = total
+            if state['remaining'] is not None and remaining > state['remaining']:
+                # Другое соединение изменило базу: копирование пошло с начала
+                report['restarts'] += 1
+                if report['restarts'] > self.max_restarts:
+                    raise _Restarted()
+            state['remaining'] = remaining
+            if remaining and self.pause:
+                time.sleep(self.pause)
+
+        src = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            dst = sqlite3.connect(tmp)
+            try:
+                try:
+                    src.backup(dst, pages=self.pages, progress=progress)
+                except _Restarted:
+                    # Под частой записью порции не успевают: остаток — одним шагом
+                    report['single_step'] = True
+                    src.backup(dst)
+                    report['pages'] = dst.execute('PRAGMA page_count').fetchone()[0]
+            finally:
+                dst.close()
+        finally:
+            src.close()
+
+    def _rotate(self) -> List[str]:
+        snapshots = self.snapshots()
+        removed = snapshots[:-self.keep]
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        last = self.last_report or {}
+        return [
+            ('bot_backups_total', {'result': 'ok'}, self.completed),
+            ('bot_backups_total', {'result': 'failed'}, self.failed),
+            ('bot_backup_last_seconds', {}, last.get('seconds', 0.0)),
+            ('bot_backup_last_pages', {}, last.get('pages', 0)),
+            ('bot_backup_last_bytes', {}, last.get('compressed_size', 0)),
+        ]
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"Снимок: {os.path.basename(report['snapshot'])}",
+        f"Скопировано страниц: {report['pages']:,} за {report['steps']} шагов"
+        + (f", перезапусков {report['restarts']}" if report['restarts'] else '')
+        + (" (остаток одним шагом)" if report['single_step'] else ''),
+        f"Проверка: {report['integrity']}",
+        f"Размер: {report['size'] / 2 ** 20:.1f} МБ, сжатый {report['compressed_size'] / 2 ** 20:.1f} МБ",
+        f"Время: копирование {report['copy_seconds']:.1f} с, всего {report['seconds']:.1f} с",
+    ]
+    if report['removed']:
+        lines.append(f"Удалено старых снимков: {len(report['removed'])}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=GAME_DB_PATH, help='файл базы')
+    parser.add_argument('--dir', default=BACKUP_DIR, help='каталог снимков')
+    parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='сколько последних снимков хранить')
+    parser.add_argument('--pages', type=int, default=256, help='страниц за один шаг копирования')
+    parser.add_argument('--pause', type=float, default=0.005, help='пауза между шагами, с')
+    parser.add_argument('--list', action='store_true', help='показать снимки')
+    parser.add_argument('--verify', metavar='SNAPSHOT', help='проверить снимок integrity_check')
+    parser.add_argument('--restore', metavar='SNAPSHOT', help='восстановить базу --db из снимка')
+    args = parser.parse_args()
+
+    manager = BackupManager(args.db, args.dir, args.keep, args.pages, args.pause)
+    if args.list:
+        for path in manager.snapshots():
+            print(f"{path}  {os.path.getsize(path) / 2 ** 20:.1f} МБ")
+    elif args.verify:
+        print(verify_snapshot(args.verify))
+    elif args.restore:
+        result = restore_snapshot(args.restore, args.db)
+        print(f"Восстановлено {result['pages']:,} страниц в {result['target']} за {result['seconds']:.1f} с")
+    else:
+        print(format_report(manager.run()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Проверка бенчмарков test_benchmarks.py на регрессии.
+
+Бенчмарки помечены bench и в обычный прогон pytest не входят (pytest.ini). Этот
+скрипт запускает их и сравнивает с базовой линией benchmarks/baseline.json: если
+минимальное время какого-либо бенчмарка выросло больше чем на --threshold процентов,
+pytest-benchmark сообщает о регрессии, и скрипт возвращает код 1.
+
+Порог по умолчанию (50%) рассчитан на общую машину, где время одних и тех же
+микробенчмарков гуляет на десятки процентов: он ловит двукратные замедления вроде
+потерянного индекса. На выделенном CI-раннере порог можно снизить (--threshold 15).
+
+Базовая линия зависит от машины: ее записывают на той же машине (или CI-раннере),
+где потом проверяют, флагом --save; файл коммитится вместе с изменением,
+которое честно меняет скорость.
+
+Пример: python bench_check.py
+        python bench_check.py --save
+        BENCH_SIZES=1000,100000 python bench_check.py --threshold 15
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import pytest
+from pytest_benchmark.session import PerformanceRegression
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+# Минимум меньше, чем среднее и медиана, зависит от соседних процессов
+FIELD = 'min'
+THRESHOLD = 50.0
+
+
+def pytest_args(baseline: str = BASELINE, threshold: float = THRESHOLD, save: bool = False) -> list:
+    args = ['-m', 'bench', 'test_benchmarks.py', '--benchmark-only', '-q']
+    if save:
+        os.makedirs(os.path.dirname(baseline), exist_ok=True)
+        return args + [f'--benchmark-json={baseline}']
+    if not os.path.exists(baseline):
+        raise FileNotFoundError(f"Нет базовой линии {baseline}: запишите ее через --save")
+    return args + [f'--benchmark-compare={baseline}', f'--benchmark-compare-fail={FIELD}:{threshold:g}%']
+
+
+def strip_samples(path: str):
+    """Убрать из базовой линии сырые замеры: для сравнения нужна только статистика"""
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    for bench in report['benchmarks']:
+        bench['stats'].pop('data', None)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=BASELINE, help='файл базовой линии (JSON pytest-benchmark)')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='допустимый рост минимального времени, %%')
+    parser.add_argument('--save', action='store_true', help='записать новую базовую линию вместо проверки')
+    args, extra = parser.parse_known_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        code = pytest.main(pytest_args(args.baseline, args.threshold, args.save) + extra)
+    except PerformanceRegression:
+        # Список регрессий pytest-benchmark уже напечатал
+        sys.exit(1)
+    if args.save and code == 0:
+        strip_samples(args.baseline)
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк отрисовки клавиатур bot.py: стоимость одного рендера без кэша и с кэшем.
+
+"Без кэша" — построение разметки через InlineKeyboardBuilder, как раньше на каждом
+нажатии; "с кэшем" — вызов get_*_keyboard, отдающий готовую разметку.
+
+Пример: python bench_keyboards.py --number 20000
+"""
+
+import argparse
+import timeit
+
+from loadtest import import_bot
+
+
+def cases(app):
+    """(название, без кэша, с кэшем)"""
+    business_ids = range(1, 201)
+    balances = (0, 5000, 20000, 100000)
+    management = app.get_business_management_keyboard
+    improvements = app._improvements_keyboard
+
+    def uncached_improvements(business_id, balance):
+        affordable = tuple(app.game_logic.can_afford_improvement(balance, i) for i in app.IMPROVEMENTS)
+        return improvements.__wrapped__(business_id, affordable)
+
+    state = {'i': 0}
+
+    def next_args():
+        state['i'] += 1
+        return business_ids[state['i'] % len(business_ids)], balances[state['i'] % len(balances)]
+
+    return [
+        ('main_menu', app._build_main_menu_keyboard, app.get_main_menu_keyboard),
+        ('business_choice', app._build_business_choice_keyboard, app.get_business_choice_keyboard),
+        ('business_management',
+         lambda: management.__wrapped__(next_args()[0]),
+         lambda: management(next_args()[0])),
+        ('improvements',
+         lambda: uncached_improvements(*next_args()),
+         lambda: app.get_improvements_keyboard(*next_args())),
+    ]
+
+
+def run(number: int = 10000):
+    """Возвращает [(название, мкс без кэша, мкс с кэшем)]"""
+    app = import_bot()
+    results = []
+    for name, uncached, cached in cases(app):
+        cached()  # прогрев кэша
+        before = min(timeit.repeat(uncached, number=number, repeat=3)) / number
+        after = min(timeit.repeat(cached, number=number, repeat=3)) / number
+        results.append((name, before * 1e6, after * 1e6))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10000, help='рендеров на замер')
+    args = parser.parse_args()
+    print(f"{'клавиатура':<22}{'без кэша, мкс':>15}{'с кэшем, мкс':>15}{'ускорение':>11}")
+    for name, before, after in run(args.number):
+        print(f"{name:<22}{before:>15.2f}{after:>15.2f}{before / after:>10.0f}x")
+
+
+if __name__ == '__main__':
+    main()
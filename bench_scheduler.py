@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк JobScheduler: сколько наступивших задач в секунду он выполняет.
+
+Во временную базу ставится --jobs задач. При --rate 0 все они уже наступили
+(накопленная очередь), иначе run_at равномерно распределены так, что наступает
+--rate задач в секунду. Обработчик ничего не делает и только замеряет задержку
+запуска относительно run_at; в отчете — задач в секунду и p50/p99/max задержки.
+
+Пример: python bench_scheduler.py --jobs 50000 --rate 10000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict
+
+from database import GameDatabase
+from scheduler import JobScheduler
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drain(scheduler: JobScheduler, total: int, lags: list, timeout: float) -> float:
+    """Выполнить total задач; возвращает время выполнения последней"""
+    done = asyncio.Event()
+
+    finished = []
+
+    def handler(job):
+        lags.append(time.time() - job.run_at)
+        if len(lags) >= total:
+            finished.append(time.time())
+            done.set()
+
+    scheduler.register('bench', handler)
+    await scheduler.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    finally:
+        await scheduler.close()
+    return finished[0]
+
+
+def run(jobs: int = 20000, rate: float = 0.0, batch_size: int = 1000, timeout: float = 120.0) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'bench.db'))
+        start = time.time() + (1.0 if rate else -1.0)
+        step = 1.0 / rate if rate else 0.0
+        db.schedule_jobs([('bench', start + i * step, None, None) for i in range(jobs)])
+        scheduler = JobScheduler(db, batch_size=batch_size)
+        lags = []
+        started = time.time()
+        finished = asyncio.run(_drain(scheduler, jobs, lags, timeout))
+        # Считаем от наступления первой задачи
+        elapsed = finished - max(started, start)
+        left = db.get_job_counts().get('pending', 0)
+    return {
+        'jobs': jobs,
+        'seconds': elapsed,
+        'jobs_per_second': jobs / elapsed if elapsed else 0.0,
+        'lag_p50': percentile(lags, 0.5),
+        'lag_p99': percentile(lags, 0.99),
+        'lag_max': max(lags) if lags else 0.0,
+        'batches': scheduler.batches,
+        'pending_left': left,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=50000, help='число задач')
+    parser.add_argument('--rate', type=float, default=0.0, help='задач в секунду по run_at (0 — все уже наступили)')
+    parser.add_argument('--batch', type=int, default=1000, help='размер пачки планировщика')
+    args = parser.parse_args()
+
+    report = run(args.jobs, args.rate, args.batch)
+    print(f"Задач: {report['jobs']:,} за {report['seconds']:.2f} с ({report['jobs_per_second']:,.0f}/с), "
+          f"пачек: {report['batches']}")
+    print(f"Задержка запуска: p50 {report['lag_p50'] * 1000:.0f} мс, p99 {report['lag_p99'] * 1000:.0f} мс, "
+          f"max {report['lag_max'] * 1000:.0f} мс")
+    print(f"Осталось в jobs: {report['pending_left']:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности: обновлений в секунду в режимах polling и webhook.
+
+Оба режима работают против локального фейкового Bot API (fake_telegram.py), обработчик
+отвечает на callback одним API-вызовом, как большинство кнопок бота.
+
+Пример: python bench_webhook.py --updates 2000 --concurrency 64 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router, types
+from aiohttp import web
+
+from fake_telegram import FakeTelegramAPI, make_callback_update
+from webhook import build_webhook_app
+
+TOKEN = '42:BENCHMARK'
+SECRET = 'bench-secret'
+
+
+def build_dispatcher(total: int, done: asyncio.Event, processed: list) -> Dispatcher:
+    router = Router()
+
+    @router.callback_query()
+    async def on_callback(callback: types.CallbackQuery):
+        await callback.answer()
+        processed[0] += 1
+        if processed[0] >= total:
+            done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def bench_polling(total: int, users: int, latency: float) -> float:
+    async with FakeTelegramAPI(latency=latency) as api:
+        bot = Bot(TOKEN, session=api.session())
+        done, processed = asyncio.Event(), [0]
+        dp = build_dispatcher(total, done, processed)
+        for i in range(total):
+            api.push_update(make_callback_update(i + 1, 1000 + i % users, 'ping'))
+        started = time.perf_counter()
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+        await done.wait()
+        elapsed = time.perf_counter() - started
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+    return total / elapsed
+
+
+async def bench_webhook(total: int, users: int, latency: float, concurrency: int) -> float:
+    async with FakeTelegramAPI(latency=latency) as api:
+        bot = Bot(TOKEN, session=api.session())
+        done, processed = asyncio.Event(), [0]
+        dp = build_dispatcher(total, done, processed)
+        runner = web.AppRunner(build_webhook_app(dp, bot, path='/webhook', secret=SECRET), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/webhook"
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with aiohttp.ClientSession() as client:
+            async def deliver(i: int):
+                async with semaphore:
+                    async with client.post(url, json=make_callback_update(i + 1, 1000 + i % users, 'ping'),
+                                           headers=headers) as resp:
+                        resp.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(deliver(i) for i in range(total)))
+            await done.wait()
+            elapsed = time.perf_counter() - started
+        await runner.cleanup()
+        await bot.session.close()
+    return total / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=2000, help='сколько обновлений прогнать в каждом режиме')
+    parser.add_argument('--users', type=int, default=200, help='число различных пользователей')
+    parser.add_argument('--concurrency', type=int, default=64, help='параллельных доставок webhook')
+    parser.add_argument('--latency', type=float, default=0.0, help='искусственная задержка ответа API, с')
+    args = parser.parse_args()
+
+    polling_rate = await bench_polling(args.updates, args.users, args.latency)
+    webhook_rate = await bench_webhook(args.updates, args.users, args.latency, args.concurrency)
+    print(f"polling: {polling_rate:8.0f} updates/s")
+    print(f"webhook: {webhook_rate:8.0f} updates/s")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -7,12 +7,33 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.client.session.base import BaseSession
 import html
-
-from config import BOT_TOKEN, BUSINESS_TYPES, IMPROVEMENTS, ADMIN_IDS, DONATE_URL
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from config import (BOT_TOKEN, BUSINESS_TYPES, IMPROVEMENTS, ADMIN_IDS, DONATE_URL, BOT_MODE,
+                    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT,
+                    HEALTH_PATH, TELEGRAM_API_URL, FSM_STORAGE, METRICS_PATH, GAME_DB_PATH,
+                    METRICS_HOST, METRICS_PORT, OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, VISITORS_RETENTION_DAYS,
+                    BACKUP_INTERVAL_HOURS)
 from database import GameDatabase
 from game_logic import GameLogic
 from advanced_features import AdvancedGameFeatures
+from achievements import AchievementEngine
+from matchmaking import MatchmakingIndex
+from pvp_queue import PvPQueue
+from scheduler import JobScheduler
+from notifier import ReadyNotifier
+from market_events import MarketEventEngine
+from activity import ActivityTracker
+from backup import BackupManager, format_report as format_backup_report
+from webhook import make_session, run_bot
+from fsm_storage import create_storage
+from middlewares import UserSerializationMiddleware
+from metrics import REGISTRY, APIMetricsMiddleware, perf_summary, setup_metrics
+from query_profiler import PROFILER
+from outbound import CallbackAnswerMiddleware, EditDedupMiddleware, EditDigestCache, OutboundLimiter
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -32,14 +53,89 @@ def safe_html_text(text: str) -> str:
     return text
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+bot = Bot(token=BOT_TOKEN, session=make_session(TELEGRAM_API_URL))
+dp = Dispatcher(storage=create_storage(FSM_STORAGE))
+# Обновления одного игрока выполняются по очереди, разных игроков — параллельно
+user_serialization = UserSerializationMiddleware()
+dp.update.outer_middleware(user_serialization)
+# Правки сообщений без изменений не отправляются в Telegram
+edit_dedup = EditDigestCache()
+dp.callback_query.outer_middleware(CallbackAnswerMiddleware(edit_dedup))
+# Лимиты частоты Telegram, повтор после 429, слияние правок одного сообщения
+outbound_limiter = OutboundLimiter(OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE)
+
+def setup_session(session: BaseSession):
+    """Middleware исходящих запросов бота (loadtest.py ставит их на сессию фейкового Bot API)"""
+    # Пропущенная правка не доходит до лимитера и не считается вызовом API
+    session.middleware(EditDedupMiddleware(edit_dedup))
+    session.middleware(outbound_limiter)
+    session.middleware(APIMetricsMiddleware())
+
+setup_session(bot.session)
+# Время обработчиков, БД и Telegram API: /metrics и /perf
+setup_metrics(dp)
+REGISTRY.add_collector(user_serialization.collect)
+REGISTRY.add_collector(edit_dedup.collect)
+REGISTRY.add_collector(outbound_limiter.collect)
 router = Router()
 
-# Инициализация базы данных и игровой логики
-db = GameDatabase()
-game_logic = GameLogic()
 advanced = AdvancedGameFeatures()
+# Обработчики задач планировщика: kind -> handler (регистрируются через job_handler)
+JOB_HANDLERS = {}
+
+def use_database(database: GameDatabase):
+    """Создать все объекты, работающие с базой игры, для database.
+
+    Обработчики обращаются к ним как к глобальным переменным модуля; loadtest.py
+    вызывает use_database с базой прогона вместо подмены объектов по одному.
+    """
+    global db, activity, market, game_logic, matchmaking, pvp_queue, achievement_engine
+    global scheduler, notifier, backups
+    db = database
+    # Последняя активность игроков и DAU/WAU: отметки копятся в памяти и пишутся пачкой
+    activity = ActivityTracker(db)
+    # Мировое рыночное событие: множители дохода и расходов для game_logic
+    market = MarketEventEngine(db, advanced)
+    game_logic = GameLogic(market)
+    # Соперники близкой силы для PvP: изменения игроков в db и периодическая перестройка (другие воркеры)
+    matchmaking = MatchmakingIndex(db, advanced._calculate_player_power)
+    # Очередь PvP-боев с пакетной записью в базу
+    pvp_queue = PvPQueue(db, advanced)
+    # Достижения выдаются по изменениям игроков в db, а не при каждом просмотре
+    achievement_engine = AchievementEngine(db)
+    # Отложенные задачи (таблица jobs)
+    scheduler = JobScheduler(db)
+    for kind, handler in JOB_HANDLERS.items():
+        scheduler.register(kind, handler)
+    # Сообщения о готовой продукции и созревших инвестициях (задачи scheduler)
+    notifier = ReadyNotifier(db, scheduler, bot)
+    # Снимки базы в BACKUP_DIR: задача backup раз в BACKUP_INTERVAL_HOURS часов и команда /backup
+    backups = BackupManager(db.db_path)
+
+def job_handler(kind: str):
+    """Декоратор обработчика задачи: регистрируется в текущем scheduler и в каждом следующем"""
+    def decorator(handler):
+        JOB_HANDLERS[kind] = handler
+        scheduler.register(kind, handler)
+        return handler
+    return decorator
+
+def collect_services():
+    """Метрики объектов use_database (текущих, после любой замены базы)"""
+    return [metric for service in (activity, market, pvp_queue, achievement_engine, scheduler, notifier, backups)
+            for metric in service.collect()]
+
+async def track_activity(handler, event, data):
+    return await activity(handler, event, data)
+
+use_database(GameDatabase(GAME_DB_PATH))
+dp.update.outer_middleware(track_activity)
+REGISTRY.add_collector(collect_services)
+# Сотрудников в списке emp_menu и час ночного обслуживания базы (сверка зарплат, сжатие visitors)
+EMPLOYEES_SHOWN = 20
+MAINTENANCE_HOUR = 4
+# Период пересчета стоимости активных инвестиций, с
+INVESTMENT_PRICE_INTERVAL = 600
 
 # Состояния FSM
 class GameStates(StatesGroup):
@@ -51,8 +147,9 @@ class GameStates(StatesGroup):
     competitors = State()
     adding_business = State()
 # Клавиатуры
-def get_main_menu_keyboard(user_id: int = None):
-    """Главное меню игры"""
+# Готовые разметки общие для всех пользователей: строятся один раз, изменять их нельзя.
+# Параметризованные клавиатуры кэшируются по входным данным (LRU).
+def _build_main_menu_keyboard() -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardBuilder()
     keyboard.add(InlineKeyboardButton(text="💰 Мой профиль", callback_data="profile"))
     keyboard.add(InlineKeyboardButton(text="🏢 Мои бизнесы", callback_data="businesses"))
@@ -72,8 +169,7 @@ def get_main_menu_keyboard(user_id: int = None):
     keyboard.adjust(3, 3, 3, 3, 2)
     return keyboard.as_markup()
 
-def get_business_choice_keyboard():
-    """Выбор типа бизнеса"""
+def _build_business_choice_keyboard() -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardBuilder()
     for business_id, business_info in BUSINESS_TYPES.items():
         text = f"{business_info['emoji']} {business_info['name']}"
@@ -83,6 +179,53 @@ def get_business_choice_keyboard():
     keyboard.adjust(2)
     return keyboard.as_markup()
 
+MAIN_MENU_KEYBOARD = _build_main_menu_keyboard()
+BUSINESS_CHOICE_KEYBOARD = _build_business_choice_keyboard()
+HELP_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]])
+HELP_TEXT = """
+🎮 *Бизнес-Империя - Помощь*
+
+*Основные команды:*
+/start - Начать игру
+/profile - Ваш профиль
+/businesses - Ваши бизнесы
+/rating - Рейтинг игроков
+/achievements - Достижения
+
+*Как играть:*
+1. Выберите тип бизнеса
+2. Управляйте финансами
+3. Улучшайте производство
+4. Конкурируйте с другими
+5. Развивайте империю
+
+*Типы бизнеса:*
+☕ Кофейня - стабильный доход, низкий риск
+🍽 Ресторан - средний доход, средний риск
+🏭 Фабрика - высокий доход, высокий риск
+💻 IT-стартап - огромный потенциал, очень высокий риск
+🚜 Ферма - скромный доход, очень низкий риск
+
+*Улучшения:*
+🛠 Новое оборудование - +20% к доходу
+👥 Сотрудники - +15% к доходу, +10% к расходам
+📢 Реклама - +30% к популярности
+🏢 Филиал - +50% к доходу, +30% к расходам
+
+*Случайные события:*
+🎲 Происходят автоматически и могут принести бонусы или штрафы
+
+Удачи в построении вашей бизнес-империи! 🚀
+"""
+
+def get_main_menu_keyboard(user_id: int = None):
+    """Главное меню игры"""
+    return MAIN_MENU_KEYBOARD
+
+def get_business_choice_keyboard():
+    """Выбор типа бизнеса"""
+    return BUSINESS_CHOICE_KEYBOARD
+
 @router.callback_query(F.data == "add_business")
 async def add_business_flow(callback: types.CallbackQuery, state: FSMContext):
     """Старт добавления второго бизнеса"""
@@ -95,6 +238,7 @@ async def add_business_flow(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.edit_text("Выберите тип нового бизнеса:", reply_markup=get_business_choice_keyboard())
 
 
+@lru_cache(maxsize=4096)
 def get_business_management_keyboard(business_id: int):
     """Управление конкретным бизнесом"""
     keyboard = InlineKeyboardBuilder()
@@ -112,9 +256,14 @@ def get_business_management_keyboard(business_id: int):
 
 def get_improvements_keyboard(business_id: int, player_balance: float):
     """Клавиатура улучшений"""
+    # Баланс влияет только на то, какие улучшения доступны: по этому и кэшируем
+    affordable = tuple(game_logic.can_afford_improvement(player_balance, improvement_id) for improvement_id in IMPROVEMENTS)
+    return _improvements_keyboard(business_id, affordable)
+
+@lru_cache(maxsize=4096)
+def _improvements_keyboard(business_id: int, affordable: tuple):
     keyboard = InlineKeyboardBuilder()
-    for improvement_id, improvement_info in IMPROVEMENTS.items():
-        can_afford = game_logic.can_afford_improvement(player_balance, improvement_id)
+    for (improvement_id, improvement_info), can_afford in zip(IMPROVEMENTS.items(), affordable):
         text = f"{improvement_info['name']} ({improvement_info['cost']} ₽)"
         if not can_afford:
             text += " ❌"
@@ -158,42 +307,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
 @router.message(Command("help"))
 async def cmd_help(message: types.Message):
     """Обработчик команды /help"""
-    help_text = """
-🎮 *Бизнес-Империя - Помощь*
-
-*Основные команды:*
-/start - Начать игру
-/profile - Ваш профиль
-/businesses - Ваши бизнесы
-/rating - Рейтинг игроков
-/achievements - Достижения
-
-*Как играть:*
-1. Выберите тип бизнеса
-2. Управляйте финансами
-3. Улучшайте производство
-4. Конкурируйте с другими
-5. Развивайте империю
-
-*Типы бизнеса:*
-☕ Кофейня - стабильный доход, низкий риск
-🍽 Ресторан - средний доход, средний риск
-🏭 Фабрика - высокий доход, высокий риск
-💻 IT-стартап - огромный потенциал, очень высокий риск
-🚜 Ферма - скромный доход, очень низкий риск
-
-*Улучшения:*
-🛠 Новое оборудование - +20% к доходу
-👥 Сотрудники - +15% к доходу, +10% к расходам
-📢 Реклама - +30% к популярности
-🏢 Филиал - +50% к доходу, +30% к расходам
-
-*Случайные события:*
-🎲 Происходят автоматически и могут принести бонусы или штрафы
-
-Удачи в построении вашей бизнес-империи! 🚀
-"""
-    await message.answer(help_text, parse_mode="Markdown")
+    await message.answer(HELP_TEXT, parse_mode="Markdown")
 
 @router.message(Command("admin"))
 async def cmd_admin(message: types.Message, state: FSMContext):
@@ -246,6 +360,58 @@ async def admin_router(callback: types.CallbackQuery, state: FSMContext):
             text += f"{row['rank']}. {nm} — {row['rating']:.0f} (W:{row['wins']}/L:{row['losses']})\n"
         await callback.message.edit_text(text)
 
+@router.message(Command("perf"))
+async def cmd_perf(message: types.Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("⛔ Доступ запрещен")
+        return
+    stats = user_serialization.stats()
+    text = perf_summary()
+    text += (f"\n\nОчереди игроков: ждут {stats['queue_depth']}, макс. {stats['max_queue_depth']}, "
+             f"ожидание ср. {stats['wait_avg'] * 1000:.1f} мс, отброшено {sum(stats['dropped'].values())}")
+    text += f"\nПравки сообщений: отправлено {edit_dedup.edits}, сэкономлено вызовов {edit_dedup.saved_calls}"
+    limits = outbound_limiter.stats()
+    text += (f"\nИсходящие: слито правок {limits['coalesced']}, повторов после 429 {limits['retries']}, "
+             f"ожидали лимита {limits['throttled']} (макс. {limits['wait_max']:.2f} с)")
+    text += (f"\nАктивные игроки: за сутки {activity.dau}, за неделю {activity.wau}; "
+             f"отметок {activity.touches}, записано строк {activity.rows_written}")
+    await message.answer(text)
+
+@router.message(Command("queries"))
+async def cmd_queries(message: types.Message):
+    """Отчет профилировщика SQL; '/queries reset' очищает статистику"""
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("⛔ Доступ запрещен")
+        return
+    if (message.text or '').split()[1:2] == ['reset']:
+        PROFILER.reset()
+        await message.answer("Статистика запросов очищена")
+        return
+    report = PROFILER.report(limit=8, width=60)
+    # Лимит длины сообщения Telegram — 4096 символов
+    await message.answer(f"<pre>{html.escape(report[:3900])}</pre>", parse_mode="HTML")
+
+@router.message(Command("backup"))
+async def cmd_backup(message: types.Message):
+    """Снимок базы по требованию: копирование порциями в потоке, бот продолжает работать"""
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("⛔ Доступ запрещен")
+        return
+    if backups.running:
+        await message.answer("⏳ Резервная копия уже создается")
+        return
+    await message.answer("💾 Создаю резервную копию...")
+    try:
+        report = await asyncio.to_thread(backups.run)
+    except Exception as e:
+        logger.error(f"Ошибка резервного копирования: {e}")
+        await message.answer(f"❌ Резервная копия не создана: {e}")
+        return
+    if report is None:
+        await message.answer("⏳ Резервная копия уже создается")
+        return
+    await message.answer(format_backup_report(report))
+
 @router.message(Command("donate"))
 async def cmd_donate(message: types.Message):
     kb = InlineKeyboardBuilder()
@@ -609,19 +775,15 @@ async def handle_text_input(message: types.Message, state: FSMContext):
 @router.callback_query(F.data == "investments")
 async def investments_menu(callback: types.CallbackQuery):
     user_id = callback.from_user.id
-    # Обновим статусы и текущие цены
-    db.mark_matured_investments()
-    try:
-        db.update_investment_prices()
-    except Exception:
-        pass
+    # Статусы и цены обновляют задачи планировщика (notifier, investment_prices)
     inv = db.get_investments(user_id)
     text = "💼 Инвестиции\n\n"
     if inv:
         for i in inv:
             current_val = i.get('current_value', i['amount'])
+            status = 'matured' if i['due'] else i['status']
             text += (f"#{i['id']}: вложено {i['amount']:,.0f} ₽ | текущая {current_val:,.0f} ₽ | "+
-                     f"статус {i['status']} до {i['matures_at'][:10]}\n")
+                     f"статус {status} до {i['matures_at'][:10]}\n")
     else:
         text += "Активных инвестиций нет\n"
     text += "\nВыберите действие:"
@@ -629,7 +791,8 @@ async def investments_menu(callback: types.CallbackQuery):
     keyboard.add(InlineKeyboardButton(text="Вложить 20 000 ₽ (сбаланс.)", callback_data="inv_take_balanced_20000"))
     # Кнопки для получения и вывода
     for i in inv:
-        if i['status'] == 'matured':
+        # Срок наступил — забрать можно и до того, как сработает задача уведомления
+        if i['status'] == 'matured' or i['due']:
             keyboard.add(InlineKeyboardButton(text=f"Забрать по #{i['id']}", callback_data=f"inv_claim_{i['id']}"))
         if i['status'] in ('active','matured'):
             keyboard.add(InlineKeyboardButton(text=f"Вывести по #{i['id']}", callback_data=f"inv_withdraw_{i['id']}"))
@@ -653,6 +816,7 @@ async def take_investment(callback: types.CallbackQuery):
     inv_id = db.create_investment(user_id, None, strategy, amount, expected, matures)
     if inv_id:
         db.update_player_balance(user_id, -amount, "investment", f"Инвестиция #{inv_id}")
+        notifier.investment_created(inv_id, matures)
         await callback.message.edit_text(
             f"✅ Инвестиция создана! ID {inv_id}\nСумма: {amount:,.0f} ₽\nОжидаемый доход: {expected:,.0f} ₽\nСрок: 3 дня",
             reply_markup=get_main_menu_keyboard()
@@ -685,10 +849,6 @@ async def inv_withdraw(callback: types.CallbackQuery):
     else:
         msg = f"✅ Вывод: {payout:,.0f} ₽"
     db.update_player_balance(user_id, payout, "investment_withdraw", f"Вывод по инвестиции #{inv_id}")
-    try:
-        db.update_investment_prices()
-    except Exception:
-        pass
     await callback.answer(msg, show_alert=True)
     await investments_menu(callback)
 
@@ -700,15 +860,14 @@ async def pvp_menu(callback: types.CallbackQuery):
     user_id = callback.from_user.id
     player = db.get_player(user_id)
     db.ensure_pvp_profile(user_id)
-    opponents = db.get_top_players(10)
-    text = "⚔️ PvP Дуэли\nВыберите соперника из топа (ставка 10 000 ₽, кулдаун 30с):\n\n"
+    opponents = matchmaking.nearest_players(user_id, 8)
+    text = "⚔️ PvP Дуэли\nВыберите соперника близкой силы (ставка 10 000 ₽, кулдаун 30с):\n\n"
     keyboard = InlineKeyboardBuilder()
     for op in opponents:
-        if op['user_id'] != user_id:
-            name = op['first_name'] or op['username']
-            name_safe = safe_html_text(name) if name else "Игрок"
-            text += f"{name_safe} (ур. {op['level']} | {op['balance']:,.0f} ₽)\n"
-            keyboard.add(InlineKeyboardButton(text=f"Сразиться с {name_safe}", callback_data=f"pvp_fight_{op['user_id']}"))
+        name = op['first_name'] or op['username']
+        name_safe = safe_html_text(name) if name else "Игрок"
+        text += f"{name_safe} (ур. {op['level']} | {op['balance']:,.0f} ₽ | сила {op['power']:,.0f})\n"
+        keyboard.add(InlineKeyboardButton(text=f"Сразиться с {name_safe}", callback_data=f"pvp_fight_{op['user_id']}"))
     # Топ по PvP рейтингу
     pvp_top = db.get_pvp_top(5)
     if pvp_top:
@@ -733,39 +892,27 @@ async def pvp_menu(callback: types.CallbackQuery):
 async def pvp_fight(callback: types.CallbackQuery):
     user_id = callback.from_user.id
     opponent_id = int(callback.data.split("_")[2])
-    bet = 10000
-    player = db.get_player(user_id)
-    opponent = db.get_player(opponent_id)
-    if not opponent:
+    # Бой разрешается в очереди пачкой вместе с вызовами других игроков
+    result = await pvp_queue.submit(user_id, opponent_id)
+    if result['status'] == 'unavailable':
         await callback.answer("Соперник недоступен", show_alert=True)
         return
-    # Ограничим ставку доступными балансами сторон
-    bet = min(bet, max(0, player['balance'] // 2), max(0, opponent['balance'] // 2)) or 1000
-    # Кулдаун
-    db.ensure_pvp_profile(user_id)
-    remain = db.pvp_cooldown_remaining(user_id)
-    if remain > 0:
-        await callback.answer(f"Подождите {remain}с до следующего боя", show_alert=True)
+    if result['status'] == 'cooldown':
+        await callback.answer(f"Подождите {result['remaining']}с до следующего боя", show_alert=True)
+        return
+    if result['status'] == 'busy':
+        await callback.answer("⏳ Сервер занят, бой не проведен — нажмите еще раз", show_alert=True)
+        return
+    if result['status'] != 'done':
+        await callback.answer("Не удалось провести бой, попробуйте позже", show_alert=True)
         return
-    result = advanced.calculate_pvp_outcome(player, opponent, bet)
-    # Записываем бой
-    db.record_pvp_match(user_id, opponent_id, result['winner']['user_id'] if result['winner'] else None,
-                        result['loser']['user_id'] if result['loser'] else None, bet,
-                        result['player1_power'], result['player2_power'], result['outcome'])
+    bet = result['bet']
     if result['outcome'] == 'win':
-        db.update_player_balance(user_id, bet, "pvp_win", f"Победа над {opponent.get('username') or opponent.get('first_name')}")
-        db.update_player_balance(opponent_id, -bet, "pvp_loss", f"Поражение от {player.get('username') or player.get('first_name')}")
-        db.update_pvp_ratings_after_match(user_id, opponent_id)
         msg = f"🏆 Победа! Вы получили {bet:,.0f} ₽"
     elif result['outcome'] == 'loss':
-        db.update_player_balance(user_id, -bet, "pvp_loss", f"Поражение от {opponent.get('username') or opponent.get('first_name')}")
-        db.update_player_balance(opponent_id, bet, "pvp_win", f"Победа над {player.get('username') or player.get('first_name')}")
-        db.update_pvp_ratings_after_match(opponent_id, user_id)
         msg = f"❌ Поражение. Вы потеряли {bet:,.0f} ₽"
     else:
         msg = "🤝 Ничья. Ставки возвращены"
-    # Кулдаун 30с после боя
-    db.set_pvp_cooldown(user_id, 30)
     await callback.message.edit_text(msg, reply_markup=get_main_menu_keyboard())
 
 @router.callback_query(F.data == "back_to_main")
@@ -875,6 +1022,7 @@ async def prod_start(callback: types.CallbackQuery):
     ready_at = (datetime.now() + timedelta(minutes=dur_min)).strftime('%Y-%m-%d %H:%M:%S')
     prod_id = db.create_production(business_id, prod_type, name, version, ready_at, qty, meta={})
     if prod_id:
+        notifier.production_started(prod_id, ready_at)
         await callback.answer("Задание запущено")
         await prod_menu(callback)
     else:
@@ -1131,13 +1279,19 @@ async def show_rating(callback: types.CallbackQuery):
 @router.callback_query(F.data.startswith("emp_menu_"))
 async def emp_menu(callback: types.CallbackQuery):
     business_id = int(callback.data.split("_")[2])
-    employees = db.get_business_employees(business_id)
+    # Итоги хранятся в строке бизнеса; список читается только для показа
+    payroll = db.get_business_payroll(business_id)
+    employees = db.get_business_employees(business_id, limit=EMPLOYEES_SHOWN)
     keyboard = InlineKeyboardBuilder()
     keyboard.add(InlineKeyboardButton(text="➕ Нанять", callback_data=f"emp_hire_{business_id}"))
     for e in employees[:8]:
         keyboard.add(InlineKeyboardButton(text=f"❌ Уволить: {e['full_name']}", callback_data=f"emp_fire_{e['id']}_{business_id}"))
     keyboard.row(InlineKeyboardButton(text="🔙 Назад", callback_data=f"manage_{business_id}"))
     text = "👥 Сотрудники\n\n" + ("\n".join([f"• {e['full_name']} — {e['role']} | {e['salary']:,.0f} ₽" for e in employees]) or "Пока нет сотрудников.")
+    if payroll['headcount'] > len(employees):
+        text += f"\n… и еще {payroll['headcount'] - len(employees)}"
+    if payroll['headcount']:
+        text += f"\n\nВсего: {payroll['headcount']}, зарплаты {payroll['payroll_total']:,.0f} ₽/день"
     await callback.message.edit_text(text, reply_markup=keyboard.as_markup())
 
 @router.callback_query(F.data.startswith("emp_hire_"))
@@ -1267,32 +1421,19 @@ async def rev_top(callback: types.CallbackQuery):
 async def show_achievements(callback: types.CallbackQuery):
     """Показать достижения игрока"""
     user_id = callback.from_user.id
-    player = db.get_player(user_id)
-    businesses = db.get_player_businesses(user_id)
     
-    # Проверяем достижения
-    achievements = game_logic.check_achievements(player, businesses)
+    # Достижения выдает achievement_engine по событиям изменения игрока; просмотр только читает
     earned_achievements = db.get_player_achievements(user_id)
     
     achievements_text = "🎯 *Достижения:*\n\n"
     
-    if achievements:
-        achievements_text += "*Новые достижения:*\n"
-        for achievement in achievements:
-            achievements_text += f"🏆 {achievement['title']}\n"
-            achievements_text += f"📝 {achievement['description']}\n\n"
-            
-            # Добавляем достижение в базу данных
-            db.add_achievement(user_id, achievement['type'], achievement['title'], achievement['description'])
-    
     if earned_achievements:
         achievements_text += "*Полученные достижения:*\n"
         for achievement in earned_achievements:
             achievements_text += f"✅ {achievement['title']}\n"
             achievements_text += f"📝 {achievement['description']}\n"
             achievements_text += f"📅 {achievement['earned_at'][:10]}\n\n"
-    
-    if not achievements and not earned_achievements:
+    else:
         achievements_text += "У вас пока нет достижений. Продолжайте развивать свой бизнес!"
     
     keyboard = InlineKeyboardBuilder()
@@ -1357,6 +1498,15 @@ async def trigger_random_event(callback: types.CallbackQuery):
             parse_mode="Markdown"
         )
 
+def market_event_note() -> str:
+    """Строка об активном рыночном событии для сообщений о доходе"""
+    event = market.current()
+    if event is None:
+        return ""
+    until = datetime.fromtimestamp(event['expires_at']).strftime('%d.%m %H:%M')
+    income, expense = market.multipliers()
+    return f"{event['title']} до {until}: доход ×{income:.2f}, расходы ×{expense:.2f}\n\n"
+
 @router.callback_query(F.data == "daily_income")
 async def collect_daily_income(callback: types.CallbackQuery):
     """Сбор ежедневного дохода"""
@@ -1394,6 +1544,7 @@ async def collect_daily_income(callback: types.CallbackQuery):
                 )
                 await callback.message.edit_text(
                     f"💰 *Ежедневный доход получен!*\n\n"
+                    f"{market_event_note()}"
                     f"📈 Доход: +{daily_progress['total_income']:,.0f} ₽\n"
                     f"💸 Расходы: -{daily_progress['total_expenses']:,.0f} ₽\n"
                     f"💵 Чистая прибыль: +{daily_progress['net_income']:,.0f} ₽\n"
@@ -1406,6 +1557,7 @@ async def collect_daily_income(callback: types.CallbackQuery):
     
     await callback.message.edit_text(
         f"💰 *Ежедневный доход получен!*\n\n"
+        f"{market_event_note()}"
         f"📈 Доход: +{daily_progress['total_income']:,.0f} ₽\n"
         f"💸 Расходы (бизнес): -{daily_progress['total_expenses']:,.0f} ₽\n"
         f"👥 Зарплаты: -{salaries:,.0f} ₽\n"
@@ -1459,45 +1611,7 @@ async def show_main_menu(message_or_callback, user_id: int):
 @router.callback_query(F.data == "help")
 async def show_help(callback: types.CallbackQuery):
     """Показать справку"""
-    help_text = """
-🎮 *Бизнес-Империя - Помощь*
-
-*Основные команды:*
-/start - Начать игру
-/profile - Ваш профиль
-/businesses - Ваши бизнесы
-/rating - Рейтинг игроков
-/achievements - Достижения
-
-*Как играть:*
-1. Выберите тип бизнеса
-2. Управляйте финансами
-3. Улучшайте производство
-4. Конкурируйте с другими
-5. Развивайте империю
-
-*Типы бизнеса:*
-☕ Кофейня - стабильный доход, низкий риск
-🍽 Ресторан - средний доход, средний риск
-🏭 Фабрика - высокий доход, высокий риск
-💻 IT-стартап - огромный потенциал, очень высокий риск
-🚜 Ферма - скромный доход, очень низкий риск
-
-*Улучшения:*
-🛠 Новое оборудование - +20% к доходу
-👥 Сотрудники - +15% к доходу, +10% к расходам
-📢 Реклама - +30% к популярности
-🏢 Филиал - +50% к доходу, +30% к расходам
-
-*Случайные события:*
-🎲 Происходят автоматически и могут принести бонусы или штрафы
-
-Удачи в построении вашей бизнес-империи! 🚀
-"""
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu"))
-    
-    await callback.message.edit_text(help_text, reply_markup=keyboard.as_markup(), parse_mode="Markdown")
+    await callback.message.edit_text(HELP_TEXT, reply_markup=HELP_KEYBOARD, parse_mode="Markdown")
 
 # Фолбэк для необработанных callback данных
 @router.callback_query()
@@ -1505,16 +1619,100 @@ async def unknown_callback(callback: types.CallbackQuery):
     logging.info(f"Unhandled callback data: {callback.data}")
     await callback.answer("Кнопка пока не поддерживается", show_alert=False)
 
+# Ночное обслуживание базы — повторяющаяся задача планировщика: с несколькими
+# процессами (workers.py) ее выполняет один из них
+def next_maintenance_time() -> datetime:
+    now = datetime.now()
+    run_at = now.replace(hour=MAINTENANCE_HOUR, minute=0, second=0, microsecond=0)
+    return run_at if run_at > now else run_at + timedelta(days=1)
+
+@job_handler('nightly_maintenance')
+async def nightly_maintenance(job):
+    """Сверка payroll_total / headcount с employees и сжатие visitors"""
+    try:
+        fixed = await asyncio.to_thread(db.check_payroll_totals)
+        if any(fixed.values()):
+            logger.warning(f"Сверка зарплат: исправлено бизнесов {fixed['businesses']}, игроков {fixed['players']}")
+    except Exception as e:
+        logger.error(f"Ошибка сверки зарплат: {e}")
+    try:
+        # Короткие транзакции с паузами: обработчики игроков не ждут блокировку
+        report = await asyncio.to_thread(db.compact_visitors, VISITORS_RETENTION_DAYS, 5000, 0.05)
+        logger.info(f"Сжатие visitors: свернуто {report['rows']} строк за {report['batches']} порций "
+                    f"(блокировка до {report['lock_max'] * 1000:.0f} мс), "
+                    f"возвращено {report['bytes_reclaimed'] / 2 ** 20:.1f} МБ за {report['seconds']:.1f} с")
+    except Exception as e:
+        logger.error(f"Ошибка сжатия visitors: {e}")
+    return next_maintenance_time()
+
+@job_handler('investment_prices')
+async def investment_prices(job):
+    """Случайное изменение стоимости активных инвестиций"""
+    await asyncio.to_thread(db.update_investment_prices)
+    return datetime.now() + timedelta(seconds=INVESTMENT_PRICE_INTERVAL)
+
+@job_handler('market_event')
+async def market_event(job):
+    """Бросок мирового рыночного события"""
+    event = await asyncio.to_thread(market.roll)
+    if event:
+        logger.info(f"Рыночное событие: {event['type']} (доход ×{event['income_multiplier']:.2f}, "
+                    f"расходы ×{event['expense_multiplier']:.2f})")
+    return market.next_roll_at()
+
+@job_handler('backup')
+async def scheduled_backup(job):
+    """Периодический снимок базы"""
+    report = await asyncio.to_thread(backups.run)
+    if report:
+        logger.info(f"Резервная копия {report['snapshot']}: {report['pages']} страниц за {report['seconds']:.1f} с")
+    return datetime.now() + timedelta(hours=BACKUP_INTERVAL_HOURS)
+
+async def start_scheduler():
+    scheduler.schedule('market_event', datetime.now(), key='world', replace=False)
+    scheduler.schedule('nightly_maintenance', next_maintenance_time(), key='daily', replace=False)
+    scheduler.schedule('investment_prices', datetime.now() + timedelta(seconds=INVESTMENT_PRICE_INTERVAL),
+                       key='periodic', replace=False)
+    if BACKUP_INTERVAL_HOURS > 0:
+        scheduler.schedule('backup', datetime.now() + timedelta(hours=BACKUP_INTERVAL_HOURS),
+                           key='periodic', replace=False)
+    else:
+        scheduler.cancel('backup', 'periodic')
+    backfilled = await asyncio.to_thread(notifier.backfill)
+    if backfilled:
+        logger.info(f"Поставлено уведомлений о готовности: {backfilled}")
+    await scheduler.start()
+
+async def start_services():
+    await activity.start()
+    await matchmaking.start()
+    await start_scheduler()
+
+async def stop_services():
+    """Дождаться поставленных боев и задач, записать накопленную активность"""
+    await pvp_queue.close()
+    await scheduler.close()
+    await matchmaking.close()
+    await activity.close()
+
+dp.startup.register(start_services)
+dp.shutdown.register(stop_services)
+
 # Регистрация роутера
 dp.include_router(router)
 
 # Главная функция
 async def main():
     """Главная функция бота"""
-    logger.info("Запуск бота Бизнес-Империя...")
+    logger.info(f"Запуск бота Бизнес-Империя (режим: {BOT_MODE})...")
     
     try:
-        await dp.start_polling(bot)
+        await run_bot(
+            dp, bot, mode=BOT_MODE,
+            host=WEBAPP_HOST, port=WEBAPP_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+            health_path=HEALTH_PATH, base_url=WEBHOOK_BASE_URL, metrics_path=METRICS_PATH,
+            metrics_host=METRICS_HOST, metrics_port=METRICS_PORT
+        )
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
     except Exception as e:
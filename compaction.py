@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Сжатие таблицы visitors: посетители старше окна хранения сворачиваются в
+дневные итоги visitor_daily (число, сумма трат, гистограмма оценок), их строки
+удаляются короткими транзакциями, освобожденное место возвращается
+PRAGMA incremental_vacuum. Бот делает это каждую ночь (VISITORS_RETENTION_DAYS).
+
+Базе, созданной до включения auto_vacuum = INCREMENTAL, нужен один полный VACUUM:
+python compaction.py --db game.db --enable-incremental
+
+Пример: python compaction.py --db game.db --days 7 --batch 5000
+"""
+
+import argparse
+import sqlite3
+import time
+from typing import Dict
+
+from config import VISITORS_RETENTION_DAYS
+from database import GameDatabase
+
+
+def enable_incremental_vacuum(path: str) -> float:
+    """Перевести базу в auto_vacuum = INCREMENTAL (полный VACUUM, блокирует базу); возвращает секунды"""
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"Свернуто посетителей: {report['rows']:,} за {report['batches']} порций "
+        f"(самая долгая блокировка {report['lock_max'] * 1000:.0f} мс)",
+        f"Освобождено страниц: {report['freelist_pages']:,}",
+    ]
+    if report['incremental_vacuum']:
+        lines.append(f"Возвращено файловой системе: {report['bytes_reclaimed'] / 2 ** 20:.1f} МБ, "
+                     f"размер базы {report['size_after'] / 2 ** 20:.1f} МБ")
+    else:
+        lines.append("auto_vacuum выключен: место переиспользуется базой, файл не уменьшается "
+                     "(--enable-incremental)")
+    lines.append(f"Время: {report['seconds']:.1f} с")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='game.db', help='файл базы')
+    parser.add_argument('--days', type=int, default=VISITORS_RETENTION_DAYS, help='сколько дней хранить посетителей')
+    parser.add_argument('--batch', type=int, default=5000, help='строк в одной транзакции')
+    parser.add_argument('--pause', type=float, default=0.0, help='пауза между порциями, с')
+    parser.add_argument('--enable-incremental', action='store_true', help='включить auto_vacuum = INCREMENTAL')
+    args = parser.parse_args()
+
+    if args.enable_incremental:
+        print(f"VACUUM: {enable_incremental_vacuum(args.db):.1f} с")
+    report = GameDatabase(args.db).compact_visitors(args.days, batch_size=args.batch, pause=args.pause)
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,11 +19,57 @@ if _admins_env:
     except Exception:
         ADMIN_IDS = []
 
+# Файл базы данных игры
+GAME_DB_PATH = os.getenv('GAME_DB_PATH', 'game.db')
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+# Публичный адрес для webhook (например https://example.com); пусто — webhook не регистрируется автоматически
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '').strip()
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8080'))
+HEALTH_PATH = os.getenv('HEALTH_PATH', '/health')
+# Альтернативный адрес Bot API (локальный сервер или фейковый API для тестов)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').strip()
+# Маршрут метрик Prometheus (в режиме polling — отдельный сервер на METRICS_HOST:METRICS_PORT); пусто — выключено
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics').strip()
+# Адрес сервера метрик в режиме polling; по умолчанию только локальный, не пересекается с WEBAPP_PORT
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+# Профилировщик SQL-запросов: включен ли и порог медленного запроса в мс
+QUERY_PROFILER = os.getenv('QUERY_PROFILER', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+QUERY_SLOW_MS = float(os.getenv('QUERY_SLOW_MS', '50'))
+# Хранилище FSM-состояний: memory или sqlite:///fsm.db (общее для нескольких воркеров)
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory').strip()
+# Число процессов бота; workers.py задает его каждому воркеру
+BOT_WORKERS = max(1, int(os.getenv('BOT_WORKERS', '1')))
+# Ограничение исходящих запросов к Bot API (сообщений в секунду): всего и в один чат; 0 — без ограничения.
+# Общий лимит задается на весь бот: у каждого из BOT_WORKERS процессов свой token bucket с долей лимита
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '25')) / BOT_WORKERS
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+# Сколько дней хранить строки visitors до сворачивания в дневные итоги (compaction.py)
+VISITORS_RETENTION_DAYS = int(os.getenv('VISITORS_RETENTION_DAYS', '7'))
+# Период перестройки индекса подбора PvP, с: изменения других воркеров (matchmaking.py); 0 — только свои события
+MATCHMAKING_REFRESH_SECONDS = float(os.getenv('MATCHMAKING_REFRESH_SECONDS', '60'))
+# Период записи накопленной активности игроков (last_active, DAU/WAU) в базу, с (activity.py)
+ACTIVITY_FLUSH_SECONDS = float(os.getenv('ACTIVITY_FLUSH_SECONDS', '5'))
+# Резервные копии базы (backup.py): каталог снимков, сколько хранить, период в часах (0 — только /backup)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+
 # Игровые параметры
 STARTING_BALANCE = 10000  # Начальный баланс игрока
 DAILY_INCOME_MULTIPLIER = 0.1  # Множитель дневного дохода
 DAILY_EXPENSE_MULTIPLIER = 0.05  # Множитель дневных расходов
 
+# Мировые рыночные события (market_events.py): раз в MARKET_EVENT_ROLL_HOURS часов,
+# пока нет активного события, новое начинается с вероятностью MARKET_EVENT_CHANCE
+MARKET_EVENT_ROLL_HOURS = 6
+MARKET_EVENT_CHANCE = 0.3
+
 # Типы бизнесов
 BUSINESS_TYPES = {
     'coffee_shop': {
@@ -1,19 +1,76 @@
 import sqlite3
 import json
 import random
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+from elo import EloEngine, RatingState
+from metrics import timed_methods
+from query_profiler import ProfiledConnection
+from text_codes import TextDictionary
+
+# Схемы таблиц с кодами вместо строк (см. text_codes.py)
+VISITORS_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    business_id INTEGER NOT NULL,
+    name_last INTEGER,
+    name_first INTEGER,
+    name_middle INTEGER,
+    spent REAL DEFAULT 0,
+    rating INTEGER,
+    reviewed INTEGER DEFAULT 0,
+    visited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (business_id) REFERENCES businesses (id)
+'''
+REVIEWS_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    business_id INTEGER NOT NULL,
+    name_last INTEGER,
+    name_first INTEGER,
+    name_middle INTEGER,
+    rating INTEGER NOT NULL,
+    template_id INTEGER,
+    suffix_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (business_id) REFERENCES businesses (id)
+'''
+
+
+def is_busy_error(error: Exception) -> bool:
+    """database is locked / busy: другое соединение держит запись дольше timeout, повтор может пройти"""
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+@timed_methods
 class GameDatabase:
     def __init__(self, db_path: str = "game.db"):
         self.db_path = db_path
+        self._player_listeners: List[Callable[[int, Tuple[str, ...]], None]] = []
+        self.text_codes = TextDictionary()
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение с профилированием запросов (см. query_profiler.py)"""
+        return sqlite3.connect(self.db_path, factory=ProfiledConnection)
+    
+    def subscribe_player_changes(self, callback: Callable[[int, Tuple[str, ...]], None]):
+        """callback(user_id, fields) после изменения игрока; fields — измененные поля:
+        balance, level, experience, popularity, businesses, pvp_cooldown или deleted"""
+        self._player_listeners.append(callback)
+    
+    def _notify_player_changed(self, user_id: int, *fields: str):
+        for callback in self._player_listeners:
+            callback(user_id, fields)
+    
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         pizdabol = conn.cursor()
         
+        # Новая база: освобожденные страницы возвращаются PRAGMA incremental_vacuum (compact_visitors)
+        pizdabol.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
         # Таблица игроков
         pizdabol.execute('''
             CREATE TABLE IF NOT EXISTS players (
@@ -27,7 +84,9 @@ class GameDatabase:
                 level INTEGER DEFAULT 1,
                 experience INTEGER DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                payroll_total REAL DEFAULT 0,
+                headcount INTEGER DEFAULT 0
             )
         ''')
         
@@ -43,6 +102,8 @@ class GameDatabase:
                 level INTEGER DEFAULT 1,
                 improvements TEXT DEFAULT '[]',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                payroll_total REAL DEFAULT 0,
+                headcount INTEGER DEFAULT 0,
                 FOREIGN KEY (user_id) REFERENCES players (user_id)
             )
         ''')
@@ -74,6 +135,15 @@ class GameDatabase:
                 FOREIGN KEY (user_id) REFERENCES players (user_id)
             )
         ''')
+        # Одно достижение на игрока: старые дубли (по записи на каждый просмотр) удаляются
+        pizdabol.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_achievements_user_title'")
+        if pizdabol.fetchone() is None:
+            pizdabol.execute('''
+                DELETE FROM achievements WHERE id NOT IN (
+                    SELECT MIN(id) FROM achievements GROUP BY user_id, title
+                )
+            ''')
+            pizdabol.execute('CREATE UNIQUE INDEX idx_achievements_user_title ON achievements (user_id, title)')
         
         # Таблица рейтингов
         pizdabol.execute('''
@@ -137,6 +207,7 @@ class GameDatabase:
                 current_value REAL,
                 volatility REAL,
                 last_price_update TIMESTAMP,
+                notified INTEGER DEFAULT 0,
                 FOREIGN KEY (user_id) REFERENCES players (user_id),
                 FOREIGN KEY (business_id) REFERENCES businesses (id)
             )
@@ -152,6 +223,8 @@ class GameDatabase:
                 pizdabol.execute("ALTER TABLE investments ADD COLUMN volatility REAL")
             if 'last_price_update' not in columns:
                 pizdabol.execute("ALTER TABLE investments ADD COLUMN last_price_update TIMESTAMP")
+            if 'notified' not in columns:
+                pizdabol.execute("ALTER TABLE investments ADD COLUMN notified INTEGER DEFAULT 0")
             # Инициализация текущей стоимости для уже существующих записей
             pizdabol.execute("UPDATE investments SET current_value = amount WHERE current_value IS NULL")
         except Exception as e:
@@ -171,9 +244,14 @@ class GameDatabase:
                 ready_at TIMESTAMP NOT NULL,
                 quantity REAL DEFAULT 0,
                 meta TEXT DEFAULT '{}',
+                notified INTEGER DEFAULT 0,
                 FOREIGN KEY (business_id) REFERENCES businesses (id)
             )
         ''')
+        # Уведомление о готовности (notifier.py) отправляется один раз
+        pizdabol.execute("PRAGMA table_info('productions')")
+        if 'notified' not in [row[1] for row in pizdabol.fetchall()]:
+            pizdabol.execute("ALTER TABLE productions ADD COLUMN notified INTEGER DEFAULT 0")
 
         # Таблица сотрудников
         pizdabol.execute('''
@@ -188,31 +266,49 @@ class GameDatabase:
                 FOREIGN KEY (business_id) REFERENCES businesses (id)
             )
         ''')
+        pizdabol.execute('CREATE INDEX IF NOT EXISTS idx_employees_business ON employees (business_id)')
 
-        # Таблица посетителей
-        pizdabol.execute('''
-            CREATE TABLE IF NOT EXISTS visitors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                business_id INTEGER NOT NULL,
-                visitor_name TEXT,
-                spent REAL DEFAULT 0,
-                rating INTEGER,
-                reviewed INTEGER DEFAULT 0,
-                visited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (business_id) REFERENCES businesses (id)
-            )
-        ''')
+        # Итоги зарплат и численности хранятся в businesses и players (add_employee / delete_employee)
+        try:
+            pizdabol.execute("PRAGMA table_info('businesses')")
+            business_cols = [row[1] for row in pizdabol.fetchall()]
+            pizdabol.execute("PRAGMA table_info('players')")
+            player_cols = [row[1] for row in pizdabol.fetchall()]
+            missing = False
+            for table, columns in (('businesses', business_cols), ('players', player_cols)):
+                if 'payroll_total' not in columns:
+                    pizdabol.execute(f"ALTER TABLE {table} ADD COLUMN payroll_total REAL DEFAULT 0")
+                    pizdabol.execute(f"ALTER TABLE {table} ADD COLUMN headcount INTEGER DEFAULT 0")
+                    missing = True
+            if missing:
+                self._sync_payroll_totals(pizdabol)
+        except Exception as e:
+            print(f"Миграция итогов зарплат пропущена: {e}")
+
+        # Посетители и отзывы: имя (фамилия, имя, отчество) и текст (шаблон, приписка) — коды text_codes
+        TextDictionary.create_table(pizdabol)
+        self.text_codes.seed(pizdabol)
+        pizdabol.execute(f'CREATE TABLE IF NOT EXISTS visitors ({VISITORS_COLUMNS})')
+        pizdabol.execute(f'CREATE TABLE IF NOT EXISTS reviews ({REVIEWS_COLUMNS})')
+        try:
+            self._encode_text_tables(pizdabol)
+        except Exception as e:
+            print(f"Миграция visitors/reviews пропущена: {e}")
+        pizdabol.execute('CREATE INDEX IF NOT EXISTS idx_reviews_business ON reviews (business_id)')
 
-        # Таблица отзывов
+        # Посетители старше окна хранения сворачиваются в дневные итоги по бизнесу (compact_visitors)
         pizdabol.execute('''
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS visitor_daily (
                 business_id INTEGER NOT NULL,
-                visitor_name TEXT,
-                rating INTEGER NOT NULL,
-                text TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (business_id) REFERENCES businesses (id)
+                day TEXT NOT NULL,
+                visitors INTEGER DEFAULT 0,
+                spent REAL DEFAULT 0,
+                rating_1 INTEGER DEFAULT 0,
+                rating_2 INTEGER DEFAULT 0,
+                rating_3 INTEGER DEFAULT 0,
+                rating_4 INTEGER DEFAULT 0,
+                rating_5 INTEGER DEFAULT 0,
+                PRIMARY KEY (business_id, day)
             )
         ''')
 
@@ -259,13 +355,87 @@ class GameDatabase:
             )
         ''')
         
+        # Отложенные задачи (scheduler.py): run_at и lease_until — unix-время,
+        # job_key делает задачу уникальной в пределах kind
+        pizdabol.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                job_key TEXT,
+                payload TEXT,
+                run_at REAL NOT NULL,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER DEFAULT 5,
+                lease_owner TEXT,
+                lease_until REAL DEFAULT 0,
+                last_error TEXT,
+                UNIQUE (kind, job_key)
+            )
+        ''')
+        pizdabol.execute("CREATE INDEX IF NOT EXISTS idx_jobs_run_at ON jobs (run_at) WHERE status = 'pending'")
+        
+        # Мировые рыночные события (market_events.py); started_at / expires_at — unix-время
+        pizdabol.execute('''
+            CREATE TABLE IF NOT EXISTS market_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_type TEXT NOT NULL,
+                title TEXT,
+                description TEXT,
+                income_multiplier REAL DEFAULT 1.0,
+                expense_multiplier REAL DEFAULT 1.0,
+                started_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        pizdabol.execute('CREATE INDEX IF NOT EXISTS idx_market_events_expires ON market_events (expires_at)')
+        
+        # Дни активности игроков (activity.py): DAU / WAU; строки старше недели удаляются
+        pizdabol.execute('''
+            CREATE TABLE IF NOT EXISTS player_activity (
+                day TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+        ''')
+        
         conn.commit()
         conn.close()
+
+    def _encode_text_tables(self, pizdabol: sqlite3.Cursor, batch_size: int = 10000):
+        """Перекодировать старые visitors / reviews (visitor_name, text) в коды text_codes"""
+        codes = self.text_codes
+        layouts = {
+            'visitors': (VISITORS_COLUMNS, 'id, business_id, visitor_name, spent, rating, reviewed, visited_at',
+                         lambda row: (row[0], row[1], *codes.encode_name(pizdabol, row[2]), *row[3:])),
+            'reviews': (REVIEWS_COLUMNS, 'id, business_id, visitor_name, rating, text, created_at',
+                        lambda row: (row[0], row[1], *codes.encode_name(pizdabol, row[2]), row[3],
+                                     *codes.encode_review(pizdabol, row[4]), row[5])),
+        }
+        for table, (columns, old_columns, encode) in layouts.items():
+            pizdabol.execute(f"PRAGMA table_info('{table}')")
+            if 'visitor_name' not in [row[1] for row in pizdabol.fetchall()]:
+                continue
+            pizdabol.execute(f'DROP TABLE IF EXISTS {table}_encoded')
+            pizdabol.execute(f'CREATE TABLE {table}_encoded ({columns})')
+            # Старая таблица читается отдельным курсором порциями по id
+            reader = pizdabol.connection.cursor()
+            reader.execute(f'SELECT {old_columns} FROM {table} ORDER BY id')
+            placeholders = None
+            while True:
+                rows = reader.fetchmany(batch_size)
+                if not rows:
+                    break
+                encoded = [encode(row) for row in rows]
+                placeholders = placeholders or ', '.join('?' * len(encoded[0]))
+                pizdabol.executemany(f'INSERT INTO {table}_encoded VALUES ({placeholders})', encoded)
+            pizdabol.execute(f'DROP TABLE {table}')
+            pizdabol.execute(f'ALTER TABLE {table}_encoded RENAME TO {table}')
     
     def add_player(self, user_id: int, username: str, first_name: str) -> bool:
         """Добавление нового игрока"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -275,6 +445,7 @@ class GameDatabase:
             
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'balance', 'level', 'experience', 'popularity')
             return True
         except Exception as e:
             print(f"Ошибка при добавлении игрока: {e}")
@@ -283,7 +454,7 @@ class GameDatabase:
     def get_player(self, user_id: int) -> Optional[Dict]:
         """Получение информации об игроке"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -305,7 +476,7 @@ class GameDatabase:
     def update_player_balance(self, user_id: int, amount: float, transaction_type: str, description: str = ""):
         """Обновление баланса игрока и запись транзакции"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             # Обновляем баланс
@@ -313,8 +484,7 @@ class GameDatabase:
                 UPDATE players 
                 SET balance = balance + ?, 
                     total_income = total_income + CASE WHEN ? > 0 THEN ? ELSE 0 END,
-                    total_expenses = total_expenses + CASE WHEN ? < 0 THEN ABS(?) ELSE 0 END,
-                    last_active = CURRENT_TIMESTAMP
+                    total_expenses = total_expenses + CASE WHEN ? < 0 THEN ABS(?) ELSE 0 END
                 WHERE user_id = ?
             ''', (amount, amount, amount, amount, amount, user_id))
             
@@ -326,6 +496,7 @@ class GameDatabase:
             
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'balance')
             return True
         except Exception as e:
             print(f"Ошибка при обновлении баланса: {e}")
@@ -334,7 +505,7 @@ class GameDatabase:
     def add_business(self, user_id: int, business_type: str, name: str, income: float, expenses: float) -> Optional[int]:
         """Добавление нового бизнеса"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -345,6 +516,7 @@ class GameDatabase:
             business_id = pizdabol.lastrowid
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'businesses')
             return business_id
         except Exception as e:
             print(f"Ошибка при добавлении бизнеса: {e}")
@@ -353,7 +525,7 @@ class GameDatabase:
     def get_player_businesses(self, user_id: int) -> List[Dict]:
         """Получение всех бизнесов игрока"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -380,7 +552,7 @@ class GameDatabase:
                        level: int = None, improvements: List[str] = None):
         """Обновление бизнеса"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             updates = []
@@ -416,7 +588,7 @@ class GameDatabase:
     def get_top_players(self, limit: int = 10) -> List[Dict]:
         """Получение топ игроков по балансу"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -448,11 +620,12 @@ class GameDatabase:
     # ------------------- Админ операции -------------------
     def admin_set_balance(self, user_id: int, new_balance: float) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
-            pizdabol.execute('UPDATE players SET balance = ?, last_active = CURRENT_TIMESTAMP WHERE user_id = ?', (new_balance, user_id))
+            pizdabol.execute('UPDATE players SET balance = ? WHERE user_id = ?', (new_balance, user_id))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'balance')
             return True
         except Exception as e:
             print(f"Ошибка admin_set_balance: {e}")
@@ -460,11 +633,12 @@ class GameDatabase:
 
     def admin_grant_experience(self, user_id: int, xp: int) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
-            pizdabol.execute('UPDATE players SET experience = experience + ?, last_active = CURRENT_TIMESTAMP WHERE user_id = ?', (xp, user_id))
+            pizdabol.execute('UPDATE players SET experience = experience + ? WHERE user_id = ?', (xp, user_id))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'experience')
             return True
         except Exception as e:
             print(f"Ошибка admin_grant_experience: {e}")
@@ -472,7 +646,7 @@ class GameDatabase:
 
     def admin_delete_player(self, user_id: int) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('DELETE FROM transactions WHERE user_id = ?', (user_id,))
             pizdabol.execute('DELETE FROM businesses WHERE user_id = ?', (user_id,))
@@ -485,6 +659,7 @@ class GameDatabase:
             pizdabol.execute('DELETE FROM players WHERE user_id = ?', (user_id,))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'deleted')
             return True
         except Exception as e:
             print(f"Ошибка admin_delete_player: {e}")
@@ -492,7 +667,7 @@ class GameDatabase:
 
     def admin_list_players(self, limit: int = 50) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('SELECT user_id, username, first_name, balance, level, experience FROM players ORDER BY balance DESC LIMIT ?', (limit,))
             rows = pizdabol.fetchall()
@@ -508,11 +683,11 @@ class GameDatabase:
     def add_achievement(self, user_id: int, achievement_type: str, title: str, description: str):
         """Добавление достижения игроку"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
-                INSERT INTO achievements (user_id, achievement_type, title, description)
+                INSERT OR IGNORE INTO achievements (user_id, achievement_type, title, description)
                 VALUES (?, ?, ?, ?)
             ''', (user_id, achievement_type, title, description))
             
@@ -526,7 +701,7 @@ class GameDatabase:
     def get_player_achievements(self, user_id: int) -> List[Dict]:
         """Получение достижений игрока"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             pizdabol.execute('''
@@ -547,11 +722,73 @@ class GameDatabase:
         except Exception as e:
             print(f"Ошибка при получении достижений: {e}")
             return []
-    
+
+    def get_achievement_state(self, user_id: int) -> Optional[Dict]:
+        """Поля, по которым проверяются достижения: balance, level, businesses (число бизнесов)"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                SELECT balance, level, (SELECT COUNT(*) FROM businesses WHERE user_id = ?)
+                FROM players WHERE user_id = ?
+            ''', (user_id, user_id))
+            row = pizdabol.fetchone()
+            conn.close()
+            if row is None:
+                return None
+            return {'balance': row[0], 'level': row[1], 'businesses': row[2]}
+        except Exception as e:
+            print(f"Ошибка get_achievement_state: {e}")
+            return None
+
+    def award_achievements(self, user_id: int, achievements: List[Dict]) -> Set[str]:
+        """Выдать достижения ({'type', 'title', 'description'}) одной транзакцией; возвращает новые названия"""
+        inserted = set()
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            for achievement in achievements:
+                pizdabol.execute('''
+                    INSERT OR IGNORE INTO achievements (user_id, achievement_type, title, description)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, achievement['type'], achievement['title'], achievement['description']))
+                if pizdabol.rowcount:
+                    inserted.add(achievement['title'])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Ошибка award_achievements: {e}")
+        return inserted
+
+    def backfill_achievements(self, rules: List[Tuple[Dict, Dict[str, float]]]) -> int:
+        """Выдать достижения всем игрокам, подходящим под пороги правил (achievement, thresholds).
+
+        Одно INSERT ... SELECT на правило, число бизнесов считается одной группировкой.
+        """
+        expressions = {'balance': 'p.balance', 'level': 'p.level', 'businesses': 'COALESCE(b.count, 0)'}
+        conn = self._connect()
+        try:
+            pizdabol = conn.cursor()
+            added = 0
+            for achievement, thresholds in rules:
+                condition = ' AND '.join(f'{expressions[field]} >= ?' for field in thresholds)
+                pizdabol.execute(f'''
+                    INSERT OR IGNORE INTO achievements (user_id, achievement_type, title, description)
+                    SELECT p.user_id, ?, ?, ? FROM players p
+                    LEFT JOIN (SELECT user_id, COUNT(*) AS count FROM businesses GROUP BY user_id) b
+                        ON b.user_id = p.user_id
+                    WHERE {condition}
+                ''', (achievement['type'], achievement['title'], achievement['description'], *thresholds.values()))
+                added += pizdabol.rowcount
+            conn.commit()
+            return added
+        finally:
+            conn.close()
+
     def update_rating(self, user_id: int, category: str, score: float):
         """Обновление рейтинга игрока"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             # Обновляем или добавляем рейтинг
@@ -582,13 +819,14 @@ class GameDatabase:
     # ------------------- Сотрудники -------------------
     def add_employee(self, business_id: int, full_name: str, role: str, salary: float, performance: float = 1.0) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 INSERT INTO employees (business_id, full_name, role, salary, performance)
                 VALUES (?, ?, ?, ?, ?)
             ''', (business_id, full_name, role, salary, performance))
             emp_id = pizdabol.lastrowid
+            self._change_payroll(pizdabol, business_id, salary, 1)
             conn.commit()
             conn.close()
             return emp_id
@@ -596,16 +834,18 @@ class GameDatabase:
             print(f"Ошибка при добавлении сотрудника: {e}")
             return None
 
-    def get_business_employees(self, business_id: int) -> List[Dict]:
+    def get_business_employees(self, business_id: int, limit: int = -1) -> List[Dict]:
+        """Сотрудники бизнеса, новые первыми; limit=-1 — все"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, full_name, role, salary, performance, hired_at
                 FROM employees
                 WHERE business_id = ?
                 ORDER BY id DESC
-            ''', (business_id,))
+                LIMIT ?
+            ''', (business_id, limit))
             rows = pizdabol.fetchall()
             conn.close()
             res = []
@@ -621,9 +861,17 @@ class GameDatabase:
 
     def delete_employee(self, employee_id: int) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
+            pizdabol.execute('SELECT business_id, salary FROM employees WHERE id = ?', (employee_id,))
+            row = pizdabol.fetchone()
+            if row is None:
+                conn.close()
+                return False
+            # Бизнес и зарплата сотрудника не меняются; rowcount защищает от повторного увольнения
             pizdabol.execute('DELETE FROM employees WHERE id = ?', (employee_id,))
+            if pizdabol.rowcount:
+                self._change_payroll(pizdabol, row[0], -(row[1] or 0), -1)
             conn.commit()
             conn.close()
             return True
@@ -633,30 +881,97 @@ class GameDatabase:
 
     def get_total_employees_salary(self, user_id: int) -> float:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
-            pizdabol.execute('''
-                SELECT COALESCE(SUM(e.salary), 0)
-                FROM employees e
-                JOIN businesses b ON b.id = e.business_id
-                WHERE b.user_id = ?
-            ''', (user_id,))
-            total = pizdabol.fetchone()[0] or 0.0
+            pizdabol.execute('SELECT payroll_total FROM players WHERE user_id = ?', (user_id,))
+            row = pizdabol.fetchone()
             conn.close()
-            return float(total)
+            return float(row[0] or 0.0) if row else 0.0
         except Exception as e:
             print(f"Ошибка при расчете зарплат: {e}")
             return 0.0
 
+    def get_business_payroll(self, business_id: int) -> Dict:
+        """Итоги по сотрудникам бизнеса: {'payroll_total', 'headcount'}"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('SELECT payroll_total, headcount FROM businesses WHERE id = ?', (business_id,))
+            row = pizdabol.fetchone()
+            conn.close()
+            return {'payroll_total': float(row[0] or 0.0), 'headcount': int(row[1] or 0)} if row else \
+                {'payroll_total': 0.0, 'headcount': 0}
+        except Exception as e:
+            print(f"Ошибка get_business_payroll: {e}")
+            return {'payroll_total': 0.0, 'headcount': 0}
+
+    @staticmethod
+    def _change_payroll(pizdabol: sqlite3.Cursor, business_id: int, salary: float, headcount: int):
+        pizdabol.execute('''
+            UPDATE businesses SET payroll_total = payroll_total + ?, headcount = headcount + ?
+            WHERE id = ?
+        ''', (salary, headcount, business_id))
+        pizdabol.execute('''
+            UPDATE players SET payroll_total = payroll_total + ?, headcount = headcount + ?
+            WHERE user_id = (SELECT user_id FROM businesses WHERE id = ?)
+        ''', (salary, headcount, business_id))
+
+    @staticmethod
+    def _sync_payroll_totals(pizdabol: sqlite3.Cursor) -> Dict[str, int]:
+        # Фактические итоги считаются одной группировкой по employees во временные таблицы
+        pizdabol.execute('DROP TABLE IF EXISTS temp.payroll_business')
+        pizdabol.execute('DROP TABLE IF EXISTS temp.payroll_player')
+        pizdabol.execute('''
+            CREATE TEMP TABLE payroll_business AS
+            SELECT b.id AS id, b.user_id AS user_id, COALESCE(SUM(e.salary), 0) AS payroll_total,
+                   COUNT(e.id) AS headcount
+            FROM businesses b LEFT JOIN employees e ON e.business_id = b.id
+            GROUP BY b.id
+        ''')
+        pizdabol.execute('''
+            CREATE TEMP TABLE payroll_player AS
+            SELECT p.user_id AS user_id, COALESCE(SUM(f.payroll_total), 0) AS payroll_total,
+                   COALESCE(SUM(f.headcount), 0) AS headcount
+            FROM players p LEFT JOIN payroll_business f ON f.user_id = p.user_id
+            GROUP BY p.user_id
+        ''')
+        fixed = {}
+        for table, key, facts in (('businesses', 'id', 'payroll_business'), ('players', 'user_id', 'payroll_player')):
+            pizdabol.execute(f'''
+                SELECT f.payroll_total, f.headcount, t.{key} FROM {table} t JOIN {facts} f ON f.{key} = t.{key}
+                WHERE ABS(COALESCE(t.payroll_total, 0) - f.payroll_total) > 0.005
+                   OR COALESCE(t.headcount, 0) != f.headcount
+            ''')
+            rows = pizdabol.fetchall()
+            pizdabol.executemany(f'UPDATE {table} SET payroll_total = ?, headcount = ? WHERE {key} = ?', rows)
+            fixed[table] = len(rows)
+        pizdabol.execute('DROP TABLE temp.payroll_business')
+        pizdabol.execute('DROP TABLE temp.payroll_player')
+        return fixed
+
+    def check_payroll_totals(self) -> Dict[str, int]:
+        """Сверить payroll_total / headcount бизнесов и игроков с employees и исправить расхождения.
+
+        Возвращает число исправленных строк: {'businesses': N, 'players': M}.
+        """
+        conn = self._connect()
+        try:
+            fixed = self._sync_payroll_totals(conn.cursor())
+            conn.commit()
+            return fixed
+        finally:
+            conn.close()
+
     # ------------------- Посетители и отзывы -------------------
     def add_visitor(self, business_id: int, visitor_name: str, spent: float, rating: Optional[int] = None) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                INSERT INTO visitors (business_id, visitor_name, spent, rating, reviewed)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (business_id, visitor_name, spent, rating, 1 if rating is not None else 0))
+                INSERT INTO visitors (business_id, name_last, name_first, name_middle, spent, rating, reviewed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (business_id, *self.text_codes.encode_name(pizdabol, visitor_name), spent, rating,
+                  1 if rating is not None else 0))
             visitor_id = pizdabol.lastrowid
             conn.commit()
             conn.close()
@@ -667,12 +982,13 @@ class GameDatabase:
 
     def add_review(self, business_id: int, visitor_name: str, rating: int, text: str) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                INSERT INTO reviews (business_id, visitor_name, rating, text)
-                VALUES (?, ?, ?, ?)
-            ''', (business_id, visitor_name, rating, text))
+                INSERT INTO reviews (business_id, name_last, name_first, name_middle, rating, template_id, suffix_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (business_id, *self.text_codes.encode_name(pizdabol, visitor_name), rating,
+                  *self.text_codes.encode_review(pizdabol, text)))
             review_id = pizdabol.lastrowid
             conn.commit()
             conn.close()
@@ -683,30 +999,125 @@ class GameDatabase:
 
     def get_business_reviews(self, business_id: int, limit: int = 20) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                SELECT id, visitor_name, rating, text, created_at
+                SELECT id, name_last, name_first, name_middle, rating, template_id, suffix_id, created_at
                 FROM reviews
                 WHERE business_id = ?
                 ORDER BY id DESC
                 LIMIT ?
             ''', (business_id, limit))
             rows = pizdabol.fetchall()
-            conn.close()
+            codes = self.text_codes
             res = []
             for row in rows:
                 res.append({
-                    'id': row[0], 'visitor_name': row[1], 'rating': row[2], 'text': row[3], 'created_at': row[4]
+                    'id': row[0], 'visitor_name': codes.decode_name(pizdabol, row[1:4]), 'rating': row[4],
+                    'text': codes.decode_review(pizdabol, row[5], row[6]), 'created_at': row[7]
                 })
+            conn.close()
             return res
         except Exception as e:
             print(f"Ошибка при получении отзывов: {e}")
             return []
 
+    def compact_visitors(self, retention_days: int, batch_size: int = 5000, pause: float = 0.0,
+                         vacuum_pages: int = 1000) -> Dict:
+        """Свернуть посетителей старше retention_days в visitor_daily и удалить их строки.
+
+        Строки обходятся по id (он растет вместе с visited_at) порциями по batch_size, каждая
+        порция — своя короткая транзакция: блокировка записи держится миллисекунды, между
+        порциями можно сделать паузу pause. Затем освобожденные страницы возвращаются
+        файловой системе по vacuum_pages за шаг (если у базы auto_vacuum = INCREMENTAL).
+        """
+        started = time.perf_counter()
+        conn = self._connect()
+        try:
+            pizdabol = conn.cursor()
+            page_size = pizdabol.execute('PRAGMA page_size').fetchone()[0]
+            pages_before = pizdabol.execute('PRAGMA page_count').fetchone()[0]
+            cutoff = pizdabol.execute("SELECT datetime('now', ?)", (f'-{int(retention_days)} days',)).fetchone()[0]
+            last_id, rows, batches, lock_max = 0, 0, 0, 0.0
+            while True:
+                upper = pizdabol.execute('''
+                    SELECT MAX(id) FROM (SELECT id FROM visitors WHERE id > ? ORDER BY id LIMIT ?)
+                ''', (last_id, batch_size)).fetchone()[0]
+                if upper is None:
+                    break
+                batch_started = time.perf_counter()
+                pizdabol.execute('BEGIN IMMEDIATE')
+                pizdabol.execute('''
+                    INSERT INTO visitor_daily (business_id, day, visitors, spent, rating_1, rating_2, rating_3, rating_4, rating_5)
+                    SELECT business_id, date(visited_at), COUNT(*), COALESCE(SUM(spent), 0),
+                           SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+                    FROM visitors WHERE id > ? AND id <= ? AND visited_at < ?
+                    GROUP BY business_id, date(visited_at)
+                    ON CONFLICT (business_id, day) DO UPDATE SET
+                        visitors = visitors + excluded.visitors, spent = spent + excluded.spent,
+                        rating_1 = rating_1 + excluded.rating_1, rating_2 = rating_2 + excluded.rating_2,
+                        rating_3 = rating_3 + excluded.rating_3, rating_4 = rating_4 + excluded.rating_4,
+                        rating_5 = rating_5 + excluded.rating_5
+                ''', (last_id, upper, cutoff))
+                pizdabol.execute('DELETE FROM visitors WHERE id > ? AND id <= ? AND visited_at < ?',
+                                 (last_id, upper, cutoff))
+                rows += pizdabol.rowcount
+                # Остались свежие строки — дальше по id только более новые
+                fresh = pizdabol.execute('SELECT COUNT(*) FROM visitors WHERE id > ? AND id <= ?',
+                                         (last_id, upper)).fetchone()[0]
+                conn.commit()
+                lock_max = max(lock_max, time.perf_counter() - batch_started)
+                batches += 1
+                last_id = upper
+                if fresh:
+                    break
+                if pause:
+                    time.sleep(pause)
+
+            freelist = pizdabol.execute('PRAGMA freelist_count').fetchone()[0]
+            incremental = pizdabol.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+            remaining = freelist if incremental else 0
+            while remaining:
+                pizdabol.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+                left = pizdabol.execute('PRAGMA freelist_count').fetchone()[0]
+                remaining = left if left < remaining else 0
+                if pause:
+                    time.sleep(pause)
+            pages_after = pizdabol.execute('PRAGMA page_count').fetchone()[0]
+            return {
+                'rows': rows,
+                'batches': batches,
+                'lock_max': lock_max,
+                'freelist_pages': freelist,
+                'incremental_vacuum': incremental,
+                'bytes_reclaimed': (pages_before - pages_after) * page_size,
+                'size_after': pages_after * page_size,
+                'seconds': time.perf_counter() - started,
+            }
+        finally:
+            conn.close()
+
+    def get_visitor_daily(self, business_id: int, days: int = 30) -> List[Dict]:
+        """Дневные итоги посетителей бизнеса за последние days дней (только свернутые дни)"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                SELECT day, visitors, spent, rating_1, rating_2, rating_3, rating_4, rating_5
+                FROM visitor_daily
+                WHERE business_id = ? AND day >= date('now', ?)
+                ORDER BY day
+            ''', (business_id, f'-{int(days)} days'))
+            rows = pizdabol.fetchall()
+            conn.close()
+            return [{'day': row[0], 'visitors': row[1], 'spent': row[2], 'ratings': list(row[3:])} for row in rows]
+        except Exception as e:
+            print(f"Ошибка get_visitor_daily: {e}")
+            return []
+
     def get_business_rating(self, business_id: int) -> Dict:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT COALESCE(AVG(rating), 0), COUNT(*)
@@ -724,7 +1135,7 @@ class GameDatabase:
 
     def get_top_businesses_by_reviews(self, limit: int = 10, min_reviews: int = 3) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT b.id, b.user_id, b.name, b.business_type,
@@ -754,7 +1165,7 @@ class GameDatabase:
     def create_loan(self, user_id: int, amount: float, interest_rate: float, term_days: int,
                     issued_at: str, due_date: str, penalty_rate: float = 0.01) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 INSERT INTO loans (user_id, amount, interest_rate, term_days, issued_at, due_date, remaining, status, last_interest_update, penalty_rate, overdue)
@@ -770,7 +1181,7 @@ class GameDatabase:
 
     def get_active_loans(self, user_id: int) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, amount, interest_rate, term_days, issued_at, due_date, remaining, status, last_interest_update, penalty_rate, overdue
@@ -801,7 +1212,7 @@ class GameDatabase:
 
     def get_loan_by_id(self, user_id: int, loan_id: int) -> Optional[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, amount, interest_rate, term_days, issued_at, due_date, remaining, status, last_interest_update, penalty_rate, overdue
@@ -830,7 +1241,7 @@ class GameDatabase:
 
     def repay_loan(self, user_id: int, loan_id: int, amount: float) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             # Снижаем остаток
             pizdabol.execute('''
@@ -856,7 +1267,7 @@ class GameDatabase:
         Если сегодня > due_date, дополнительно добавляется penalty_rate*remaining за каждый день просрочки и флаг overdue=1.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             conn.row_factory = sqlite3.Row
             pizdabol = conn.cursor()
             pizdabol.execute("SELECT id, amount, interest_rate, remaining, due_date, last_interest_update, penalty_rate FROM loans WHERE user_id = ? AND status = 'active'", (user_id,))
@@ -896,7 +1307,7 @@ class GameDatabase:
     def create_investment(self, user_id: int, business_id: Optional[int], strategy: str,
                           amount: float, expected_return: float, matures_at: str) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             # Волатильность зависит от стратегии
             strategy_volatility = {
@@ -921,11 +1332,12 @@ class GameDatabase:
 
     def get_investments(self, user_id: int) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, business_id, strategy, amount, expected_return, created_at, matures_at, status,
-                       COALESCE(current_value, amount) as current_value, COALESCE(volatility, 0.05) as volatility
+                       COALESCE(current_value, amount) as current_value, COALESCE(volatility, 0.05) as volatility,
+                       datetime(matures_at) <= datetime('now', 'localtime') as due
                 FROM investments WHERE user_id = ? AND status IN ('active','matured')
                 ORDER BY created_at DESC
             ''', (user_id,))
@@ -943,7 +1355,9 @@ class GameDatabase:
                     'matures_at': row[6],
                     'status': row[7],
                     'current_value': row[8],
-                    'volatility': row[9]
+                    'volatility': row[9],
+                    # срок наступил, даже если задача уведомления еще не пометила ее matured
+                    'due': bool(row[10])
                 })
             return result
         except Exception as e:
@@ -952,7 +1366,7 @@ class GameDatabase:
 
     def mark_matured_investments(self):
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 UPDATE investments SET status = 'matured'
@@ -967,18 +1381,21 @@ class GameDatabase:
 
     def claim_investment(self, user_id: int, investment_id: int) -> Optional[float]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                SELECT amount, expected_return, status, COALESCE(current_value, amount) as current_value FROM investments
+                SELECT amount, expected_return, status, COALESCE(current_value, amount) as current_value,
+                       datetime(matures_at) <= datetime('now', 'localtime')
+                FROM investments
                 WHERE id = ? AND user_id = ?
             ''', (investment_id, user_id))
             row = pizdabol.fetchone()
             if not row:
                 conn.close()
                 return None
-            amount, expected_return, status, current_value = row
-            if status != 'matured':
+            amount, expected_return, status, current_value, due = row
+            # Созревшая, но еще не помеченная уведомлением (notifier.py) тоже выплачивается
+            if status != 'matured' and not (status == 'active' and due):
                 conn.close()
                 return None
             # Выплачиваем текущую стоимость (динамическую)
@@ -996,7 +1413,7 @@ class GameDatabase:
     def update_investment_prices(self) -> bool:
         """Случайно обновляет стоимость активных инвестиций в пределах волатильности."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, COALESCE(current_value, amount) as current_value, COALESCE(volatility, 0.05) as volatility
@@ -1026,12 +1443,17 @@ class GameDatabase:
             return False
 
     def withdraw_investment(self, user_id: int, investment_id: int) -> Optional[Tuple[float, str]]:
-        """Досрочный вывод средств. Возвращает (сумма_к_выплате, статус_до) или None."""
+        """Досрочный вывод средств. Возвращает (сумма_к_выплате, статус_до) или None.
+
+        Инвестиция с наступившим сроком считается matured, даже если задача уведомления
+        еще не успела сменить статус.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                SELECT status, COALESCE(current_value, amount) as current_value
+                SELECT status, COALESCE(current_value, amount) as current_value,
+                       datetime(matures_at) <= datetime('now', 'localtime')
                 FROM investments
                 WHERE id = ? AND user_id = ? AND status IN ('active','matured')
             ''', (investment_id, user_id))
@@ -1039,7 +1461,9 @@ class GameDatabase:
             if not row:
                 conn.close()
                 return None
-            status, current_value = row
+            status, current_value, due = row
+            if due:
+                status = 'matured'
             current_value = max(0.0, float(current_value))
             # Штраф 5% при досрочном выводе, без штрафа если уже matured
             penalty = 0.0 if status == 'matured' else 0.05
@@ -1057,14 +1481,15 @@ class GameDatabase:
     # ------------------- Вспомогательные обновления игрока -------------------
     def update_player_popularity(self, user_id: int, delta: float) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                UPDATE players SET popularity = MAX(popularity + ?, 0), last_active = CURRENT_TIMESTAMP
+                UPDATE players SET popularity = MAX(popularity + ?, 0)
                 WHERE user_id = ?
             ''', (delta, user_id))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'popularity')
             return True
         except Exception as e:
             print(f"Ошибка при обновлении популярности: {e}")
@@ -1072,16 +1497,17 @@ class GameDatabase:
 
     def add_experience(self, user_id: int, gained: int) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
-                UPDATE players SET experience = experience + ?, last_active = CURRENT_TIMESTAMP
+                UPDATE players SET experience = experience + ?
                 WHERE user_id = ?
             ''', (gained, user_id))
             pizdabol.execute('SELECT experience FROM players WHERE user_id = ?', (user_id,))
             exp = pizdabol.fetchone()[0]
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'experience')
             return exp
         except Exception as e:
             print(f"Ошибка при добавлении опыта: {e}")
@@ -1090,17 +1516,17 @@ class GameDatabase:
     def apply_level_up(self, user_id: int, new_level: int, remaining_experience: int,
                        balance_bonus: float, popularity_bonus: float) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 UPDATE players
                 SET level = ?, experience = ?,
-                    balance = balance + ?, popularity = popularity + ?,
-                    last_active = CURRENT_TIMESTAMP
+                    balance = balance + ?, popularity = popularity + ?
                 WHERE user_id = ?
             ''', (new_level, remaining_experience, balance_bonus, popularity_bonus, user_id))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'level', 'experience', 'balance', 'popularity')
             return True
         except Exception as e:
             print(f"Ошибка при применении повышения уровня: {e}")
@@ -1110,7 +1536,7 @@ class GameDatabase:
     def create_production(self, business_id: int, prod_type: str, name: str, version: int,
                           ready_at: str, quantity: float, meta: Dict) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 INSERT INTO productions (business_id, prod_type, name, version, ready_at, quantity, meta)
@@ -1126,7 +1552,7 @@ class GameDatabase:
 
     def get_business_productions(self, business_id: int) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, prod_type, name, version, status, started_at, ready_at, quantity, meta
@@ -1149,7 +1575,7 @@ class GameDatabase:
 
     def set_production_status(self, prod_id: int, status: str) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('UPDATE productions SET status = ? WHERE id = ?', (status, prod_id))
             conn.commit()
@@ -1161,7 +1587,7 @@ class GameDatabase:
 
     def collect_production(self, prod_id: int, user_id_check: int) -> Optional[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT p.business_id, p.prod_type, p.name, p.version, p.status, p.ready_at, p.quantity, p.meta, b.user_id
@@ -1203,10 +1629,101 @@ class GameDatabase:
             print(f"Ошибка collect_production: {e}")
             return None
 
+    def claim_ready_notifications(self, production_ids: List[int], investment_ids: List[int]) -> Optional[Dict[str, Dict[int, Dict]]]:
+        """Пометить продукции и инвестиции уведомленными (инвестиции — созревшими).
+
+        Возвращает {'productions': {id: ...}, 'investments': {id: ...}} только для помеченных
+        сейчас: уже уведомленные, собранные или выведенные пропускаются; None при ошибке.
+        Занятая база (is_busy_error) пробрасывается: пустой ответ пометил бы всю пачку
+        уже уведомленной, и задачи не повторились бы.
+        """
+        claimed = {'productions': {}, 'investments': {}}
+        conn = self._connect()
+        try:
+            pizdabol = conn.cursor()
+            pizdabol.execute('BEGIN IMMEDIATE')
+            if production_ids:
+                marks = ','.join('?' * len(production_ids))
+                pizdabol.execute(f'''
+                    SELECT p.id, p.name, p.quantity, p.business_id, b.name, b.user_id
+                    FROM productions p JOIN businesses b ON b.id = p.business_id
+                    WHERE p.id IN ({marks}) AND p.notified = 0 AND p.status != 'collected'
+                ''', production_ids)
+                for row in pizdabol.fetchall():
+                    claimed['productions'][row[0]] = {'id': row[0], 'name': row[1], 'quantity': row[2],
+                                                      'business_id': row[3], 'business_name': row[4], 'user_id': row[5]}
+                pizdabol.executemany('UPDATE productions SET notified = 1 WHERE id = ?',
+                                     ((prod_id,) for prod_id in claimed['productions']))
+            if investment_ids:
+                marks = ','.join('?' * len(investment_ids))
+                pizdabol.execute(f'''
+                    SELECT id, user_id, strategy, amount, COALESCE(current_value, amount)
+                    FROM investments
+                    WHERE id IN ({marks}) AND notified = 0 AND status IN ('active', 'matured')
+                ''', investment_ids)
+                for row in pizdabol.fetchall():
+                    claimed['investments'][row[0]] = {'id': row[0], 'user_id': row[1], 'strategy': row[2],
+                                                      'amount': row[3], 'current_value': row[4]}
+                pizdabol.executemany("UPDATE investments SET notified = 1, status = 'matured' WHERE id = ?",
+                                     ((inv_id,) for inv_id in claimed['investments']))
+            conn.commit()
+            return claimed
+        except Exception as e:
+            if is_busy_error(e):
+                raise
+            print(f"Ошибка claim_ready_notifications: {e}")
+            return None
+        finally:
+            # Без commit транзакция откатывается и блокировка записи снимается
+            conn.close()
+
+    def release_ready_notifications(self, production_ids: List[int], investment_ids: List[int]) -> bool:
+        """Снять отметку notified, если уведомление не удалось отправить"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.executemany('UPDATE productions SET notified = 0 WHERE id = ?', ((i,) for i in production_ids))
+            pizdabol.executemany('UPDATE investments SET notified = 0 WHERE id = ?', ((i,) for i in investment_ids))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Ошибка release_ready_notifications: {e}")
+            return False
+
+    def backfill_ready_jobs(self, production_kind: str, investment_kind: str) -> int:
+        """Поставить задачи уведомлений для продукций и инвестиций, созданных без них.
+
+        ready_at и matures_at хранятся в местном времени; уже поставленные задачи не меняются.
+        """
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                INSERT INTO jobs (kind, job_key, payload, run_at)
+                SELECT ?, CAST(id AS TEXT), '{}', CAST(strftime('%s', ready_at, 'utc') AS REAL)
+                FROM productions WHERE notified = 0 AND status != 'collected'
+                ON CONFLICT DO NOTHING
+            ''', (production_kind,))
+            added = pizdabol.rowcount
+            pizdabol.execute('''
+                INSERT INTO jobs (kind, job_key, payload, run_at)
+                SELECT ?, CAST(id AS TEXT), '{}', CAST(strftime('%s', matures_at, 'utc') AS REAL)
+                FROM investments WHERE notified = 0 AND status IN ('active', 'matured')
+                ON CONFLICT DO NOTHING
+            ''', (investment_kind,))
+            added += pizdabol.rowcount
+            conn.commit()
+            conn.close()
+            return added
+        except Exception as e:
+            print(f"Ошибка backfill_ready_jobs: {e}")
+            return 0
+
     # ------------------- PvP: профили и матчи -------------------
     def ensure_pvp_profile(self, user_id: int) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', (user_id,))
             conn.commit()
@@ -1218,7 +1735,7 @@ class GameDatabase:
 
     def get_pvp_profile(self, user_id: int) -> Optional[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('SELECT user_id, rating, wins, losses, streak, cooldown_until FROM pvp_profiles WHERE user_id = ?', (user_id,))
             row = pizdabol.fetchone()
@@ -1240,7 +1757,7 @@ class GameDatabase:
     def record_pvp_match(self, challenger_id: int, opponent_id: int, winner_id: Optional[int], loser_id: Optional[int],
                          bet: float, challenger_power: float, opponent_power: float, outcome: str) -> Optional[int]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 INSERT INTO pvp_matches (challenger_id, opponent_id, winner_id, loser_id, bet, challenger_power, opponent_power, outcome)
@@ -1255,40 +1772,132 @@ class GameDatabase:
             return None
 
     def update_pvp_ratings_after_match(self, winner_id: int, loser_id: int, k_factor: float = 32.0) -> Tuple[Optional[float], Optional[float]]:
+        ratings = self.apply_pvp_results([(winner_id, loser_id)], EloEngine(k_factor))
+        if not ratings:
+            return None, None
+        return ratings[winner_id], ratings[loser_id]
+
+    def apply_pvp_results(self, results: List[Tuple[int, int]], engine: Optional[EloEngine] = None) -> Dict[int, float]:
+        """Применить матчи (winner_id, loser_id) по порядку одной транзакцией; возвращает новые рейтинги"""
+        if not results:
+            return {}
         try:
-            conn = sqlite3.connect(self.db_path)
-            pizdabol = conn.cursor()
-            pizdabol.execute('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', (winner_id,))
-            pizdabol.execute('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', (loser_id,))
-            pizdabol.execute('SELECT rating FROM pvp_profiles WHERE user_id = ?', (winner_id,))
-            w_rating = pizdabol.fetchone()[0]
-            pizdabol.execute('SELECT rating FROM pvp_profiles WHERE user_id = ?', (loser_id,))
-            l_rating = pizdabol.fetchone()[0]
-            import math
-            expected_w = 1.0 / (1.0 + math.pow(10, (l_rating - w_rating) / 400.0))
-            expected_l = 1.0 - expected_w
-            new_w = w_rating + k_factor * (1 - expected_w)
-            new_l = l_rating + k_factor * (0 - expected_l)
-            pizdabol.execute('''
-                UPDATE pvp_profiles SET rating = ?, wins = wins + 1, streak = CASE WHEN streak >= 0 THEN streak + 1 ELSE 1 END,
-                    last_fight_at = CURRENT_TIMESTAMP
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            ratings = self._apply_pvp_ratings(pizdabol, results, engine or EloEngine())
+            conn.commit()
+            conn.close()
+            return ratings
+        except Exception as e:
+            print(f"Ошибка apply_pvp_results: {e}")
+            return {}
+
+    @staticmethod
+    def _apply_pvp_ratings(pizdabol: sqlite3.Cursor, results: List[Tuple[int, int]], engine: EloEngine) -> Dict[int, float]:
+        user_ids = list({user_id for result in results for user_id in result})
+        # INSERT открывает транзакцию на запись: рейтинги ниже читаются уже под блокировкой
+        pizdabol.executemany('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', [(u,) for u in user_ids])
+        pizdabol.execute(f'''
+            SELECT user_id, rating, wins, losses, streak FROM pvp_profiles
+            WHERE user_id IN ({','.join('?' * len(user_ids))})
+        ''', user_ids)
+        states = {row[0]: RatingState(*row[1:]) for row in pizdabol.fetchall()}
+        engine.run(results, states)
+        pizdabol.executemany('''
+            UPDATE pvp_profiles SET rating = ?, wins = ?, losses = ?, streak = ?, last_fight_at = CURRENT_TIMESTAMP
+            WHERE user_id = ?
+        ''', [(*states[user_id].as_tuple(), user_id) for user_id in user_ids])
+        return {user_id: states[user_id].rating for user_id in user_ids}
+
+    def apply_pvp_batch(self, matches: List[Tuple], transfers: List[Tuple[int, float, str, str]],
+                        results: List[Tuple[int, int]], cooldowns: List[Tuple[int, int]],
+                        engine: Optional[EloEngine] = None) -> bool:
+        """Записать пачку PvP-боев одной транзакцией.
+
+        matches — строки pvp_matches (challenger_id, opponent_id, winner_id, loser_id, bet,
+        challenger_power, opponent_power, outcome); transfers — (user_id, amount, type, description);
+        results — (winner_id, loser_id) для рейтинга; cooldowns — (user_id, seconds).
+        Занятая база (is_busy_error) не глотается, а пробрасывается: пачку можно повторить.
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.executemany('''
+                INSERT INTO pvp_matches (challenger_id, opponent_id, winner_id, loser_id, bet, challenger_power, opponent_power, outcome)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', matches)
+            pizdabol.executemany('''
+                UPDATE players
+                SET balance = balance + ?,
+                    total_income = total_income + CASE WHEN ? > 0 THEN ? ELSE 0 END,
+                    total_expenses = total_expenses + CASE WHEN ? < 0 THEN ABS(?) ELSE 0 END
                 WHERE user_id = ?
-            ''', (new_w, winner_id))
-            pizdabol.execute('''
-                UPDATE pvp_profiles SET rating = ?, losses = losses + 1, streak = CASE WHEN streak <= 0 THEN streak - 1 ELSE -1 END,
-                    last_fight_at = CURRENT_TIMESTAMP
+            ''', [(amount, amount, amount, amount, amount, user_id) for user_id, amount, _, _ in transfers])
+            pizdabol.executemany('''
+                INSERT INTO transactions (user_id, type, amount, description)
+                VALUES (?, ?, ?, ?)
+            ''', [(user_id, kind, amount, description) for user_id, amount, kind, description in transfers])
+            if results:
+                self._apply_pvp_ratings(pizdabol, results, engine or EloEngine())
+            pizdabol.executemany('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', [(u,) for u, _ in cooldowns])
+            pizdabol.executemany('''
+                UPDATE pvp_profiles SET cooldown_until = datetime('now', ?)
                 WHERE user_id = ?
-            ''', (new_l, loser_id))
+            ''', [(f'+{seconds} seconds', user_id) for user_id, seconds in cooldowns])
             conn.commit()
             conn.close()
-            return new_w, new_l
         except Exception as e:
-            print(f"Ошибка update_pvp_ratings_after_match: {e}")
-            return None, None
+            if conn is not None:
+                # Без commit: транзакция откатывается и блокировка записи снимается сразу
+                conn.close()
+            if is_busy_error(e):
+                raise
+            print(f"Ошибка apply_pvp_batch: {e}")
+            return False
+        transferred, cooled = {t[0] for t in transfers}, {c[0] for c in cooldowns}
+        for user_id in transferred | cooled:
+            self._notify_player_changed(user_id, *(['balance'] if user_id in transferred else []),
+                                        *(['pvp_cooldown'] if user_id in cooled else []))
+        return True
+
+    def rebuild_pvp_ratings(self, engine: Optional[EloEngine] = None, batch_size: int = 10000) -> Dict[str, int]:
+        """Пересчитать pvp_profiles (рейтинг, победы, поражения, серии), переиграв всю историю pvp_matches"""
+        engine = engine or EloEngine()
+        conn = self._connect()
+        try:
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                SELECT winner_id, loser_id FROM pvp_matches
+                WHERE outcome != 'draw' AND winner_id IS NOT NULL AND loser_id IS NOT NULL
+                ORDER BY id
+            ''')
+            matches = 0
+
+            def stream():
+                # История читается пачками и в память целиком не загружается
+                nonlocal matches
+                while True:
+                    rows = pizdabol.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    matches += len(rows)
+                    yield from rows
+
+            states = engine.run(stream(), {})
+            pizdabol.execute('UPDATE pvp_profiles SET rating = ?, wins = 0, losses = 0, streak = 0',
+                             (engine.initial_rating,))
+            pizdabol.executemany('INSERT OR IGNORE INTO pvp_profiles (user_id) VALUES (?)', [(u,) for u in states])
+            pizdabol.executemany('UPDATE pvp_profiles SET rating = ?, wins = ?, losses = ?, streak = ? WHERE user_id = ?',
+                                 [(*state.as_tuple(), user_id) for user_id, state in states.items()])
+            conn.commit()
+            return {'matches': matches, 'players': len(states)}
+        finally:
+            conn.close()
 
     def get_pvp_matches(self, user_id: int, limit: int = 10) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT id, challenger_id, opponent_id, winner_id, loser_id, bet, challenger_power, opponent_power, outcome, created_at
@@ -1319,7 +1928,7 @@ class GameDatabase:
 
     def get_pvp_top(self, limit: int = 10) -> List[Dict]:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 SELECT p.user_id, p.username, p.first_name, pp.rating, pp.wins, pp.losses
@@ -1346,9 +1955,53 @@ class GameDatabase:
             print(f"Ошибка get_pvp_top: {e}")
             return []
 
+    def get_pvp_candidates(self, user_ids: Optional[List[int]] = None, after_user_id: int = 0,
+                           limit: int = 50000) -> List[Dict]:
+        """Поля силы игроков и конец PvP-кулдауна (unix time) для подбора соперников.
+
+        С user_ids — эти игроки; иначе страница по user_id > after_user_id (не больше limit).
+        Занятая база (is_busy_error) пробрасывается.
+        """
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            query = '''
+                SELECT p.user_id, p.username, p.first_name, p.balance, p.level, p.experience, p.popularity,
+                       CAST(strftime('%s', pp.cooldown_until) AS INTEGER)
+                FROM players p
+                LEFT JOIN pvp_profiles pp ON pp.user_id = p.user_id
+            '''
+            rows = []
+            if user_ids is None:
+                rows = pizdabol.execute(query + " WHERE p.user_id > ? ORDER BY p.user_id LIMIT ?",
+                                        (after_user_id, limit)).fetchall()
+            else:
+                ids = list(user_ids)
+                # Не больше 500 параметров в одном IN
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    pizdabol.execute(query + f" WHERE p.user_id IN ({','.join('?' * len(chunk))})", chunk)
+                    rows.extend(pizdabol.fetchall())
+            conn.close()
+            return [{
+                'user_id': row[0],
+                'username': row[1],
+                'first_name': row[2],
+                'balance': row[3],
+                'level': row[4],
+                'experience': row[5],
+                'popularity': row[6],
+                'cooldown_until': row[7] or 0
+            } for row in rows]
+        except Exception as e:
+            if is_busy_error(e):
+                raise
+            print(f"Ошибка get_pvp_candidates: {e}")
+            return []
+
     def set_pvp_cooldown(self, user_id: int, seconds: int) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('''
                 UPDATE pvp_profiles SET cooldown_until = datetime('now', ?)
@@ -1356,6 +2009,7 @@ class GameDatabase:
             ''', (f'+{seconds} seconds', user_id))
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'pvp_cooldown')
             return True
         except Exception as e:
             print(f"Ошибка set_pvp_cooldown: {e}")
@@ -1363,7 +2017,7 @@ class GameDatabase:
 
     def pvp_cooldown_remaining(self, user_id: int) -> int:
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             pizdabol.execute('SELECT COALESCE((strftime("%s", cooldown_until) - strftime("%s", "now")), 0) FROM pvp_profiles WHERE user_id = ?', (user_id,))
             row = pizdabol.fetchone()
@@ -1378,7 +2032,7 @@ class GameDatabase:
     def set_cooldown(self, user_id: int, action_type: str, minutes: int) -> bool:
             """Установить кулдаун для действия"""
             try:
-                conn = sqlite3.connect(self.db_path)
+                conn = self._connect()
                 pizdabol = conn.cursor()
                 pizdabol.execute('''
                     INSERT OR REPLACE INTO cooldowns (user_id, action_type, expires_at)
@@ -1394,7 +2048,7 @@ class GameDatabase:
     def get_cooldown_remaining(self, user_id: int, action_type: str) -> int:
                 """Получить оставшееся время кулдауна в секундах"""
                 try:
-                    conn = sqlite3.connect(self.db_path)
+                    conn = self._connect()
                     pizdabol = conn.cursor()
                     pizdabol.execute('''
                         SELECT COALESCE((strftime("%s", expires_at) - strftime("%s", "now")), 0)
@@ -1414,7 +2068,7 @@ class GameDatabase:
     def sell_business(self, user_id: int, business_id: int) -> Dict:
         """Продаём бизнес ((((Я мистер бiзnуs))))"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             pizdabol = conn.cursor()
             
             # Получаем информацию о бизнесе
@@ -1454,7 +2108,13 @@ class GameDatabase:
                 WHERE user_id = ?
             ''', (total_value, user_id))
             
-            # Удаляем бизнес
+            # Удаляем бизнес; его сотрудники больше не входят в зарплаты игрока
+            pizdabol.execute('''
+                UPDATE players SET
+                    payroll_total = payroll_total - (SELECT payroll_total FROM businesses WHERE id = ?),
+                    headcount = headcount - (SELECT headcount FROM businesses WHERE id = ?)
+                WHERE user_id = ?
+            ''', (business_id, business_id, user_id))
             pizdabol.execute('DELETE FROM businesses WHERE id = ?', (business_id,))
             
             # Записываем транзакцию
@@ -1465,6 +2125,7 @@ class GameDatabase:
             
             conn.commit()
             conn.close()
+            self._notify_player_changed(user_id, 'balance', 'businesses')
             
             return {
                 'success': True, 
@@ -1475,3 +2136,240 @@ class GameDatabase:
         except Exception as e:
             print(f"Ошибка sell_business: {e}")
             return {'success': False, 'message': 'Ошибка при продаже бизнеса'}
+
+    _INSERT_JOB_SQL = '''
+        INSERT INTO jobs (kind, job_key, payload, run_at, max_attempts, lease_owner, lease_until)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    _SCHEDULE_JOB_SQL = _INSERT_JOB_SQL + '''
+        ON CONFLICT (kind, job_key) DO UPDATE SET
+            payload = excluded.payload, run_at = excluded.run_at, max_attempts = excluded.max_attempts,
+            status = 'pending', attempts = 0, last_error = NULL,
+            lease_owner = excluded.lease_owner, lease_until = excluded.lease_until
+    '''
+
+    def schedule_job(self, kind: str, run_at: float, payload: Optional[Dict] = None, key: Optional[str] = None,
+                     max_attempts: int = 5, lease_owner: Optional[str] = None, lease_until: float = 0.0,
+                     replace: bool = True) -> Optional[int]:
+        """Поставить задачу на время run_at (unix); задача с тем же (kind, key) переносится,
+        а при replace=False остается как есть"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            sql = self._SCHEDULE_JOB_SQL if replace else self._INSERT_JOB_SQL + 'ON CONFLICT DO NOTHING'
+            pizdabol.execute(sql, (kind, key, json.dumps(payload or {}), run_at, max_attempts,
+                                                       lease_owner, lease_until))
+            if key is None:
+                job_id = pizdabol.lastrowid
+            else:
+                pizdabol.execute('SELECT id FROM jobs WHERE kind = ? AND job_key = ?', (kind, key))
+                job_id = pizdabol.fetchone()[0]
+            conn.commit()
+            conn.close()
+            return job_id
+        except Exception as e:
+            print(f"Ошибка schedule_job: {e}")
+            return None
+
+    def schedule_jobs(self, jobs: List[Tuple[str, float, Optional[Dict], Optional[str]]], max_attempts: int = 5) -> bool:
+        """Пакетная постановка задач (kind, run_at, payload, key) одной транзакцией"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.executemany(self._SCHEDULE_JOB_SQL, ((kind, key, json.dumps(payload or {}), run_at, max_attempts,
+                                                           None, 0.0) for kind, run_at, payload, key in jobs))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Ошибка schedule_jobs: {e}")
+            return False
+
+    def cancel_job(self, kind: str, key: str) -> bool:
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute("DELETE FROM jobs WHERE kind = ? AND job_key = ? AND status = 'pending'", (kind, key))
+            deleted = pizdabol.rowcount > 0
+            conn.commit()
+            conn.close()
+            return deleted
+        except Exception as e:
+            print(f"Ошибка cancel_job: {e}")
+            return False
+
+    def lease_jobs(self, owner: str, due_before: float, now: float, lease_until: float, limit: int = 1000) -> List[Dict]:
+        """Арендовать до limit задач с run_at <= due_before, не арендованных другими на момент now.
+
+        Выборка и аренда — одна транзакция BEGIN IMMEDIATE, поэтому задачу получает
+        только один процесс. Аренда умершего процесса истекает в lease_until.
+        """
+        conn = self._connect()
+        try:
+            pizdabol = conn.cursor()
+            pizdabol.execute('BEGIN IMMEDIATE')
+            pizdabol.execute('''
+                SELECT id, kind, job_key, payload, run_at, attempts, max_attempts
+                FROM jobs
+                WHERE status = 'pending' AND run_at <= ? AND lease_until < ?
+                ORDER BY run_at
+                LIMIT ?
+            ''', (due_before, now, limit))
+            rows = pizdabol.fetchall()
+            pizdabol.executemany('UPDATE jobs SET lease_owner = ?, lease_until = ? WHERE id = ?',
+                                 ((owner, lease_until, row[0]) for row in rows))
+            conn.commit()
+            return [{'id': row[0], 'kind': row[1], 'key': row[2], 'payload': json.loads(row[3] or '{}'),
+                     'run_at': row[4], 'attempts': row[5], 'max_attempts': row[6]} for row in rows]
+        except Exception as e:
+            print(f"Ошибка lease_jobs: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def finish_jobs(self, owner: str, done: List[Tuple[int, float]], rescheduled: List[Tuple[float, int, float]],
+                    retried: List[Tuple[float, str, int, float]], keep_before: float = 0.0,
+                    lease_until: float = 0.0) -> bool:
+        """Итоги выполненных задач одной транзакцией.
+
+        done — (id, run_at) выполненных (удаляются), rescheduled — (новый run_at, id, run_at)
+        повторяющихся, retried — (новый run_at, ошибка, id, run_at) упавших: attempts + 1,
+        после max_attempts статус failed. Перенесенные не позже keep_before остаются
+        арендованными owner до lease_until, с остальных аренда снимается. Меняются только
+        задачи, арендованные owner и не перенесенные schedule_job, пока выполнялись.
+        """
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.executemany('DELETE FROM jobs WHERE id = ? AND lease_owner = ? AND run_at = ?',
+                                 ((job_id, owner, run_at) for job_id, run_at in done))
+            pizdabol.executemany('''
+                UPDATE jobs SET run_at = ?1, attempts = 0,
+                    lease_owner = CASE WHEN ?1 <= ?5 THEN lease_owner END,
+                    lease_until = CASE WHEN ?1 <= ?5 THEN ?6 ELSE 0 END
+                WHERE id = ?2 AND lease_owner = ?3 AND run_at = ?4
+            ''', ((new_run_at, job_id, owner, run_at, keep_before, lease_until)
+                  for new_run_at, job_id, run_at in rescheduled))
+            pizdabol.executemany('''
+                UPDATE jobs SET run_at = ?1, last_error = ?2, attempts = attempts + 1,
+                    status = CASE WHEN attempts + 1 >= max_attempts THEN 'failed' ELSE 'pending' END,
+                    lease_owner = CASE WHEN ?1 <= ?6 AND attempts + 1 < max_attempts THEN lease_owner END,
+                    lease_until = CASE WHEN ?1 <= ?6 AND attempts + 1 < max_attempts THEN ?7 ELSE 0 END
+                WHERE id = ?3 AND lease_owner = ?4 AND run_at = ?5
+            ''', ((new_run_at, error, job_id, owner, run_at, keep_before, lease_until)
+                  for new_run_at, error, job_id, run_at in retried))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Ошибка finish_jobs: {e}")
+            return False
+
+    def release_jobs(self, owner: str) -> int:
+        """Снять аренду owner с невыполненных задач (остановка процесса)"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute("UPDATE jobs SET lease_owner = NULL, lease_until = 0 WHERE lease_owner = ? AND status = 'pending'",
+                             (owner,))
+            released = pizdabol.rowcount
+            conn.commit()
+            conn.close()
+            return released
+        except Exception as e:
+            print(f"Ошибка release_jobs: {e}")
+            return 0
+
+    def get_job_counts(self) -> Dict[str, int]:
+        """Число задач по статусам"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+            counts = dict(pizdabol.fetchall())
+            conn.close()
+            return counts
+        except Exception as e:
+            print(f"Ошибка get_job_counts: {e}")
+            return {}
+
+    def start_market_event(self, event: Dict, started_at: float, expires_at: float) -> Optional[int]:
+        """Записать рыночное событие {type, title, description, income_multiplier, expense_multiplier}"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                INSERT INTO market_events (event_type, title, description, income_multiplier, expense_multiplier,
+                                           started_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (event['type'], event.get('title'), event.get('description'), event.get('income_multiplier', 1.0),
+                  event.get('expense_multiplier', 1.0), started_at, expires_at))
+            event_id = pizdabol.lastrowid
+            conn.commit()
+            conn.close()
+            return event_id
+        except Exception as e:
+            print(f"Ошибка start_market_event: {e}")
+            return None
+
+    def get_active_market_event(self, now: float) -> Optional[Dict]:
+        """Событие, действующее в момент now (последнее начатое), или None"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('''
+                SELECT id, event_type, title, description, income_multiplier, expense_multiplier, started_at, expires_at
+                FROM market_events
+                WHERE expires_at > ? AND started_at <= ?
+                ORDER BY started_at DESC
+                LIMIT 1
+            ''', (now, now))
+            row = pizdabol.fetchone()
+            conn.close()
+            if not row:
+                return None
+            return {'id': row[0], 'type': row[1], 'title': row[2], 'description': row[3],
+                    'income_multiplier': row[4], 'expense_multiplier': row[5],
+                    'started_at': row[6], 'expires_at': row[7]}
+        except Exception as e:
+            print(f"Ошибка get_active_market_event: {e}")
+            return None
+
+    def record_activity(self, last_seen: List[Tuple[str, int]], days: List[Tuple[str, int]],
+                        prune_before: Optional[str] = None) -> Optional[int]:
+        """Записать накопленную активность одной транзакцией.
+
+        last_seen — (время UTC 'YYYY-MM-DD HH:MM:SS', user_id): last_active только растет;
+        days — (день 'YYYY-MM-DD', user_id) для player_activity; дни раньше prune_before удаляются.
+        Возвращает число измененных строк players, None при ошибке.
+        """
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.executemany('''
+                UPDATE players SET last_active = ?1
+                WHERE user_id = ?2 AND (last_active IS NULL OR last_active < ?1)
+            ''', last_seen)
+            updated = pizdabol.rowcount
+            pizdabol.executemany('INSERT OR IGNORE INTO player_activity (day, user_id) VALUES (?, ?)', days)
+            if prune_before is not None:
+                pizdabol.execute('DELETE FROM player_activity WHERE day < ?', (prune_before,))
+            conn.commit()
+            conn.close()
+            return updated
+        except Exception as e:
+            print(f"Ошибка record_activity: {e}")
+            return None
+
+    def count_active_players(self, since_day: str) -> int:
+        """Число разных игроков, активных с дня since_day включительно"""
+        try:
+            conn = self._connect()
+            pizdabol = conn.cursor()
+            pizdabol.execute('SELECT COUNT(DISTINCT user_id) FROM player_activity WHERE day >= ?', (since_day,))
+            count = pizdabol.fetchone()[0]
+            conn.close()
+            return count
+        except Exception as e:
+            print(f"Ошибка count_active_players: {e}")
+            return 0
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Монте-Карло симулятор экономики для балансировки BUSINESS_TYPES, IMPROVEMENTS,
+кредитов и инвестиций.
+
+Синтетические игроки живут N игровых дней без базы и бота: доход, опыт и уровни
+считает GameLogic, кредиты выдает AdvancedGameFeatures.process_loan, проценты,
+пеня и курс инвестиций повторяют формулы GameDatabase. Поведение игрока задает
+Policy (вероятности купить улучшение, открыть бизнес, взять кредит, вложиться).
+
+Игроки делятся на порции фиксированного размера, каждая порция считается в своем
+процессе со своим seed — результат не зависит от числа процессов. На выходе:
+перцентили баланса по контрольным дням, рост денежной массы (инфляция), дни до
+достижения уровней и потоки денег (источники и стоки).
+
+Пример: python economy_sim.py --players 20000 --days 90 --workers 8
+        python economy_sim.py --set business.coffee_shop.base_income=1500 --json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from advanced_features import AdvancedGameFeatures
+from config import BUSINESS_TYPES, IMPROVEMENTS, STARTING_BALANCE
+from game_logic import GameLogic
+
+PERCENTILES = (10, 50, 90, 99)
+# Статьи потоков денег: положительные создают деньги, отрицательные изымают
+FLOWS = ('income', 'expenses', 'level_bonus', 'events', 'loans_issued', 'loans_repaid',
+         'investments_in', 'investments_out', 'businesses', 'improvements')
+INVESTMENT_VOLATILITY = {'conservative': 0.02, 'balanced': 0.05, 'aggressive': 0.10}
+
+
+class Policy:
+    """Поведение синтетического игрока: вероятности действий за игровой день"""
+
+    def __init__(self, improve: float = 0.5, expand: float = 0.3, loan: float = 0.05, invest: float = 0.1,
+                 events_per_day: int = 2, max_businesses: int = 5, reserve: float = 2.0,
+                 loan_amount: float = 50000, loan_days: int = 7,
+                 invest_amount: float = 20000, invest_days: int = 3, invest_strategy: str = 'balanced'):
+        self.improve = improve
+        self.expand = expand
+        self.loan = loan
+        self.invest = invest
+        self.events_per_day = events_per_day
+        self.max_businesses = max_businesses
+        # Покупка совершается, только если после нее остается reserve × цена
+        self.reserve = reserve
+        self.loan_amount = loan_amount
+        self.loan_days = loan_days
+        self.invest_amount = invest_amount
+        self.invest_days = invest_days
+        self.invest_strategy = invest_strategy
+
+
+def apply_overrides(overrides: Sequence[str]):
+    """Подменить параметры конфигурации: business.<тип>.<поле>=N, improvement.<id>.<поле>=N"""
+    tables = {'business': BUSINESS_TYPES, 'improvement': IMPROVEMENTS}
+    for item in overrides:
+        path, _, value = item.partition('=')
+        table, _, rest = path.partition('.')
+        key, _, field = rest.partition('.')
+        if table not in tables or key not in tables[table] or not field or not value:
+            raise ValueError(f"Неизвестный параметр: {item}")
+        tables[table][key][field] = float(value)
+
+
+class _Player:
+    """Состояние игрока в симуляции; player — словарь в формате строки players"""
+
+    __slots__ = ('player', 'businesses', 'loans', 'investments', 'level_days')
+
+    def __init__(self):
+        self.player = {'balance': float(STARTING_BALANCE), 'level': 1, 'experience': 0, 'popularity': 1.0,
+                       'total_income': 0.0, 'total_expenses': 0.0}
+        self.businesses: List[Dict] = []
+        # [остаток, сумма, ставка, пеня, дней до срока]
+        self.loans: List[List[float]] = []
+        # [текущая стоимость, вложено, волатильность, дней до погашения]
+        self.investments: List[List[float]] = []
+        self.level_days: Dict[int, int] = {}
+
+
+class EconomySimulation:
+    """Прогон одной порции игроков; random сеется снаружи, потому что GameLogic использует модуль random"""
+
+    def __init__(self, policy: Policy, logic: Optional[GameLogic] = None,
+                 advanced: Optional[AdvancedGameFeatures] = None):
+        self.policy = policy
+        self.logic = logic or GameLogic()
+        self.advanced = advanced or AdvancedGameFeatures()
+        self.flows = dict.fromkeys(FLOWS, 0.0)
+
+    def _move(self, state: _Player, flow: str, amount: float):
+        state.player['balance'] += amount
+        self.flows[flow] += amount
+        if amount > 0:
+            state.player['total_income'] += amount
+        else:
+            state.player['total_expenses'] -= amount
+
+    def step(self, state: _Player, day: int):
+        player, policy = state.player, self.policy
+        # Ежедневный доход (как daily_income, без зарплат сотрудников)
+        progress = self.logic.calculate_daily_progress(player, state.businesses)
+        self._move(state, 'income', progress['total_income'])
+        self._move(state, 'expenses', -progress['total_expenses'])
+        player['experience'] += progress['experience_gained']
+        while self.logic.can_level_up(player['experience'], player['level']):
+            result = self.logic.level_up_player(player)
+            player['level'] = result['new_level']
+            player['experience'] = result['remaining_experience']
+            player['popularity'] += result['bonuses']['popularity_bonus']
+            self._move(state, 'level_bonus', result['bonuses']['balance_bonus'])
+            state.level_days[player['level']] = day
+
+        # Случайные события: бот применяет только income_change и popularity_change
+        for _ in range(policy.events_per_day if state.businesses else 0):
+            event = self.logic.get_random_event(player['level'])
+            if event:
+                result = self.logic.apply_random_event(player, random.choice(state.businesses), event)
+                self._move(state, 'events', result['income_change'])
+                player['popularity'] = max(player['popularity'] + result['popularity_change'], 0)
+
+        self._step_loans(state)
+        self._step_investments(state)
+
+        # Расширение: новый бизнес по цене запуска base_expenses × 10
+        if len(state.businesses) < policy.max_businesses and random.random() < policy.expand:
+            affordable = [key for key, info in BUSINESS_TYPES.items()
+                          if player['balance'] >= info['base_expenses'] * 10 * policy.reserve]
+            if affordable:
+                info = BUSINESS_TYPES[random.choice(affordable)]
+                self._move(state, 'businesses', -info['base_expenses'] * 10)
+                state.businesses.append({'income': info['base_income'], 'expenses': info['base_expenses'],
+                                         'improvements': []})
+
+        # Улучшение: самое дешевое из еще не купленных для случайного бизнеса
+        if state.businesses and random.random() < policy.improve:
+            business = random.choice(state.businesses)
+            missing = sorted((info['cost'], key) for key, info in IMPROVEMENTS.items()
+                             if key not in business['improvements'])
+            if missing and self.logic.can_afford_improvement(player['balance'] / policy.reserve, missing[0][1]):
+                result = self.logic.apply_improvement(business, missing[0][1])
+                business.update(income=result['new_income'], expenses=result['new_expenses'],
+                                improvements=result['new_improvements'])
+                self._move(state, 'improvements', -result['cost'])
+
+    def _step_loans(self, state: _Player):
+        player, policy = state.player, self.policy
+        for loan in state.loans:
+            # Проценты на основную сумму; после срока — пеня × дни просрочки (accrue_interest_for_user)
+            loan[0] += loan[1] * loan[2]
+            loan[4] -= 1
+            if loan[4] < 0:
+                loan[0] += loan[0] * loan[3] * -loan[4]
+            if loan[4] <= 0:
+                payment = min(loan[0], max(player['balance'], 0))
+                if payment > 0:
+                    self._move(state, 'loans_repaid', -payment)
+                    loan[0] -= payment
+        state.loans = [loan for loan in state.loans if loan[0] > 1e-6]
+        if not state.loans and random.random() < policy.loan:
+            result = self.advanced.process_loan(player, policy.loan_amount, policy.loan_days)
+            if result['success']:
+                loan = result['loan_info']
+                state.loans.append([loan['amount'], loan['amount'], loan['interest_rate'], loan['penalty_rate'],
+                                    loan['term_days']])
+                self._move(state, 'loans_issued', loan['amount'])
+
+    def _step_investments(self, state: _Player):
+        player, policy = state.player, self.policy
+        remaining = []
+        for investment in state.investments:
+            # Курс меняется так же, как в update_investment_prices
+            investment[0] = max(0.0, investment[0] * (1.0 + random.uniform(-investment[2], investment[2])))
+            investment[3] -= 1
+            if investment[3] <= 0:
+                self._move(state, 'investments_out', investment[0])
+            else:
+                remaining.append(investment)
+        state.investments = remaining
+        if random.random() < policy.invest and player['balance'] >= policy.invest_amount * policy.reserve:
+            self._move(state, 'investments_in', -policy.invest_amount)
+            state.investments.append([policy.invest_amount, policy.invest_amount,
+                                      INVESTMENT_VOLATILITY.get(policy.invest_strategy, 0.05), policy.invest_days])
+
+    def run(self, players: int, days: int, checkpoints: Sequence[int]) -> Dict:
+        """Прогнать players игроков на days дней; балансы сохраняются в контрольные дни"""
+        states = [_Player() for _ in range(players)]
+        money = [sum(s.player['balance'] for s in states)]
+        snapshots = {}
+        for day in range(1, days + 1):
+            for state in states:
+                self.step(state, day)
+            money.append(sum(s.player['balance'] for s in states))
+            if day in checkpoints:
+                snapshots[day] = [s.player['balance'] for s in states]
+        return {
+            'money': money,
+            'balances': snapshots,
+            'levels': [s.player['level'] for s in states],
+            'businesses': [len(s.businesses) for s in states],
+            'level_days': [s.level_days for s in states],
+            'flows': self.flows,
+        }
+
+
+def _run_chunk(args: Tuple) -> Dict:
+    players, days, checkpoints, seed, policy, overrides = args
+    apply_overrides(overrides)
+    random.seed(seed)
+    return EconomySimulation(policy).run(players, days, checkpoints)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу; values должен быть отсортирован"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(q / 100 * len(values)))) - 1]
+
+
+def _distribution(values: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    result = {f'p{q}': percentile(ordered, q) for q in PERCENTILES}
+    result['mean'] = sum(ordered) / len(ordered) if ordered else 0.0
+    return result
+
+
+def simulate(players: int, days: int, policy: Optional[Policy] = None, workers: int = 1, seed: int = 42,
+             chunk_size: int = 1000, checkpoints: Optional[Sequence[int]] = None,
+             overrides: Sequence[str] = ()) -> Dict:
+    """Прогнать симуляцию и свести распределения по всем порциям.
+
+    overrides подменяют конфигурацию в каждом процессе, при workers=1 — в текущем.
+    """
+    policy = policy or Policy()
+    if checkpoints is None:
+        step = max(1, days // 6)
+        checkpoints = sorted({*range(step, days + 1, step), days})
+    checkpoints = sorted(set(checkpoints))
+    sizes = [min(chunk_size, players - start) for start in range(0, players, chunk_size)]
+    tasks = [(size, days, checkpoints, seed * 1_000_003 + index, policy, tuple(overrides))
+             for index, size in enumerate(sizes)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_run_chunk, tasks))
+    else:
+        chunks = [_run_chunk(task) for task in tasks]
+
+    money = [sum(values) for values in zip(*(chunk['money'] for chunk in chunks))]
+    inflation = []
+    previous = 0
+    for day in checkpoints:
+        # Средний дневной рост денежной массы между контрольными днями
+        growth = (money[day] / money[previous]) ** (1 / (day - previous)) - 1 if money[previous] > 0 else 0.0
+        inflation.append({'day': day, 'money_supply': money[day], 'daily_growth': growth})
+        previous = day
+
+    level_days: Dict[int, List[int]] = {}
+    for chunk in chunks:
+        for reached in chunk['level_days']:
+            for level, day in reached.items():
+                level_days.setdefault(level, []).append(day)
+    time_to_level = {level: {'reached': len(values) / players, **_distribution(values)}
+                     for level, values in sorted(level_days.items())}
+
+    flows = dict.fromkeys(FLOWS, 0.0)
+    for chunk in chunks:
+        for key, value in chunk['flows'].items():
+            flows[key] += value
+    return {
+        'players': players,
+        'days': days,
+        'seed': seed,
+        'balance': {day: _distribution([b for chunk in chunks for b in chunk['balances'][day]]) for day in checkpoints},
+        'inflation': inflation,
+        'time_to_level': time_to_level,
+        'final_level': _distribution([v for chunk in chunks for v in chunk['levels']]),
+        'final_businesses': _distribution([v for chunk in chunks for v in chunk['businesses']]),
+        'flows': flows,
+    }
+
+
+def print_report(report: Dict):
+    columns = ''.join(f"{f'p{q}':>14}" for q in PERCENTILES)
+    print(f"Игроков: {report['players']:,}, дней: {report['days']}, seed: {report['seed']}\n")
+    print(f"{'День':<6}{columns}{'среднее':>14}{'рост/день':>12}")
+    for point in report['inflation']:
+        dist = report['balance'][point['day']]
+        values = ''.join(f"{dist[f'p{q}']:>14,.0f}" for q in PERCENTILES)
+        print(f"{point['day']:<6}{values}{dist['mean']:>14,.0f}{point['daily_growth']:>11.2%}")
+    print(f"\n{'Уровень':<9}{'достигли':>10}{'p10':>8}{'p50':>8}{'p90':>8}  (день)")
+    for level, dist in report['time_to_level'].items():
+        print(f"{level:<9}{dist['reached']:>10.1%}{dist['p10']:>8.0f}{dist['p50']:>8.0f}{dist['p90']:>8.0f}")
+    print(f"\nУровень в конце: p50 {report['final_level']['p50']:.0f}, p90 {report['final_level']['p90']:.0f}; "
+          f"бизнесов: p50 {report['final_businesses']['p50']:.0f}")
+    print("\nПотоки денег на игрока:")
+    for key, value in report['flows'].items():
+        print(f"  {key:<16}{value / report['players']:>16,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='число процессов')
+    parser.add_argument('--chunk', type=int, default=1000, help='игроков в порции (порция = задача процесса)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--improve', type=float, default=0.5, help='вероятность купить улучшение за день')
+    parser.add_argument('--expand', type=float, default=0.3, help='вероятность открыть бизнес за день')
+    parser.add_argument('--loan', type=float, default=0.05, help='вероятность взять кредит за день')
+    parser.add_argument('--invest', type=float, default=0.1, help='вероятность инвестировать за день')
+    parser.add_argument('--events', type=int, default=2, help='случайных событий за день')
+    parser.add_argument('--strategy', default='balanced', choices=sorted(INVESTMENT_VOLATILITY))
+    parser.add_argument('--set', action='append', default=[], metavar='ПУТЬ=ЗНАЧЕНИЕ',
+                        help='подменить параметр: business.<тип>.<поле>=N или improvement.<id>.<поле>=N')
+    parser.add_argument('--json', action='store_true', help='вывести отчет в JSON')
+    args = parser.parse_args()
+
+    try:
+        apply_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    policy = Policy(improve=args.improve, expand=args.expand, loan=args.loan, invest=args.invest,
+                    events_per_day=args.events, invest_strategy=args.strategy)
+    started = time.perf_counter()
+    report = simulate(args.players, args.days, policy, workers=args.workers, seed=args.seed,
+                      chunk_size=args.chunk, overrides=args.set)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report)
+    print(f"\nГотово за {elapsed:.1f} с", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
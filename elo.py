@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Рейтинг Эло для PvP.
+
+EloEngine — чистый расчет без базы: один и тот же код применяет живые матчи
+(GameDatabase.apply_pvp_results, пачкой в одной транзакции) и переигрывает всю
+историю pvp_matches (GameDatabase.rebuild_pvp_ratings), например после смены
+K-фактора.
+
+Ничьи рейтинг не меняют, как и раньше в update_pvp_ratings_after_match.
+
+Пересчет истории: python elo.py --db game.db --k 24
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, Iterable, Tuple
+
+DEFAULT_RATING = 1000.0
+DEFAULT_K_FACTOR = 32.0
+
+
+class RatingState:
+    """Рейтинг и статистика одного игрока"""
+
+    __slots__ = ('rating', 'wins', 'losses', 'streak')
+
+    def __init__(self, rating: float = DEFAULT_RATING, wins: int = 0, losses: int = 0, streak: int = 0):
+        self.rating = rating
+        self.wins = wins
+        self.losses = losses
+        self.streak = streak
+
+    def as_tuple(self) -> Tuple[float, int, int, int]:
+        return self.rating, self.wins, self.losses, self.streak
+
+
+class EloEngine:
+    def __init__(self, k_factor: float = DEFAULT_K_FACTOR, initial_rating: float = DEFAULT_RATING):
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+
+    @staticmethod
+    def expected(rating: float, opponent_rating: float) -> float:
+        """Ожидаемый результат игрока с rating против opponent_rating"""
+        return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+    def apply(self, winner: RatingState, loser: RatingState):
+        """Победа winner над loser: рейтинги, победы/поражения и серии"""
+        expected_w = self.expected(winner.rating, loser.rating)
+        delta = self.k_factor * (1 - expected_w)
+        # Эло с одинаковым K: сколько получил победитель, столько потерял проигравший
+        winner.rating += delta
+        loser.rating -= delta
+        winner.wins += 1
+        loser.losses += 1
+        winner.streak = winner.streak + 1 if winner.streak >= 0 else 1
+        loser.streak = loser.streak - 1 if loser.streak <= 0 else -1
+
+    def run(self, results: Iterable[Tuple[int, int]], states: Dict[int, RatingState]) -> Dict[int, RatingState]:
+        """Применить матчи (winner_id, loser_id) по порядку; недостающие игроки — с начальным рейтингом"""
+        apply = self.apply
+        for winner_id, loser_id in results:
+            winner = states.get(winner_id)
+            if winner is None:
+                winner = states[winner_id] = RatingState(self.initial_rating)
+            loser = states.get(loser_id)
+            if loser is None:
+                loser = states[loser_id] = RatingState(self.initial_rating)
+            apply(winner, loser)
+        return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='game.db', help='файл базы игры')
+    parser.add_argument('--k', type=float, default=DEFAULT_K_FACTOR, help='K-фактор')
+    parser.add_argument('--initial', type=float, default=DEFAULT_RATING, help='начальный рейтинг')
+    args = parser.parse_args()
+
+    from database import GameDatabase
+    started = time.perf_counter()
+    stats = GameDatabase(args.db).rebuild_pvp_ratings(EloEngine(args.k, args.initial))
+    print(f"Переиграно матчей: {stats['matches']}, обновлено профилей: {stats['players']} "
+          f"за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
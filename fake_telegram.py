@@ -0,0 +1,245 @@
+"""
+Локальная заглушка Telegram Bot API для тестов и бенчмарков.
+
+Поднимает aiohttp-сервер с маршрутом /bot{token}/{method}, отвечает как настоящий
+Bot API на основные методы (getMe, getUpdates, setWebhook, sendMessage,
+editMessageText, answerCallbackQuery ...) и записывает все вызовы.
+
+С chat_limit/global_limit (сообщений за скользящую секунду) сервер, как Telegram,
+отвечает 429 Too Many Requests с retry_after на методы, адресованные чату.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+BOT_ID = 42
+BOT_USERNAME = 'fake_empire_bot'
+
+
+def make_user(user_id: int) -> Dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'Player{user_id}', 'username': f'player{user_id}'}
+
+
+def make_message_update(update_id: int, user_id: int, text: str, message_id: int = 1) -> Dict:
+    """Update с текстовым сообщением от пользователя"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': make_user(user_id),
+            'text': text,
+        }
+    }
+
+
+def make_callback_update(update_id: int, user_id: int, data: str, message_id: int = 1) -> Dict:
+    """Update с нажатием inline-кнопки под сообщением бота"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': make_user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Empire', 'username': BOT_USERNAME},
+                'text': '...',
+            },
+        }
+    }
+
+
+class FakeTelegramAPI:
+    """Фейковый Bot API: очередь getUpdates, webhook-настройки и журнал вызовов"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 chat_limit: int = 0, global_limit: int = 0, retry_after: int = 1):
+        self.host = host
+        self.port = port
+        # Искусственная задержка ответа, имитирует сетевой round trip
+        self.latency = latency
+        # Лимиты частоты (0 — без ограничений)
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.retry_after = retry_after
+        self.rejected: Counter = Counter()
+        self._sent_global: deque = deque()
+        self._sent_by_chat: Dict[int, deque] = defaultdict(deque)
+        self.calls: List[Tuple[str, Dict]] = []
+        self.counts: Counter = Counter()
+        self.webhook: Dict = {}
+        self._updates: List[Dict] = []
+        self._updates_event = asyncio.Event()
+        self._messages: Dict[Tuple[int, int], str] = {}
+        self._next_message_id = 1000
+        self._runner: Optional[web.AppRunner] = None
+
+    # ------------------- Жизненный цикл -------------------
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 система выдает свободный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'FakeTelegramAPI':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def session(self, **kwargs) -> AiohttpSession:
+        """Сессия aiogram, направленная на этот сервер"""
+        return AiohttpSession(api=TelegramAPIServer.from_base(self.url), **kwargs)
+
+    # ------------------- Управление обновлениями -------------------
+    def push_update(self, update: Dict):
+        """Поставить update в очередь для getUpdates"""
+        self._updates.append(update)
+        self._updates_event.set()
+
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    def calls_of(self, method: str) -> List[Dict]:
+        return [params for name, params in self.calls if name == method]
+
+    # ------------------- Обработка запросов -------------------
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        form = await request.post()
+        params = {key: self._decode(value) for key, value in form.items()}
+        self.calls.append((method, params))
+        self.counts[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if 'chat_id' in params and self._over_limit(params['chat_id']):
+            self.rejected[method] += 1
+            return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                               {'retry_after': self.retry_after})
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            return self._ok(True)
+        return await handler(params)
+
+    def _over_limit(self, chat_id) -> bool:
+        now = time.monotonic()
+        windows = [(self._sent_global, self.global_limit), (self._sent_by_chat[chat_id], self.chat_limit)]
+        for window, limit in windows:
+            while window and window[0] <= now - 1.0:
+                window.popleft()
+        if any(limit and len(window) >= limit for window, limit in windows):
+            return True
+        for window, _ in windows:
+            window.append(now)
+        return False
+
+    @staticmethod
+    def _decode(value):
+        if not isinstance(value, str):
+            return value
+        if value[:1] in ('{', '['):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def _error(status: int, description: str, parameters: Optional[Dict] = None) -> web.Response:
+        payload = {'ok': False, 'error_code': status, 'description': description}
+        if parameters:
+            payload['parameters'] = parameters
+        return web.json_response(payload, status=status)
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> Dict:
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Empire', 'username': BOT_USERNAME},
+            'text': text,
+        }
+
+    async def _api_getMe(self, params: Dict) -> web.Response:
+        return self._ok({'id': BOT_ID, 'is_bot': True, 'first_name': 'Empire', 'username': BOT_USERNAME})
+
+    async def _api_getUpdates(self, params: Dict) -> web.Response:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        # Подтвержденные (offset) обновления удаляются, как в настоящем API
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates and timeout:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._ok(self._updates[:limit])
+
+    async def _api_setWebhook(self, params: Dict) -> web.Response:
+        self.webhook = dict(params)
+        return self._ok(True)
+
+    async def _api_deleteWebhook(self, params: Dict) -> web.Response:
+        self.webhook = {}
+        return self._ok(True)
+
+    async def _api_getWebhookInfo(self, params: Dict) -> web.Response:
+        return self._ok({'url': self.webhook.get('url', ''), 'has_custom_certificate': False,
+                         'pending_update_count': len(self._updates)})
+
+    async def _api_sendMessage(self, params: Dict) -> web.Response:
+        chat_id = int(params['chat_id'])
+        self._next_message_id += 1
+        message_id = self._next_message_id
+        self._messages[(chat_id, message_id)] = self._fingerprint(params)
+        return self._ok(self._message(chat_id, message_id, params.get('text', '')))
+
+    async def _api_editMessageText(self, params: Dict) -> web.Response:
+        chat_id = int(params['chat_id'])
+        message_id = int(params['message_id'])
+        fingerprint = self._fingerprint(params)
+        if self._messages.get((chat_id, message_id)) == fingerprint:
+            return self._error(400, 'Bad Request: message is not modified: specified new message content '
+                                    'and reply markup are exactly the same as a current content and reply markup of the message')
+        self._messages[(chat_id, message_id)] = fingerprint
+        return self._ok(self._message(chat_id, message_id, params.get('text', '')))
+
+    async def _api_answerCallbackQuery(self, params: Dict) -> web.Response:
+        return self._ok(True)
+
+    @staticmethod
+    def _fingerprint(params: Dict) -> str:
+        return json.dumps([params.get('text'), params.get('reply_markup')], sort_keys=True, ensure_ascii=False)
@@ -0,0 +1,125 @@
+"""
+Хранилища FSM-состояний aiogram.
+
+По умолчанию используется MemoryStorage (один процесс). Для запуска нескольких
+воркеров состояния (ввод названия бизнеса, админские формы) хранятся в общей
+SQLite-базе: это может быть game.db или отдельный файл рядом.
+
+Бэкенд выбирается строкой FSM_STORAGE:
+    memory                 — в памяти процесса
+    sqlite:///fsm.db       — SQLite-файл (относительный путь)
+    sqlite:////abs/fsm.db  — SQLite-файл (абсолютный путь)
+Другие бэкенды подключаются через register_storage_backend().
+
+Хранилище общее для игрового бота (bot.py) и админ-бота (src/main.py).
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite, общее для всех процессов, открывших один файл"""
+
+    def __init__(self, db_path: str, table: str = 'fsm_storage', key_builder: Optional[KeyBuilder] = None):
+        self.db_path = db_path
+        self.table = table
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # Одно соединение на процесс; WAL позволяет читать параллельно с записью из других процессов
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{{}}',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    def _execute_sync(self, query: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()
+
+    async def _execute(self, query: str, params: tuple = ()):
+        # Запрос — в потоке: пока другой процесс держит блокировку записи (до timeout),
+        # цикл событий продолжает обслуживать остальных игроков
+        return await asyncio.to_thread(self._execute_sync, query, params)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._execute(f'''
+            INSERT INTO {self.table} (key, state) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = CURRENT_TIMESTAMP
+        ''', (self.key_builder.build(key), value))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._execute(f'SELECT state FROM {self.table} WHERE key = ?', (self.key_builder.build(key),))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._execute(f'''
+            INSERT INTO {self.table} (key, data) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+        ''', (self.key_builder.build(key), json.dumps(data, ensure_ascii=False)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._execute(f'SELECT data FROM {self.table} WHERE key = ?', (self.key_builder.build(key),))
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def _close_sync(self):
+        with self._lock:
+            self._conn.close()
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close_sync)
+
+
+# ------------------- Реестр бэкендов -------------------
+def _sqlite_factory(location: str) -> BaseStorage:
+    # sqlite:///fsm.db -> "fsm.db", sqlite:////var/lib/fsm.db -> "/var/lib/fsm.db", sqlite:fsm.db -> "fsm.db"
+    path = location[3:] if location.startswith('///') else location
+    if not path:
+        raise ValueError("Для sqlite-хранилища нужен путь: sqlite:///fsm.db")
+    return SQLiteStorage(path)
+
+
+def _redis_factory(location: str) -> BaseStorage:
+    # Необязательная зависимость: pip install redis
+    from aiogram.fsm.storage.redis import RedisStorage
+    return RedisStorage.from_url(f"redis:{location}")
+
+
+STORAGE_BACKENDS: Dict[str, Callable[[str], BaseStorage]] = {
+    'memory': lambda location: MemoryStorage(),
+    'sqlite': _sqlite_factory,
+    'redis': _redis_factory,
+}
+
+
+def register_storage_backend(scheme: str, factory: Callable[[str], BaseStorage]):
+    """Регистрация дополнительного бэкенда: factory получает часть URL после 'scheme:'"""
+    STORAGE_BACKENDS[scheme] = factory
+
+
+def create_storage(url: str = 'memory') -> BaseStorage:
+    """Создание хранилища по строке вида 'memory' или 'sqlite:///fsm.db'"""
+    scheme, _, location = (url or 'memory').partition(':')
+    factory = STORAGE_BACKENDS.get(scheme.strip().lower())
+    if factory is None:
+        raise ValueError(f"Неизвестный бэкенд FSM-хранилища: {scheme}")
+    return factory(location)
+
+
+def is_shared_storage(storage: BaseStorage) -> bool:
+    """Можно ли делить хранилище между процессами"""
+    return not isinstance(storage, MemoryStorage)
@@ -1,13 +1,16 @@
 import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
+from achievements import ACHIEVEMENT_RULES
 from config import BUSINESS_TYPES, RANDOM_EVENTS, IMPROVEMENTS, DAILY_INCOME_MULTIPLIER, DAILY_EXPENSE_MULTIPLIER
 
 class GameLogic:
-    def __init__(self):
+    def __init__(self, market=None):
         self.random_events = RANDOM_EVENTS
         self.improvements = IMPROVEMENTS
         self.business_types = BUSINESS_TYPES
+        # Мировое рыночное событие (market_events.MarketEventEngine): множители из кэша, без запросов к базе
+        self.market = market
     
     def calculate_daily_income(self, business: Dict, improvements: List[str] = None) -> float:
         """Расчет дневного дохода бизнеса с учетом улучшений"""
@@ -20,7 +23,8 @@ class GameLogic:
                     if 'income_boost' in self.improvements[improvement]:
                         total_boost += self.improvements[improvement]['income_boost']
         
-        return base_income * total_boost * DAILY_INCOME_MULTIPLIER
+        market = self.market.income_multiplier() if self.market is not None else 1.0
+        return base_income * total_boost * DAILY_INCOME_MULTIPLIER * market
     
     def calculate_daily_expenses(self, business: Dict, improvements: List[str] = None) -> float:
         """Расчет дневных расходов бизнеса с учетом улучшений"""
@@ -33,7 +37,8 @@ class GameLogic:
                     if 'expense_boost' in self.improvements[improvement]:
                         total_boost += self.improvements[improvement]['expense_boost']
         
-        return base_expenses * total_boost * DAILY_EXPENSE_MULTIPLIER
+        market = self.market.expense_multiplier() if self.market is not None else 1.0
+        return base_expenses * total_boost * DAILY_EXPENSE_MULTIPLIER * market
     
     def get_random_event(self, player_level: int = 1) -> Optional[Dict]:
         """Получение случайного события"""
@@ -222,45 +227,6 @@ class GameLogic:
         }
     
     def check_achievements(self, player: Dict, businesses: List[Dict]) -> List[Dict]:
-        """Проверка достижений игрока"""
-        achievements = []
-        
-        # Достижения по балансу
-        if player['balance'] >= 1000000 and player['level'] >= 5:
-            achievements.append({
-                'type': 'balance',
-                'title': 'Миллионер',
-                'description': 'Достиг баланса в 1,000,000 ₽'
-            })
-        
-        if player['balance'] >= 100000:
-            achievements.append({
-                'type': 'balance',
-                'title': 'Сотня тысяч',
-                'description': 'Достиг баланса в 100,000 ₽'
-            })
-        
-        # Достижения по количеству бизнесов
-        if len(businesses) >= 5:
-            achievements.append({
-                'type': 'businesses',
-                'title': 'Бизнес-магнат',
-                'description': 'Владеете 5+ бизнесами'
-            })
-        
-        if len(businesses) >= 10:
-            achievements.append({
-                'type': 'businesses',
-                'title': 'Империя',
-                'description': 'Владеете 10+ бизнесами'
-            })
-        
-        # Достижения по уровню
-        if player['level'] >= 10:
-            achievements.append({
-                'type': 'level',
-                'title': 'Эксперт',
-                'description': 'Достигли 10 уровня'
-            })
-        
-        return achievements 
\ No newline at end of file
+        """Проверка достижений игрока (правила — achievements.ACHIEVEMENT_RULES)"""
+        state = {'balance': player['balance'], 'level': player['level'], 'businesses': len(businesses)}
+        return [rule.as_dict() for rule in ACHIEVEMENT_RULES if rule.matches(state)] 
\ No newline at end of file
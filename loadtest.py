@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест бота: сколько одновременных игроков выдерживает один процесс.
+
+Виртуальные игроки нажимают кнопки в реальном router из bot.py (со всеми middleware
+и настоящей GameDatabase на временном файле), а ответы бота уходят в локальный
+фейковый Bot API (fake_telegram.py) через те же middleware сессии, что у бота,
+включая лимиты OUTBOUND_GLOBAL_RATE / OUTBOUND_CHAT_RATE: задержка учитывает
+ожидание лимита. Между нажатиями игрок "думает" случайное время со средним --think.
+
+Отчет: пропускная способность, p50/p95/p99 задержки по действиям, ошибки,
+время в БД и фиксаций транзакций (ожидание блокировки записи + fsync).
+
+Пример: python loadtest.py --users 200 --duration 30 --think 1.0 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+
+import config
+from config import BUSINESS_TYPES
+from database import GameDatabase
+from fake_telegram import FakeTelegramAPI, make_callback_update
+from metrics import REGISTRY
+from query_profiler import PROFILER
+
+# Доля каждого действия в потоке нажатий
+DEFAULT_MIX = {
+    'main_menu': 20,
+    'profile': 20,
+    'daily_income': 10,
+    'vis_sim': 10,
+    'pvp_fight': 10,
+    'investments': 10,
+    'loans': 10,
+    'rating': 10,
+}
+FIRST_USER_ID = 1_000_000
+
+
+def import_bot():
+    """bot.py с фиктивным токеном; база при импорте в памяти, для прогона подменяется"""
+    if 'bot' not in sys.modules:
+        config.BOT_TOKEN = '42:LOADTEST'
+        config.GAME_DB_PATH = ':memory:'
+    return importlib.import_module('bot')
+
+
+def _db_and_handler_seconds():
+    db_seconds = sum(REGISTRY.values('bot_handler_db_seconds_total').values())
+    handler_seconds = sum(h.sum for h in REGISTRY.histograms('bot_handler_seconds').values())
+    return db_seconds, handler_seconds
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'profile=30,rating=10' -> {'profile': 30.0, 'rating': 10.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Неизвестное действие: {name.strip()} (доступны: {', '.join(DEFAULT_MIX)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Метод ближайшего ранга
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def seed_players(db: GameDatabase, users: int) -> Dict[int, int]:
+    """Игроки с одним бизнесом каждый; возвращает user_id -> business_id"""
+    rng = random.Random(users)
+    business_ids = {}
+    types = list(BUSINESS_TYPES.items())
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        db.add_player(user_id, f'player{user_id}', f'Player{user_id}')
+        business_type, info = rng.choice(types)
+        business_ids[user_id] = db.add_business(user_id, business_type, f"{info['name']} {user_id}",
+                                                info['base_income'], info['base_expenses'])
+    return business_ids
+
+
+def callback_data(action: str, user_id: int, business_ids: Dict[int, int], rng: random.Random) -> str:
+    if action == 'vis_sim':
+        return f"vis_sim_{business_ids[user_id]}"
+    if action == 'pvp_fight':
+        opponent = rng.choice([uid for uid in (user_id - 1, user_id + 1) if uid in business_ids] or [user_id])
+        return f"pvp_fight_{opponent}"
+    return action
+
+
+async def run_load(users: int = 50, duration: float = 10.0, think: float = 1.0, latency: float = 0.0,
+                   mix: Optional[Dict[str, float]] = None, db_path: Optional[str] = None,
+                   seed: int = 1) -> Dict:
+    """Прогон нагрузки; возвращает сводку (см. format_report)"""
+    mix = mix or DEFAULT_MIX
+    app = import_bot()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Все объекты бота, работающие с базой, строятся заново для базы прогона
+        app.use_database(GameDatabase(db_path or os.path.join(tmp, 'loadtest.db')))
+        business_ids = seed_players(app.db, users)
+        # Индекс подбора PvP бот загружает при старте (start_services)
+        app.matchmaking.rebuild()
+        PROFILER.reset()
+        saved_before = app.edit_dedup.saved_calls
+        throttled_before = app.outbound_limiter.throttled
+        db_before, handlers_before = _db_and_handler_seconds()
+        actions, weights = list(mix), list(mix.values())
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Counter = Counter()
+        update_ids = iter(range(1, 10 ** 9))
+
+        async with FakeTelegramAPI(latency=latency) as api:
+            bot = Bot('42:LOADTEST', session=api.session())
+            # Те же middleware сессии, что у бота в bot.py: дедупликация правок, лимиты Telegram, метрики
+            app.setup_session(bot.session)
+            started = time.perf_counter()
+            deadline = started + duration
+
+            async def player(user_id: int):
+                rng = random.Random(seed * 7919 + user_id)
+                # Игроки начинают не одновременно
+                await asyncio.sleep(rng.uniform(0, think) if think else 0)
+                while time.perf_counter() < deadline:
+                    action = rng.choices(actions, weights)[0]
+                    update = make_callback_update(next(update_ids), user_id,
+                                                  callback_data(action, user_id, business_ids, rng))
+                    t0 = time.perf_counter()
+                    try:
+                        await app.dp.feed_raw_update(bot, update)
+                    except Exception as e:
+                        errors[f"{action}: {type(e).__name__}"] += 1
+                    latencies[action].append(time.perf_counter() - t0)
+                    if think:
+                        await asyncio.sleep(rng.expovariate(1 / think))
+
+            await asyncio.gather(*(player(uid) for uid in business_ids))
+            elapsed = time.perf_counter() - started
+            api_calls = dict(api.counts)
+            await bot.session.close()
+
+    all_latencies = sorted(x for values in latencies.values() for x in values)
+    commit = next((s for s in PROFILER.top(1000) if s.fingerprint == 'COMMIT'), None)
+    db_after, handlers_after = _db_and_handler_seconds()
+    db_seconds, handler_seconds = db_after - db_before, handlers_after - handlers_before
+    return {
+        'users': users,
+        'duration': elapsed,
+        'updates': len(all_latencies),
+        'throughput': len(all_latencies) / elapsed if elapsed else 0.0,
+        'latency': {
+            'p50': percentile(all_latencies, 0.50),
+            'p95': percentile(all_latencies, 0.95),
+            'p99': percentile(all_latencies, 0.99),
+            'max': all_latencies[-1] if all_latencies else 0.0,
+        },
+        'actions': {
+            action: {
+                'count': len(values),
+                'p50': percentile(sorted(values), 0.50),
+                'p95': percentile(sorted(values), 0.95),
+                'p99': percentile(sorted(values), 0.99),
+            }
+            for action, values in sorted(latencies.items())
+        },
+        'errors': dict(errors),
+        'db': {
+            'share_of_handler_time': db_seconds / handler_seconds if handler_seconds else 0.0,
+            'commits': commit.count if commit else 0,
+            'commit_total': commit.total if commit else 0.0,
+            'commit_p99': commit.p99() if commit else 0.0,
+            'failed_queries': sum(s.errors for s in PROFILER.top(1000)),
+        },
+        'api_calls': api_calls,
+        'saved_api_calls': app.edit_dedup.saved_calls - saved_before,
+        'throttled_api_calls': app.outbound_limiter.throttled - throttled_before,
+    }
+
+
+def format_report(result: Dict) -> str:
+    ms = 1000
+    lines = [
+        f"Игроков: {result['users']}, длительность {result['duration']:.1f} с, обновлений {result['updates']}",
+        f"Пропускная способность: {result['throughput']:.1f} обновлений/с",
+        "Задержка, мс: p50 {p50:.1f} | p95 {p95:.1f} | p99 {p99:.1f} | max {max:.1f}".format(
+            **{k: v * ms for k, v in result['latency'].items()}),
+        "",
+        f"{'действие':<14}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}",
+    ]
+    for action, stats in result['actions'].items():
+        lines.append(f"{action:<14}{stats['count']:>7}{stats['p50'] * ms:>9.1f}"
+                     f"{stats['p95'] * ms:>9.1f}{stats['p99'] * ms:>9.1f}")
+    db = result['db']
+    lines += [
+        "",
+        f"БД: {db['share_of_handler_time'] * 100:.0f}% времени обработчиков; фиксаций {db['commits']}, "
+        f"всего {db['commit_total'] * ms:.0f} мс, p99 {db['commit_p99'] * ms:.2f} мс; "
+        f"запросов с ошибкой (в т.ч. database is locked): {db['failed_queries']}",
+    ]
+    if result['errors']:
+        lines.append("Ошибки: " + ', '.join(f"{name} ×{count}" for name, count in sorted(result['errors'].items())))
+    lines.append("Вызовы API: " + ', '.join(f"{name}={count}" for name, count in sorted(result['api_calls'].items()))
+                 + f"; сэкономлено повторных правок: {result['saved_api_calls']}"
+                 + f"; ждали лимита Telegram: {result['throttled_api_calls']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='число виртуальных игроков')
+    parser.add_argument('--duration', type=float, default=20.0, help='длительность прогона, с')
+    parser.add_argument('--think', type=float, default=1.0, help='среднее время между нажатиями игрока, с (0 — без пауз)')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа фейкового Bot API, с')
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help='доли действий, например profile=30,rating=10,pvp_fight=5')
+    parser.add_argument('--db', default=None, help='файл базы (по умолчанию временный)')
+    parser.add_argument('--json', default=None, help='сохранить сводку в JSON-файл')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Исключения обработчиков считаются в отчете, трассировки только мешают
+    logging.getLogger('aiogram.event').setLevel(logging.CRITICAL)
+    result = asyncio.run(run_load(args.users, args.duration, args.think, args.latency, args.mix, args.db))
+    print(format_report(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Мировые рыночные события.
+
+Раз в MARKET_EVENT_ROLL_HOURS часов (задача планировщика market_event) движок,
+если активного события нет, с вероятностью MARKET_EVENT_CHANCE начинает новое из
+AdvancedGameFeatures.generate_market_event: бычий и медвежий рынок, инфляция,
+экономический бум. Событие записывается в market_events с временем окончания
+(duration — в днях) и действует на всех игроков.
+
+GameLogic.calculate_daily_income / calculate_daily_expenses берут множители из
+кэша движка: проверка времени и два атрибута, без запроса к базе. Кэш
+перечитывается из базы не чаще раза в refresh_interval секунд и в момент окончания
+события — так другие процессы (workers.py) узнают о событии, начатом одним из них.
+"""
+
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from advanced_features import AdvancedGameFeatures
+from config import MARKET_EVENT_CHANCE, MARKET_EVENT_ROLL_HOURS
+from database import GameDatabase
+
+DAY_SECONDS = 86400
+
+
+def event_multipliers(event: Dict) -> Tuple[float, float]:
+    """(доход, расходы) по effect события generate_market_event"""
+    effect, value = event['effect'], event['value']
+    if effect == 'income_multiplier':
+        return value, 1.0
+    if effect == 'expense_multiplier':
+        return 1.0, value
+    if effect == 'all_multiplier':
+        # «Все показатели растут»: доход и расходы в равной доле, чистая прибыль тоже
+        return value, value
+    return 1.0, 1.0
+
+
+class MarketEventEngine:
+    """Текущее рыночное событие и его множители дохода и расходов"""
+
+    def __init__(self, db: GameDatabase, advanced: Optional[AdvancedGameFeatures] = None,
+                 chance: float = MARKET_EVENT_CHANCE, roll_interval: float = MARKET_EVENT_ROLL_HOURS * 3600,
+                 refresh_interval: float = 60.0, clock: Callable[[], float] = time.time,
+                 rng: Optional[random.Random] = None):
+        self.db = db
+        self.advanced = advanced or AdvancedGameFeatures()
+        self.chance = chance
+        self.roll_interval = roll_interval
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._event: Optional[Dict] = None
+        self._income = 1.0
+        self._expense = 1.0
+        # До этого момента кэш верен без обращения к базе
+        self._valid_until = 0.0
+        # Метрики
+        self.refreshes = 0
+        self.events_started = 0
+
+    def _cache(self, event: Optional[Dict], now: float):
+        self._event = event
+        self._income, self._expense = (event['income_multiplier'], event['expense_multiplier']) if event else (1.0, 1.0)
+        self._valid_until = now + self.refresh_interval
+        if event is not None:
+            self._valid_until = min(self._valid_until, event['expires_at'])
+
+    def refresh(self):
+        now = self.clock()
+        self._cache(self.db.get_active_market_event(now), now)
+        self.refreshes += 1
+
+    def multipliers(self) -> Tuple[float, float]:
+        """(доход, расходы) активного события; (1.0, 1.0) без события"""
+        if self.clock() >= self._valid_until:
+            self.refresh()
+        return self._income, self._expense
+
+    def income_multiplier(self) -> float:
+        return self.multipliers()[0]
+
+    def expense_multiplier(self) -> float:
+        return self.multipliers()[1]
+
+    def current(self) -> Optional[Dict]:
+        self.multipliers()
+        return self._event
+
+    def roll(self) -> Optional[Dict]:
+        """Начать новое событие, если активного нет и выпал шанс; возвращает начатое событие"""
+        self.refresh()
+        if self._event is not None or self.rng.random() >= self.chance:
+            return None
+        generated = self.advanced.generate_market_event()
+        income, expense = event_multipliers(generated)
+        now = self.clock()
+        event = {
+            'type': generated['type'],
+            'title': generated['title'],
+            'description': generated['description'],
+            'income_multiplier': income,
+            'expense_multiplier': expense,
+            'started_at': now,
+            'expires_at': now + generated['duration'] * DAY_SECONDS,
+        }
+        event['id'] = self.db.start_market_event(event, now, event['expires_at'])
+        if event['id'] is None:
+            return None
+        self._cache(event, now)
+        self.events_started += 1
+        return event
+
+    def next_roll_at(self) -> float:
+        """Следующий бросок: по окончании активного события или через roll_interval"""
+        event = self.current()
+        return event['expires_at'] if event is not None else self.clock() + self.roll_interval
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        income, expense = self.multipliers()
+        return [
+            ('bot_market_income_multiplier', {}, income),
+            ('bot_market_expense_multiplier', {}, expense),
+            ('bot_market_events_started_total', {}, self.events_started),
+            ('bot_market_refreshes_total', {}, self.refreshes),
+        ]
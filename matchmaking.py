@@ -0,0 +1,233 @@
+"""
+Индекс подбора PvP-соперников.
+
+Игроки хранятся в двух параллельных списках, отсортированных по силе
+(AdvancedGameFeatures._calculate_player_power): силы и user_id. Соседи по силе
+находятся бисекцией и расширением окна в обе стороны: O(log n + k), без
+сортировки таблицы players на каждый показ меню.
+
+Индекс загружается в потоке при старте бота (start) — до этого он пуст и
+соперников не предлагает: полная загрузка таблицы в цикле событий остановила бы
+все обработчики. Скрипты и тесты вне цикла событий вызывают rebuild(). Дальше
+индекс обновляется по событиям GameDatabase.subscribe_player_changes: измененные игроки помечаются и
+перечитываются одним запросом перед следующим подбором. Вставка и удаление
+одного игрока — сдвиг списков, O(n) (memmove, микросекунды до сотен тысяч
+игроков); больше merge_threshold отметок сливаются с индексом за один проход.
+Игроки на PvP-кулдауне в выдачу не попадают.
+
+События приходят только от своего процесса. При запуске через workers.py
+изменения, сделанные другими воркерами (новые игроки, сила, кулдауны), видны
+после перестройки: раз в refresh_interval секунд индекс загружается заново в
+потоке и подменяется целиком (start / close).
+"""
+
+import asyncio
+import heapq
+import logging
+import sqlite3
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import MATCHMAKING_REFRESH_SECONDS
+from database import GameDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class MatchmakingIndex:
+    """Соперники близкой силы для pvp_menu"""
+
+    def __init__(self, db: GameDatabase, power_fn: Callable[[Dict], float],
+                 clock: Callable[[], float] = time.time, page_size: int = 50000,
+                 refresh_interval: float = MATCHMAKING_REFRESH_SECONDS, merge_threshold: int = 64):
+        self.db = db
+        self.power_fn = power_fn
+        self.clock = clock
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.merge_threshold = merge_threshold
+        self._powers: List[float] = []
+        self._ids: List[int] = []
+        self._power_by_id: Dict[int, float] = {}
+        self._cooldowns: Dict[int, float] = {}
+        self._dirty: Set[int] = set()
+        self._loaded = False
+        self._worker: Optional[asyncio.Task] = None
+        # Метрики
+        self.rebuilds = 0
+        db.subscribe_player_changes(self.mark_dirty)
+
+    def __len__(self) -> int:
+        self._ensure_fresh()
+        return len(self._ids)
+
+    def mark_dirty(self, user_id: int, fields: Tuple[str, ...] = ()):
+        self._dirty.add(user_id)
+
+    def _load(self) -> Tuple[List[Tuple[float, int]], Dict[int, float]]:
+        """Все игроки постранично по user_id: отсортированные (сила, user_id) и кулдауны"""
+        started = time.perf_counter()
+        pairs, cooldowns = [], {}
+        after = 0
+        while True:
+            page = self.db.get_pvp_candidates(after_user_id=after, limit=self.page_size)
+            for row in page:
+                pairs.append((self.power_fn(row), row['user_id']))
+                if row['cooldown_until']:
+                    cooldowns[row['user_id']] = row['cooldown_until']
+            if len(page) < self.page_size:
+                break
+            after = page[-1]['user_id']
+        pairs.sort()
+        logger.info(f"Индекс подбора PvP: {len(pairs)} игроков за {time.perf_counter() - started:.2f} с")
+        return pairs, cooldowns
+
+    def _install(self, pairs: List[Tuple[float, int]], cooldowns: Dict[int, float]):
+        self._powers = [power for power, _ in pairs]
+        self._ids = [user_id for _, user_id in pairs]
+        self._power_by_id = {user_id: power for power, user_id in pairs}
+        self._cooldowns = cooldowns
+        self._loaded = True
+        self.rebuilds += 1
+
+    def rebuild(self):
+        """Полная загрузка из базы (блокирующая — вне цикла событий)"""
+        self._install(*self._load())
+        self._dirty.clear()
+
+    async def refresh(self):
+        """Перестройка в потоке, не останавливая цикл событий.
+
+        Отметки _dirty не сбрасываются: изменение, пришедшее во время загрузки,
+        могло в нее не попасть и будет перечитано при следующем подборе.
+        """
+        self._install(*await asyncio.to_thread(self._load))
+
+    async def start(self):
+        """Первая загрузка в потоке и периодическая перестройка"""
+        if not self._loaded:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Загрузка индекса подбора PvP не удалась: {e!r}")
+        if self.refresh_interval > 0 and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Перестройка индекса подбора PvP не удалась: {e!r}")
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _ensure_fresh(self):
+        # До первой загрузки отметки не читаются: загрузка охватит всех игроков
+        if not self._loaded or not self._dirty:
+            return
+        # Отметки приходят и из потоков (pvp_queue пишет бои через asyncio.to_thread):
+        # копия и вычитание вместо подмены множества, чтобы не потерять отметку
+        dirty = set(self._dirty)
+        self._dirty.difference_update(dirty)
+        try:
+            rows = {row['user_id']: row for row in self.db.get_pvp_candidates(list(dirty))}
+        except sqlite3.OperationalError as e:
+            # База занята: подбираем по прежним данным, отметки перечитаем в следующий раз
+            self._dirty |= dirty
+            logger.warning(f"Индекс подбора PvP не обновлен: {e}")
+            return
+        if len(dirty) > self.merge_threshold:
+            self._merge(dirty, rows)
+            return
+        for user_id in dirty:
+            self._remove(user_id)
+            row = rows.get(user_id)
+            if row is None:
+                continue  # игрок удален
+            self._insert(user_id, self.power_fn(row))
+            if row['cooldown_until']:
+                self._cooldowns[user_id] = row['cooldown_until']
+            else:
+                self._cooldowns.pop(user_id, None)
+
+    def _merge(self, dirty: Set[int], rows: Dict[int, Dict]):
+        """Много отметок сразу: один проход по индексу и слияние с отсортированными новыми"""
+        kept = [(power, user_id) for power, user_id in zip(self._powers, self._ids) if user_id not in dirty]
+        fresh = sorted((self.power_fn(row), user_id) for user_id, row in rows.items())
+        pairs = list(heapq.merge(kept, fresh))
+        self._powers = [power for power, _ in pairs]
+        self._ids = [user_id for _, user_id in pairs]
+        for user_id in dirty:
+            self._power_by_id.pop(user_id, None)
+            self._cooldowns.pop(user_id, None)
+        for power, user_id in fresh:
+            self._power_by_id[user_id] = power
+            if rows[user_id]['cooldown_until']:
+                self._cooldowns[user_id] = rows[user_id]['cooldown_until']
+
+    def _insert(self, user_id: int, power: float):
+        position = bisect_left(self._powers, power)
+        self._powers.insert(position, power)
+        self._ids.insert(position, user_id)
+        self._power_by_id[user_id] = power
+
+    def _remove(self, user_id: int):
+        power = self._power_by_id.pop(user_id, None)
+        if power is None:
+            return
+        position = bisect_left(self._powers, power)
+        # Среди равных по силе ищем нужный user_id
+        while self._ids[position] != user_id:
+            position += 1
+        del self._powers[position]
+        del self._ids[position]
+
+    def power_of(self, user_id: int) -> Optional[float]:
+        self._ensure_fresh()
+        return self._power_by_id.get(user_id)
+
+    def nearest(self, user_id: int, k: int = 8) -> List[int]:
+        """До k соперников, ближайших по силе к user_id (без него самого и без игроков на кулдауне)"""
+        self._ensure_fresh()
+        power = self._power_by_id.get(user_id)
+        if power is None:
+            return []
+        now = self.clock()
+        powers, ids = self._powers, self._ids
+        position = bisect_left(powers, power)
+        low, high = position - 1, position
+        result = []
+        while len(result) < k and (low >= 0 or high < len(ids)):
+            # Берем ту сторону, где сила ближе
+            if high >= len(ids) or (low >= 0 and power - powers[low] <= powers[high] - power):
+                candidate = ids[low]
+                low -= 1
+            else:
+                candidate = ids[high]
+                high += 1
+            if candidate == user_id or self._cooldowns.get(candidate, 0) > now:
+                continue
+            result.append(candidate)
+        return result
+
+    def nearest_players(self, user_id: int, k: int = 8) -> List[Dict]:
+        """nearest() с данными игроков (имя, уровень, баланс, сила) в порядке близости"""
+        ids = self.nearest(user_id, k)
+        rows = {row['user_id']: row for row in self.db.get_pvp_candidates(ids)} if ids else {}
+        result = []
+        for candidate in ids:
+            row = rows.get(candidate)
+            if row is not None:
+                row['power'] = self._power_by_id[candidate]
+                result.append(row)
+        return result
@@ -0,0 +1,399 @@
+"""
+Метрики производительности бота в формате Prometheus.
+
+Что собирается:
+    bot_update_seconds{event_type}           — полное время обработки обновления
+    bot_updates_in_flight                    — обновления в обработке прямо сейчас
+    bot_update_errors_total{event_type}      — необработанные исключения
+    bot_handler_seconds{handler}             — время обработчика (гистограмма)
+    bot_handler_db_seconds_total{handler}    — из них в GameDatabase
+    bot_handler_api_seconds_total{handler}   — из них в запросах к Telegram API
+    bot_handler_errors_total{handler,error}  — исключения обработчиков
+    db_method_seconds{method}                — время методов GameDatabase
+    telegram_api_seconds{method}             — время запросов к Bot API
+    telegram_api_errors_total{method}
+
+Подключение: setup_metrics(dp, bot), класс базы — декоратор @timed_methods.
+Текст для Prometheus отдает маршрут из add_metrics_route (METRICS_PATH).
+"""
+
+import bisect
+import functools
+import inspect
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин, как в Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Хранилище счетчиков, текущих значений (gauge) и гистограмм с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]] = []
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def histogram(self, name: str, help_text: str = '', **labels) -> Histogram:
+        series = self._histograms.get(name)
+        if series is None:
+            self._meta.setdefault(name, ('histogram', help_text))
+            series = self._histograms[name] = {}
+        key = self._key(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        return hist
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = '', **labels):
+        series = self._values.get(name)
+        if series is None:
+            self._meta.setdefault(name, ('counter', help_text))
+            series = self._values[name] = {}
+        key = self._key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, help_text: str = '', **labels):
+        self._meta.setdefault(name, ('gauge', help_text))
+        self._values.setdefault(name, {})[self._key(labels)] = value
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]):
+        """Функция, возвращающая (имя, метки, значение) в момент выдачи метрик"""
+        self._collectors.append(collector)
+
+    def value(self, name: str, **labels) -> float:
+        return self._values.get(name, {}).get(self._key(labels), 0.0)
+
+    def histograms(self, name: str) -> Dict[LabelKey, Histogram]:
+        return self._histograms.get(name, {})
+
+    def values(self, name: str) -> Dict[LabelKey, float]:
+        return self._values.get(name, {})
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if math.isinf(value):
+            return '+Inf'
+        return repr(float(value))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        collected: Dict[str, Dict[LabelKey, float]] = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                collected.setdefault(name, {})[self._key(labels)] = value
+
+        for name in sorted(set(self._meta) | set(collected)):
+            kind, help_text = self._meta.get(name, ('counter' if name.endswith('_total') else 'gauge', ''))
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for key, hist in sorted(self._histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(hist.buckets + (math.inf,), hist.counts):
+                        cumulative += bucket_count
+                        le = ('le', self._format_value(bound) if not math.isinf(bound) else '+Inf')
+                        lines.append(f'{name}_bucket{self._format_labels(key, le)} {cumulative}')
+                    lines.append(f'{name}_sum{self._format_labels(key)} {self._format_value(hist.sum)}')
+                    lines.append(f'{name}_count{self._format_labels(key)} {hist.count}')
+            else:
+                series = dict(self._values.get(name, {}))
+                series.update(collected.get(name, {}))
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{self._format_labels(key)} {self._format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ------------------- Разбивка времени обновления -------------------
+class UpdateTimings:
+    """Сколько времени текущее обновление провело в БД и в Bot API"""
+
+    __slots__ = ('db', 'api')
+
+    def __init__(self):
+        self.db = 0.0
+        self.api = 0.0
+
+
+_current_timings: ContextVar[Optional[UpdateTimings]] = ContextVar('update_timings', default=None)
+# Глубина вложенных вызовов методов БД: время учитывается только у внешнего
+_db_depth: ContextVar[int] = ContextVar('db_depth', default=0)
+
+
+def record_db_time(seconds: float):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.db += seconds
+
+
+def record_api_time(seconds: float):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.api += seconds
+
+
+def timed_methods(cls=None, *, registry: MetricsRegistry = REGISTRY, metric: str = 'db_method_seconds'):
+    """Декоратор класса: время каждого публичного метода в гистограмму metric{method=...}"""
+    def decorate(klass):
+        for name, attr in list(vars(klass).items()):
+            if name.startswith('_') or not inspect.isfunction(attr):
+                continue
+            setattr(klass, name, _timed(attr, registry, metric))
+        return klass
+    return decorate(cls) if cls is not None else decorate
+
+
+def _timed(func, registry: MetricsRegistry, metric: str):
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _db_depth.set(_db_depth.get() + 1)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                _db_depth.reset(token)
+                registry.histogram(metric, 'Время методов базы данных', method=name).observe(elapsed)
+                if not _db_depth.get():
+                    record_db_time(elapsed)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _db_depth.set(_db_depth.get() + 1)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _db_depth.reset(token)
+            registry.histogram(metric, 'Время методов базы данных', method=name).observe(elapsed)
+            if not _db_depth.get():
+                record_db_time(elapsed)
+    return wrapper
+
+
+# ------------------- Middleware -------------------
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: полное время, обновления в обработке, ошибки"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.in_flight = 0
+        registry.set_gauge('bot_updates_in_flight', 0, 'Обновления в обработке')
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        token = _current_timings.set(UpdateTimings())
+        self.in_flight += 1
+        self.registry.set_gauge('bot_updates_in_flight', self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.registry.inc('bot_update_errors_total', help_text='Необработанные исключения', event_type=event_type)
+            raise
+        finally:
+            self.registry.histogram('bot_update_seconds', 'Полное время обработки обновления',
+                                    event_type=event_type).observe(time.perf_counter() - started)
+            self.in_flight -= 1
+            self.registry.set_gauge('bot_updates_in_flight', self.in_flight)
+            _current_timings.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время конкретного обработчика с разбивкой БД / Telegram API"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        timings = _current_timings.get()
+        if timings is None:
+            timings = UpdateTimings()
+            _current_timings.set(timings)
+        db_before, api_before = timings.db, timings.api
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.registry.inc('bot_handler_errors_total', help_text='Исключения обработчиков',
+                              handler=name, error=type(e).__name__)
+            raise
+        finally:
+            self.registry.histogram('bot_handler_seconds', 'Время обработчика',
+                                    handler=name).observe(time.perf_counter() - started)
+            self.registry.inc('bot_handler_db_seconds_total', timings.db - db_before,
+                              'Время обработчика в базе данных', handler=name)
+            self.registry.inc('bot_handler_api_seconds_total', timings.api - api_before,
+                              'Время обработчика в запросах к Telegram API', handler=name)
+
+
+class APIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.registry.inc('telegram_api_errors_total', help_text='Ошибки запросов к Bot API', method=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.registry.histogram('telegram_api_seconds', 'Время запросов к Bot API', method=name).observe(elapsed)
+            record_api_time(elapsed)
+
+
+def setup_metrics(dp: Dispatcher, bot: Optional[Bot] = None, registry: MetricsRegistry = REGISTRY):
+    """Подключение всех middleware метрик к диспетчеру и сессии бота"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware(registry))
+    handler_middleware = HandlerMetricsMiddleware(registry)
+    for event_name, observer in dp.observers.items():
+        if event_name not in ('update', 'error'):
+            observer.middleware(handler_middleware)
+    if bot is not None:
+        bot.session.middleware(APIMetricsMiddleware(registry))
+
+
+# ------------------- HTTP и сводка -------------------
+def add_metrics_route(app: web.Application, path: str = '/metrics', registry: MetricsRegistry = REGISTRY):
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain',
+                            headers={'X-Content-Type-Options': 'nosniff'}, charset='utf-8')
+
+    app.router.add_get(path, metrics_handler)
+
+
+async def start_metrics_server(host: str, port: int, path: str = '/metrics', health_path: str = '/health',
+                               registry: MetricsRegistry = REGISTRY) -> web.AppRunner:
+    """Отдельный HTTP-сервер метрик (для режима polling, где нет webhook-приложения)"""
+    app = web.Application()
+    add_metrics_route(app, path, registry)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'mode': 'polling'})
+
+    app.router.add_get(health_path, health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def _label(key: LabelKey, name: str) -> str:
+    return dict(key).get(name, '?')
+
+
+def perf_summary(limit: int = 8, registry: MetricsRegistry = REGISTRY) -> str:
+    """Краткая сводка для админской команды /perf"""
+    lines = [f"⏱ В обработке: {registry.value('bot_updates_in_flight'):.0f}"]
+
+    handlers = sorted(registry.histograms('bot_handler_seconds').items(), key=lambda kv: -kv[1].quantile(0.95))
+    if handlers:
+        db_totals = registry.values('bot_handler_db_seconds_total')
+        api_totals = registry.values('bot_handler_api_seconds_total')
+        lines.append("\nОбработчики (p50 / p95 / БД / API, мс):")
+        for key, hist in handlers[:limit]:
+            db_avg = db_totals.get(key, 0.0) / hist.count * 1000
+            api_avg = api_totals.get(key, 0.0) / hist.count * 1000
+            lines.append(f"{_label(key, 'handler')}: n={hist.count} {hist.quantile(0.5) * 1000:.1f} / "
+                         f"{hist.quantile(0.95) * 1000:.1f} / {db_avg:.1f} / {api_avg:.1f}")
+
+    methods = sorted(registry.histograms('db_method_seconds').items(), key=lambda kv: -kv[1].sum)
+    if methods:
+        lines.append("\nМетоды БД (всего мс, вызовов, p95 мс):")
+        for key, hist in methods[:limit]:
+            lines.append(f"{_label(key, 'method')}: {hist.sum * 1000:.0f}, {hist.count}, {hist.quantile(0.95) * 1000:.1f}")
+
+    api = sorted(registry.histograms('telegram_api_seconds').items(), key=lambda kv: -kv[1].sum)
+    if api:
+        lines.append("\nTelegram API (вызовов, p95 мс):")
+        for key, hist in api[:limit]:
+            lines.append(f"{_label(key, 'method')}: {hist.count}, {hist.quantile(0.95) * 1000:.1f}")
+
+    errors = registry.values('bot_handler_errors_total')
+    if errors:
+        lines.append("\nОшибки:")
+        for key, count in sorted(errors.items(), key=lambda kv: -kv[1])[:limit]:
+            lines.append(f"{_label(key, 'handler')} {_label(key, 'error')}: {count:.0f}")
+    return '\n'.join(lines)
@@ -0,0 +1,137 @@
+"""
+Middleware диспетчера бота.
+
+UserSerializationMiddleware выполняет обновления разных игроков параллельно, а
+обновления одного игрока — строго по очереди. Обработчики меняют общий баланс
+игрока, поэтому двойное нажатие "daily_income" или "pvp_fight" не должно
+выполняться одновременно. Очередь каждого игрока ограничена, а повторное нажатие
+той же кнопки, пока первое еще ждет или выполняется, отбрасывается.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+
+class _UserQueue:
+    """Очередь обновлений одного игрока"""
+
+    __slots__ = ('lock', 'pending', 'callbacks')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0  # выполняется + ожидают
+        self.callbacks: Set[str] = set()
+
+
+class UserSerializationMiddleware(BaseMiddleware):
+    """Последовательная обработка обновлений одного user_id, параллельная — разных.
+
+    Регистрируется как outer-middleware на dp.update, после встроенного
+    UserContextMiddleware (он кладет в data 'event_from_user').
+    """
+
+    def __init__(self, max_pending: int = 5, busy_text: Optional[str] = "⏳ Предыдущее действие еще выполняется"):
+        if max_pending < 1:
+            raise ValueError("max_pending должен быть не меньше 1")
+        self.max_pending = max_pending
+        self.busy_text = busy_text
+        self._queues: Dict[int, _UserQueue] = {}
+        # Метрики
+        self.waiting = 0
+        self.max_depth = 0
+        self.processed = 0
+        self.dropped = {'duplicate': 0, 'overflow': 0}
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        queue = self._queues.get(user.id)
+        if queue is None:
+            queue = self._queues[user.id] = _UserQueue()
+        callback = event.callback_query if isinstance(event, Update) else None
+        callback_data = callback.data if callback is not None else None
+
+        if callback_data is not None and callback_data in queue.callbacks:
+            return await self._drop('duplicate', user.id, callback)
+        if queue.pending >= self.max_pending:
+            return await self._drop('overflow', user.id, callback)
+
+        queue.pending += 1
+        if callback_data is not None:
+            queue.callbacks.add(callback_data)
+        self.max_depth = max(self.max_depth, queue.pending - 1)
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        self.waiting += 1
+        acquired = False
+        try:
+            async with queue.lock:
+                acquired = True
+                self.waiting -= 1
+                self._observe_wait(loop.time() - queued_at)
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.processed += 1
+        finally:
+            if not acquired:
+                self.waiting -= 1
+            queue.pending -= 1
+            if callback_data is not None:
+                queue.callbacks.discard(callback_data)
+            if queue.pending == 0:
+                self._queues.pop(user.id, None)
+
+    def _observe_wait(self, seconds: float):
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    async def _drop(self, reason: str, user_id: int, callback):
+        self.dropped[reason] += 1
+        logger.debug(f"Обновление пользователя {user_id} отброшено: {reason}")
+        if callback is not None and self.busy_text:
+            # Снимаем "часики" с кнопки, иначе клиент ждет ответа до таймаута
+            try:
+                await callback.answer(self.busy_text)
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на callback: {e}")
+        return None
+
+    def queue_depth(self) -> int:
+        """Сколько обновлений сейчас ждут своей очереди"""
+        return self.waiting
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_user_queue_depth', {}, self.waiting),
+            ('bot_user_queue_max_depth', {}, self.max_depth),
+            ('bot_user_queue_wait_seconds_total', {}, self.wait_total),
+            ('bot_user_queue_wait_count_total', {}, self.wait_count),
+            ('bot_user_queue_dropped_total', {'reason': 'duplicate'}, self.dropped['duplicate']),
+            ('bot_user_queue_dropped_total', {'reason': 'overflow'}, self.dropped['overflow']),
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active_users': len(self._queues),
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_depth,
+            'processed': self.processed,
+            'dropped': dict(self.dropped),
+            'wait_avg': self.wait_total / self.wait_count if self.wait_count else 0.0,
+            'wait_max': self.wait_max,
+        }
@@ -0,0 +1,153 @@
+"""
+Уведомления о готовой продукции и созревших инвестициях.
+
+При запуске продукции и создании инвестиции ReadyNotifier ставит задачу
+планировщика (scheduler.py) на ready_at / matures_at. Когда задачи наступают,
+их обработчики копятся в пачку: одна транзакция помечает все строки пачки
+уведомленными (GameDatabase.claim_ready_notifications — инвестиции заодно
+становятся matured), затем игрокам уходят сообщения с кнопкой «Забрать». Строка,
+уже уведомленная, собранная или выведенная, второй раз не сообщается. Если
+пометить пачку не удалось (например, база занята записью другого воркера),
+все ее задачи падают и повторяются планировщиком с задержкой.
+
+Сообщения идут через сессию бота, то есть через OutboundLimiter: пачка больше
+max_batch не отправляется целиком — остаток переносится на retry_after секунд,
+чтобы не держать планировщик, пока лимитер выпускает сообщения. Ошибка сети
+снимает отметку и повторяет задачу; игрок, заблокировавший бота, пропускается.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from database import GameDatabase
+from scheduler import Job, JobScheduler
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_READY = 'production_ready'
+INVESTMENT_MATURED = 'investment_matured'
+_TABLES = {PRODUCTION_READY: 'productions', INVESTMENT_MATURED: 'investments'}
+
+
+def _local_time(value: Union[str, datetime]) -> datetime:
+    """ready_at / matures_at хранятся строкой в местном времени"""
+    return value if isinstance(value, datetime) else datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+
+
+class ReadyNotifier:
+    """Одно сообщение игроку на каждую готовую продукцию и созревшую инвестицию"""
+
+    def __init__(self, db: GameDatabase, scheduler: JobScheduler, bot: Bot, max_batch: int = 100,
+                 retry_after: float = 2.0):
+        self.db = db
+        self.scheduler = scheduler
+        self.bot = bot
+        self.max_batch = max_batch
+        self.retry_after = retry_after
+        self._pending: List[Tuple[Job, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Метрики
+        self.sent = 0
+        self.skipped = 0
+        self.postponed = 0
+        self.failed = 0
+        scheduler.register(PRODUCTION_READY, self._on_ready)
+        scheduler.register(INVESTMENT_MATURED, self._on_ready)
+
+    def production_started(self, prod_id: int, ready_at: Union[str, datetime]) -> Optional[int]:
+        return self.scheduler.schedule(PRODUCTION_READY, _local_time(ready_at), key=str(prod_id))
+
+    def investment_created(self, inv_id: int, matures_at: Union[str, datetime]) -> Optional[int]:
+        return self.scheduler.schedule(INVESTMENT_MATURED, _local_time(matures_at), key=str(inv_id))
+
+    def backfill(self) -> int:
+        """Задачи для продукций и инвестиций, созданных до появления уведомлений"""
+        return self.db.backfill_ready_jobs(PRODUCTION_READY, INVESTMENT_MATURED)
+
+    async def _on_ready(self, job: Job):
+        # Обработчики одной пачки планировщика запускаются вместе: первый
+        # откладывает сбор пачки до момента, когда встанут в очередь остальные
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((job, future))
+        if len(self._pending) == 1:
+            asyncio.get_running_loop().call_soon(self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        later = time.time() + self.retry_after
+        for _, future in batch[self.max_batch:]:
+            future.set_result(later)
+        self.postponed += max(0, len(batch) - self.max_batch)
+        batch = batch[:self.max_batch]
+        try:
+            ids = {kind: [int(job.key) for job, _ in batch if job.kind == kind] for kind in _TABLES}
+            claimed = await asyncio.to_thread(self.db.claim_ready_notifications, ids[PRODUCTION_READY],
+                                              ids[INVESTMENT_MATURED])
+            if claimed is None:
+                # Задачи пачки повторятся планировщиком с задержкой
+                raise RuntimeError("Не удалось пометить пачку уведомленной")
+            sends = []
+            for job, future in batch:
+                info = claimed[_TABLES[job.kind]].get(int(job.key))
+                if info is None:
+                    self.skipped += 1
+                    future.set_result(None)
+                else:
+                    sends.append((job, future, info))
+            results = await asyncio.gather(*(self._send(job.kind, info) for job, _, info in sends),
+                                           return_exceptions=True)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        unsent: Dict[str, List[int]] = {kind: [] for kind in _TABLES}
+        for (job, _, info), result in zip(sends, results):
+            if isinstance(result, BaseException) and not isinstance(result, (TelegramForbiddenError, TelegramBadRequest)):
+                unsent[job.kind].append(info['id'])
+        if any(unsent.values()):
+            # Отметка снимается до повтора задачи
+            await asyncio.to_thread(self.db.release_ready_notifications, unsent[PRODUCTION_READY],
+                                    unsent[INVESTMENT_MATURED])
+        for (job, future, _), result in zip(sends, results):
+            if isinstance(result, (TelegramForbiddenError, TelegramBadRequest)):
+                # Бот заблокирован или чат недоступен: повтор не поможет
+                self.skipped += 1
+                future.set_result(None)
+            elif isinstance(result, BaseException):
+                self.failed += 1
+                logger.warning(f"Уведомление {job!r} не отправлено: {result!r}")
+                future.set_exception(result)
+            else:
+                self.sent += 1
+                future.set_result(None)
+
+    async def _send(self, kind: str, info: Dict):
+        if kind == PRODUCTION_READY:
+            text = f"📦 {info['business_name']}: «{info['name']}» готово!"
+            button = InlineKeyboardButton(text="Забрать", callback_data=f"prod_collect_{info['id']}")
+        else:
+            text = f"💼 Инвестиция #{info['id']} созрела: {info['current_value']:,.0f} ₽"
+            button = InlineKeyboardButton(text="Забрать", callback_data=f"inv_claim_{info['id']}")
+        await self.bot.send_message(info['user_id'], text,
+                                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[[button]]))
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_ready_notifications_total', {'result': 'sent'}, self.sent),
+            ('bot_ready_notifications_total', {'result': 'skipped'}, self.skipped),
+            ('bot_ready_notifications_total', {'result': 'postponed'}, self.postponed),
+            ('bot_ready_notifications_total', {'result': 'failed'}, self.failed),
+        ]
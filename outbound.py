@@ -0,0 +1,428 @@
+"""
+Исходящие запросы к Bot API.
+
+EditDedupMiddleware (middleware сессии бота) хранит дайджест последнего
+отрисованного содержимого (текст, parse_mode, разметка) каждого сообщения
+(chat_id, message_id). editMessageText с тем же содержимым в Telegram не уходит:
+ответ "message is not modified" известен заранее. Если такая ошибка все же пришла
+(сообщение было отрисовано до запуска процесса), она поглощается, и запасная
+повторная правка в обработчиках не выполняется.
+
+Клиент ждет ответа на нажатие кнопки, поэтому CallbackAnswerMiddleware после
+обработчика отвечает на callback, если правка была пропущена, а сам обработчик
+не вызвал callback.answer().
+
+Кэш живет в памяти процесса, поэтому правки пропускаются только в личных чатах
+(chat_id > 0). Личное сообщение правит лишь обработчик нажатия его владельца, а
+workers.py отдает все обновления одного пользователя одному воркеру — значит,
+все правки такого сообщения идут из одного процесса. Это свойство маршрутизации
+обновлений, а не базы: в game.db воркеры пишут и чужих игроков (PvP-бои). В группах
+и inline-сообщениях кнопки одного сообщения нажимают разные пользователи, и их
+правки могут идти из разных воркеров; там дайджест другого процесса устарел бы, и
+правка, возвращающая прежнее содержимое, была бы ошибочно пропущена.
+
+OutboundLimiter (middleware сессии бота) держит исходящие сообщения в пределах
+лимитов Telegram: token bucket на все чаты и на каждый чат. Ответ 429 не доходит
+до обработчика: чат ставится на паузу на retry_after секунд, и запрос повторяется.
+Несколько правок одного сообщения, ожидающих своей очереди, сливаются в одну —
+отправляется последняя, остальные вызовы получают ее результат.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import (AnswerCallbackQuery, DeleteMessage, EditMessageCaption, EditMessageMedia,
+                             EditMessageReplyMarkup, EditMessageText, SendMessage)
+from aiogram.types import Message, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+NOT_MODIFIED = 'message is not modified'
+# Методы, меняющие сообщение в обход дайджеста текста: запись сбрасывается
+_INVALIDATING = (EditMessageReplyMarkup, EditMessageCaption, EditMessageMedia, DeleteMessage)
+
+
+class _CallbackState:
+    __slots__ = ('callback_id', 'answered', 'skipped')
+
+    def __init__(self, callback_id: str):
+        self.callback_id = callback_id
+        self.answered = False
+        self.skipped = False
+
+
+# Текущий обрабатываемый callback (задается CallbackAnswerMiddleware)
+_current_callback: contextvars.ContextVar[Optional[_CallbackState]] = contextvars.ContextVar(
+    'current_callback', default=None)
+
+
+def message_key(method) -> Optional[Hashable]:
+    """Ключ сообщения для правки: (chat_id, message_id) или ('inline', inline_message_id)"""
+    inline_id = getattr(method, 'inline_message_id', None)
+    if inline_id:
+        return ('inline', inline_id)
+    chat_id, message_id = getattr(method, 'chat_id', None), getattr(method, 'message_id', None)
+    if chat_id is None or message_id is None:
+        return None
+    return (chat_id, message_id)
+
+
+def private_message_key(method) -> Optional[Hashable]:
+    """Ключ сообщения, если оно в личном чате (там все правки идут из одного процесса)"""
+    key = message_key(method)
+    if key is None or not isinstance(key[0], int) or key[0] <= 0:
+        return None
+    return key
+
+
+def render_digest(method) -> bytes:
+    """Дайджест того, как сообщение выглядит у пользователя"""
+    markup = method.reply_markup
+    parts = [
+        method.text or '',
+        str(method.parse_mode),
+        '' if markup is None else markup.model_dump_json(exclude_none=True),
+        '' if not method.entities else repr([e.model_dump(exclude_none=True) for e in method.entities]),
+    ]
+    return hashlib.blake2b('\x00'.join(parts).encode('utf-8'), digest_size=16).digest()
+
+
+class EditDigestCache:
+    """LRU дайджестов отрисованных сообщений и счетчики сэкономленных вызовов"""
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max_size
+        self._digests: 'OrderedDict[Hashable, bytes]' = OrderedDict()
+        # Метрики
+        self.edits = 0          # правки, отправленные в Telegram
+        self.skipped = 0        # правки, не отправленные: содержимое не изменилось
+        self.not_modified = 0   # поглощенные ответы "message is not modified"
+        self.callback_answers = 0
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        digest = self._digests.get(key)
+        if digest is not None:
+            self._digests.move_to_end(key)
+        return digest
+
+    def put(self, key: Hashable, digest: bytes):
+        self._digests[key] = digest
+        self._digests.move_to_end(key)
+        if len(self._digests) > self.max_size:
+            self._digests.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._digests.pop(key, None)
+
+    def clear(self):
+        self._digests.clear()
+
+    @property
+    def saved_calls(self) -> int:
+        """Вызовы API, которых удалось избежать (пропущенные правки и повторы после ошибки)"""
+        return self.skipped + self.not_modified
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_edit_dedup_edits_total', {}, self.edits),
+            ('bot_edit_dedup_saved_total', {'reason': 'skipped'}, self.skipped),
+            ('bot_edit_dedup_saved_total', {'reason': 'not_modified'}, self.not_modified),
+            ('bot_edit_dedup_callback_answers_total', {}, self.callback_answers),
+            ('bot_edit_dedup_cache_size', {}, len(self._digests)),
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cached_messages': len(self._digests),
+            'edits': self.edits,
+            'skipped': self.skipped,
+            'not_modified': self.not_modified,
+            'saved_calls': self.saved_calls,
+            'callback_answers': self.callback_answers,
+        }
+
+
+class EditDedupMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: пропуск editMessageText без изменений"""
+
+    def __init__(self, cache: Optional[EditDigestCache] = None):
+        self.cache = cache if cache is not None else EditDigestCache()
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if isinstance(method, EditMessageText):
+            return await self._edit(make_request, bot, method)
+        if isinstance(method, AnswerCallbackQuery):
+            state = _current_callback.get()
+            if state is not None and state.callback_id == method.callback_query_id:
+                state.answered = True
+            return await make_request(bot, method)
+        if isinstance(method, _INVALIDATING):
+            key = message_key(method)
+            if key is not None:
+                self.cache.invalidate(key)
+            return await make_request(bot, method)
+        result = await make_request(bot, method)
+        if isinstance(method, SendMessage) and isinstance(result, Message) and result.chat.id > 0:
+            # Новое сообщение: его повторная отрисовка тем же содержимым тоже не нужна
+            self.cache.put((result.chat.id, result.message_id), render_digest(method))
+        return result
+
+    async def _edit(self, make_request, bot: Bot, method: EditMessageText):
+        key = private_message_key(method)
+        if key is None:
+            return await make_request(bot, method)
+        digest = render_digest(method)
+        if self.cache.get(key) == digest:
+            self.cache.skipped += 1
+            self._mark_skipped()
+            return True
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if NOT_MODIFIED in e.message:
+                self.cache.not_modified += 1
+                self.cache.put(key, digest)
+                self._mark_skipped()
+                return True
+            self.cache.invalidate(key)
+            raise
+        except Exception:
+            self.cache.invalidate(key)
+            raise
+        self.cache.edits += 1
+        self.cache.put(key, digest)
+        return result
+
+    @staticmethod
+    def _mark_skipped():
+        state = _current_callback.get()
+        if state is not None:
+            state.skipped = True
+
+
+class CallbackAnswerMiddleware(BaseMiddleware):
+    """Ответ на callback, если правка пропущена, а обработчик сам не ответил.
+
+    Регистрируется как outer-middleware на dp.callback_query.
+    """
+
+    def __init__(self, cache: EditDigestCache):
+        self.cache = cache
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        state = _CallbackState(event.id)
+        token = _current_callback.set(state)
+        try:
+            result = await handler(event, data)
+        finally:
+            _current_callback.reset(token)
+        if state.skipped and not state.answered:
+            self.cache.callback_answers += 1
+            try:
+                await data['bot'].answer_callback_query(event.id)
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на callback: {e}")
+        return result
+
+
+# ------------------- Ограничение частоты -------------------
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity; pause() блокирует до срока"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до следующего токена (0 — можно отправлять)"""
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _PendingEdit:
+    """Правка сообщения, ждущая токена; более поздние правки заменяют method"""
+
+    __slots__ = ('method', 'waiters')
+
+    def __init__(self, method):
+        self.method = method
+        self.waiters: List[asyncio.Future] = []
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Middleware сессии бота: лимиты частоты, повтор после 429 и слияние правок.
+
+    Ограничиваются методы, адресованные чату (chat_id) или inline-сообщению;
+    answerCallbackQuery, getUpdates и служебные методы проходят без очереди.
+    """
+
+    def __init__(self, global_rate: float = 25.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_retries: int = 3, max_chats: int = 10000):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._pending: Dict[Hashable, _PendingEdit] = {}
+        # Метрики
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def __call__(self, make_request, bot: Bot, method):
+        chat = self._chat_key(method)
+        if chat is None:
+            return await make_request(bot, method)
+        if isinstance(method, EditMessageText):
+            key = message_key(method)
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Правка еще не отправлена: подменяем ее содержимое и ждем общего результата
+                pending.method = method
+                self.coalesced += 1
+                waiter = asyncio.get_running_loop().create_future()
+                pending.waiters.append(waiter)
+                return await waiter
+            pending = self._pending[key] = _PendingEdit(method)
+            try:
+                try:
+                    await self._acquire(chat)
+                finally:
+                    del self._pending[key]
+                result = await self._send(make_request, bot, pending.method, chat)
+            except BaseException as e:
+                for waiter in pending.waiters:
+                    if waiter.done():
+                        continue
+                    if isinstance(e, asyncio.CancelledError):
+                        waiter.cancel()
+                    else:
+                        waiter.set_exception(e)
+                raise
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_result(result)
+            return result
+        await self._acquire(chat)
+        return await self._send(make_request, bot, method, chat)
+
+    @staticmethod
+    def _chat_key(method) -> Optional[Hashable]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is not None:
+            return chat_id
+        inline_id = getattr(method, 'inline_message_id', None)
+        return ('inline', inline_id) if inline_id else None
+
+    def _buckets(self, chat: Hashable, now: float):
+        if self._global is None:
+            self._global = TokenBucket(self.global_rate, max(1.0, self.global_rate), now) if self.global_rate else None
+        bucket = self._chats.get(chat)
+        if bucket is None and self.chat_rate:
+            if len(self._chats) >= self.max_chats:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat] = TokenBucket(self.chat_rate, max(1.0, self.chat_burst), now)
+        return [b for b in (self._global, bucket) if b is not None]
+
+    async def _acquire(self, chat: Hashable):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            now = loop.time()
+            buckets = self._buckets(chat, now)
+            delay = max((b.delay(now) for b in buckets), default=0.0)
+            if delay <= 0:
+                for bucket in buckets:
+                    bucket.take()
+                break
+            await asyncio.sleep(delay)
+        waited = loop.time() - started
+        if waited > 0:
+            self.throttled += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    async def _send(self, make_request, bot: Bot, method, chat: Hashable):
+        attempt = 0
+        while True:
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Flood control для чата {chat}: повтор через {e.retry_after} с")
+                loop = asyncio.get_running_loop()
+                buckets = self._buckets(chat, loop.time())
+                if buckets:
+                    # Пауза для чата (или для всех, если лимит на чат выключен)
+                    buckets[-1].pause(loop.time() + e.retry_after)
+                    await self._acquire(chat)
+                else:
+                    await asyncio.sleep(e.retry_after)
+                continue
+            self.sent += 1
+            return result
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_outbound_sent_total', {}, self.sent),
+            ('bot_outbound_coalesced_total', {}, self.coalesced),
+            ('bot_outbound_retries_total', {}, self.retries),
+            ('bot_outbound_throttled_total', {}, self.throttled),
+            ('bot_outbound_wait_seconds_total', {}, self.wait_total),
+            ('bot_outbound_pending_edits', {}, len(self._pending)),
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'wait_avg': self.wait_total / self.throttled if self.throttled else 0.0,
+            'wait_max': self.wait_max,
+            'pending_edits': len(self._pending),
+            'chats': len(self._chats),
+        }
@@ -0,0 +1,166 @@
+"""
+Очередь PvP-вызовов с пакетным разрешением.
+
+pvp_fight не проводит бой сам, а ставит вызов в очередь и ждет результата.
+Фоновый обработчик собирает вызовы за окно max_delay (или до max_batch штук) и
+разрешает пачку целиком:
+
+    1. один запрос на всех участников (GameDatabase.get_pvp_candidates);
+    2. calculate_pvp_outcome для каждого боя по порядку, балансы и кулдауны
+       участников учитываются в памяти между боями пачки;
+    3. одна транзакция на бои, переводы, рейтинги и кулдауны
+       (GameDatabase.apply_pvp_batch).
+
+Вместо семи обращений к базе на бой — два на пачку. Пачка разрешается в потоке
+(asyncio.to_thread), чтобы другие обработчики не ждали транзакцию. Если база
+занята другим процессом (database is locked), пачка повторяется с паузой до
+busy_retries раз; после этого вызовы получают статус 'busy'.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from advanced_features import AdvancedGameFeatures
+from database import GameDatabase, is_busy_error
+
+logger = logging.getLogger(__name__)
+
+PVP_BET = 10000
+PVP_COOLDOWN = 30
+
+
+class PvPQueue:
+    """Вызовы на бой: submit() возвращает результат, когда пачка записана в базу"""
+
+    def __init__(self, db: GameDatabase, advanced: AdvancedGameFeatures, max_batch: int = 100,
+                 max_delay: float = 0.02, cooldown: int = PVP_COOLDOWN, busy_retries: int = 3,
+                 busy_delay: float = 0.2):
+        self.db = db
+        self.advanced = advanced
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.cooldown = cooldown
+        self.busy_retries = busy_retries
+        self.busy_delay = busy_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Метрики
+        self.batches = 0
+        self.fights = 0
+        self.max_batch_seen = 0
+        self.busy = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # Обработчик запускается при первом вызове (и заново в новом цикле событий)
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, challenger_id: int, opponent_id: int, bet: float = PVP_BET) -> Dict:
+        """Результат боя: {'status': 'done', 'outcome', 'bet'} или 'unavailable' / 'cooldown' (+ 'remaining') /
+        'busy' / 'error'"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((challenger_id, opponent_id, bet, future))
+        return await future
+
+    async def close(self):
+        """Дождаться разрешения поставленных вызовов и остановить обработчик"""
+        if self._worker is None or self._worker.done():
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            outcomes = await self._resolve_batch([item[:3] for item in batch])
+            for (_, _, _, future), outcome in zip(batch, outcomes):
+                if not future.done():
+                    future.set_result(outcome)
+                queue.task_done()
+
+    async def _resolve_batch(self, challenges: List[Tuple[int, int, float]]) -> List[Dict]:
+        """resolve() в потоке; занятая база — повтор пачки (до commit ничего не записано)"""
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return await asyncio.to_thread(self.resolve, challenges)
+            except Exception as e:
+                if not is_busy_error(e):
+                    logger.exception(f"Ошибка разрешения пачки PvP: {e}")
+                    return [{'status': 'error'}] * len(challenges)
+                self.busy += 1
+                if attempt < self.busy_retries:
+                    logger.warning(f"База занята, пачка PvP повторяется ({attempt + 1}/{self.busy_retries}): {e}")
+                    await asyncio.sleep(self.busy_delay * 2 ** attempt)
+        return [{'status': 'busy'}] * len(challenges)
+
+    def resolve(self, challenges: List[Tuple[int, int, float]]) -> List[Dict]:
+        """Разрешить пачку вызовов (challenger_id, opponent_id, bet) и записать ее одной транзакцией"""
+        user_ids = {user_id for challenger_id, opponent_id, _ in challenges for user_id in (challenger_id, opponent_id)}
+        players = {row['user_id']: row for row in self.db.get_pvp_candidates(list(user_ids))}
+        now = time.time()
+        matches, transfers, results, cooldowns, outcomes = [], [], [], [], []
+        for challenger_id, opponent_id, bet in challenges:
+            player, opponent = players.get(challenger_id), players.get(opponent_id)
+            if player is None or opponent is None:
+                outcomes.append({'status': 'unavailable'})
+                continue
+            remaining = int(player['cooldown_until'] - now)
+            if remaining > 0:
+                outcomes.append({'status': 'cooldown', 'remaining': remaining})
+                continue
+            # Ограничим ставку доступными балансами сторон
+            bet = min(bet, max(0, player['balance'] // 2), max(0, opponent['balance'] // 2)) or 1000
+            result = self.advanced.calculate_pvp_outcome(player, opponent, bet)
+            winner_id = result['winner']['user_id'] if result['winner'] else None
+            loser_id = result['loser']['user_id'] if result['loser'] else None
+            matches.append((challenger_id, opponent_id, winner_id, loser_id, bet,
+                            result['player1_power'], result['player2_power'], result['outcome']))
+            if winner_id is not None:
+                winner, loser = players[winner_id], players[loser_id]
+                transfers.append((winner_id, bet, 'pvp_win', f"Победа над {loser.get('username') or loser.get('first_name')}"))
+                transfers.append((loser_id, -bet, 'pvp_loss', f"Поражение от {winner.get('username') or winner.get('first_name')}"))
+                winner['balance'] += bet
+                loser['balance'] -= bet
+                results.append((winner_id, loser_id))
+            player['cooldown_until'] = now + self.cooldown
+            cooldowns.append((challenger_id, self.cooldown))
+            outcomes.append({'status': 'done', 'outcome': result['outcome'], 'bet': bet})
+
+        if matches and not self.db.apply_pvp_batch(matches, transfers, results, cooldowns):
+            return [{'status': 'error'} if o['status'] == 'done' else o for o in outcomes]
+        self.batches += 1
+        self.fights += len(matches)
+        self.max_batch_seen = max(self.max_batch_seen, len(challenges))
+        return outcomes
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_pvp_batches_total', {}, self.batches),
+            ('bot_pvp_fights_total', {}, self.fights),
+            ('bot_pvp_queue_depth', {}, self._queue.qsize() if self._queue is not None else 0),
+            ('bot_pvp_max_batch', {}, self.max_batch_seen),
+            ('bot_pvp_busy_total', {}, self.busy),
+        ]
@@ -0,0 +1,243 @@
+"""
+Профилировщик SQL-запросов.
+
+Каждый запрос, выполненный через соединение с factory=ProfiledConnection, замеряется
+и группируется по "отпечатку" — тексту запроса с литералами, замененными на '?'.
+По отпечаткам хранятся число вызовов, суммарное и максимальное время и последние
+замеры для p99. Запросы медленнее порога пишутся в лог вместе с EXPLAIN QUERY PLAN.
+
+Подключение:
+    sqlite3.connect(path, factory=ProfiledConnection)
+    aiosqlite.connect(path, factory=ProfiledConnection)
+
+Отчет: PROFILER.report() или админская команда /queries.
+Время SELECT складывается из execute (у SQLite это шаги до первой строки, включая
+сортировку) и последующих fetch*; p99 считается по execute.
+"""
+
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+from config import QUERY_PROFILER, QUERY_SLOW_MS
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """Нормализованный текст запроса: без комментариев, литералов и лишних пробелов"""
+    text = _COMMENT_RE.sub(' ', sql)
+    text = _STRING_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _IN_LIST_RE.sub('(?+)', text)
+    return _SPACE_RE.sub(' ', text).strip().rstrip(';')
+
+
+class QueryStats:
+    """Статистика одного отпечатка запроса"""
+
+    __slots__ = ('fingerprint', 'count', 'total', 'max', 'errors', 'samples', 'plan')
+
+    def __init__(self, fingerprint: str, window: int):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.plan: Optional[str] = None
+
+    def p99(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class QueryProfiler:
+    """Сбор статистики запросов (потокобезопасно: aiosqlite выполняет запросы в своем потоке)"""
+
+    def __init__(self, slow_threshold: float = 0.05, window: int = 1000, enabled: bool = True):
+        self.slow_threshold = slow_threshold
+        self.window = window
+        self.enabled = enabled
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, sql: str) -> QueryStats:
+        key = fingerprint(sql)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = QueryStats(key, self.window)
+        return stats
+
+    def record(self, sql: str, elapsed: float, conn: Optional[sqlite3.Connection] = None,
+               params=None, failed: bool = False):
+        with self._lock:
+            stats = self._get(sql)
+            stats.count += 1
+            stats.total += elapsed
+            stats.samples.append(elapsed)
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if failed:
+                stats.errors += 1
+            need_plan = elapsed >= self.slow_threshold and stats.plan is None
+        if elapsed >= self.slow_threshold and not failed:
+            if need_plan and conn is not None:
+                stats.plan = explain(conn, sql, params)
+            logger.warning(f"Медленный запрос {elapsed * 1000:.1f} мс: {stats.fingerprint}"
+                           + (f"\nПлан:\n{stats.plan}" if need_plan and stats.plan else ''))
+
+    def add_fetch_time(self, sql: str, elapsed: float):
+        with self._lock:
+            self._get(sql).total += elapsed
+
+    def top(self, limit: int = 10, by: str = 'total') -> List[QueryStats]:
+        keys = {
+            'total': lambda s: s.total,
+            'p99': lambda s: s.p99(),
+            'count': lambda s: s.count,
+            'max': lambda s: s.max,
+        }
+        with self._lock:
+            items = list(self._stats.values())
+        return sorted(items, key=keys[by], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def report(self, limit: int = 10, width: int = 90) -> str:
+        """Текстовый отчет: топ по суммарному времени и по p99"""
+        lines = []
+        for by, title in (('total', 'по суммарному времени'), ('p99', 'по p99')):
+            lines.append(f"Топ-{limit} запросов {title} (всего мс / вызовов / ср. мс / p99 мс):")
+            for stats in self.top(limit, by):
+                text = stats.fingerprint if len(stats.fingerprint) <= width else stats.fingerprint[:width - 1] + '…'
+                lines.append(f"{stats.total * 1000:9.1f} {stats.count:7d} {stats.avg * 1000:7.2f} "
+                             f"{stats.p99() * 1000:7.2f}  {text}")
+            lines.append('')
+        return '\n'.join(lines).rstrip() + '\n'
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=None) -> Optional[str]:
+    """EXPLAIN QUERY PLAN для запроса (только DML; ошибки не пробрасываются)"""
+    statement = sql.lstrip()
+    if not statement[:7].upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        cursor = sqlite3.Cursor(conn)
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", params or ()).fetchall()
+        cursor.close()
+    except sqlite3.Error as e:
+        return f"(план недоступен: {e})"
+    return '\n'.join(f"  {row[-1]}" for row in rows)
+
+
+PROFILER = QueryProfiler(slow_threshold=QUERY_SLOW_MS / 1000, enabled=QUERY_PROFILER)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, замеряющий execute/executemany/fetch* в PROFILER"""
+
+    _last_sql: Optional[str] = None
+
+    def execute(self, sql, parameters=()):
+        if not PROFILER.enabled:
+            return super().execute(sql, parameters)
+        self._last_sql = sql
+        started = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except Exception:
+            PROFILER.record(sql, time.perf_counter() - started, failed=True)
+            raise
+        PROFILER.record(sql, time.perf_counter() - started, self.connection, parameters)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        if not PROFILER.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        self._last_sql = None
+        started = time.perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        except Exception:
+            PROFILER.record(sql, time.perf_counter() - started, failed=True)
+            raise
+        PROFILER.record(sql, time.perf_counter() - started)
+        return result
+
+    def executescript(self, sql_script):
+        if not PROFILER.enabled:
+            return super().executescript(sql_script)
+        self._last_sql = None
+        started = time.perf_counter()
+        result = super().executescript(sql_script)
+        PROFILER.record(sql_script, time.perf_counter() - started)
+        return result
+
+    def _timed_fetch(self, fetch, *args):
+        if self._last_sql is None or not PROFILER.enabled:
+            return fetch(*args)
+        started = time.perf_counter()
+        result = fetch(*args)
+        PROFILER.add_fetch_time(self._last_sql, time.perf_counter() - started)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение, создающее ProfiledCursor (в том числе для conn.execute)"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute* создают курсор в обход cursor(), поэтому переопределены явно
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        # Фиксация транзакции: ожидание блокировки записи и сброс на диск
+        if not PROFILER.enabled:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            super().commit()
+        except Exception:
+            PROFILER.record('COMMIT', time.perf_counter() - started, failed=True)
+            raise
+        PROFILER.record('COMMIT', time.perf_counter() - started)
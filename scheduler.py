@@ -0,0 +1,285 @@
+"""
+Планировщик отложенных задач игры.
+
+Задачи хранятся в таблице jobs (GameDatabase.schedule_job): вид kind, ключ,
+payload и время run_at. JobScheduler работает в цикле событий бота:
+
+    1. арендует задачи, которые наступят в ближайшие horizon секунд
+       (GameDatabase.lease_jobs), и кладет их в кучу по run_at;
+    2. спит до ближайшей задачи кучи — или до новой, поставленной раньше нее;
+    3. наступившие задачи выполняет пачкой обработчиками своего вида (register)
+       и записывает итоги пачки одной транзакцией (GameDatabase.finish_jobs).
+
+Аренда (lease_owner, lease_until) отдает задачу одному процессу (workers.py);
+задачи остановившегося процесса другие подберут после истечения аренды, так
+что обработчик должен выдерживать повторный запуск. Исключение в обработчике —
+повтор с экспоненциальной задержкой, после max_attempts задача получает статус
+failed. Обработчик, вернувший время, переносит задачу на него: так устроены
+повторяющиеся задачи.
+
+Пропускная способность: python bench_scheduler.py --jobs 50000
+"""
+
+import asyncio
+import heapq
+import inspect
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from database import GameDatabase
+
+logger = logging.getLogger(__name__)
+
+When = Union[float, datetime]
+
+
+def _timestamp(when: When) -> float:
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+class Job:
+    """Задача, переданная обработчику"""
+
+    __slots__ = ('id', 'kind', 'key', 'payload', 'run_at', 'attempts', 'max_attempts')
+
+    def __init__(self, job_id: int, kind: str, key: Optional[str], payload: Dict, run_at: float,
+                 attempts: int = 0, max_attempts: int = 5):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.run_at = run_at
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+    def __repr__(self) -> str:
+        return f'Job({self.id}, {self.kind!r}, {self.key!r})'
+
+
+Handler = Callable[[Job], Union[None, When, Awaitable[Optional[When]]]]
+
+
+class JobScheduler:
+    """Выполнение задач jobs в цикле событий: register() обработчики, schedule() задачи"""
+
+    def __init__(self, db: GameDatabase, owner: Optional[str] = None, horizon: float = 30.0, lease: float = 300.0,
+                 batch_size: int = 1000, retry_delay: float = 5.0, max_retry_delay: float = 3600.0,
+                 clock: Callable[[], float] = time.time):
+        self.db = db
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.horizon = horizon
+        self.lease = lease
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.clock = clock
+        self._handlers: Dict[str, Handler] = {}
+        # Куча (run_at, id) и арендованные задачи по id; запись кучи без задачи
+        # или с другим run_at устарела (задача отменена или перенесена)
+        self._heap: List[Tuple[float, int]] = []
+        self._jobs: Dict[int, Job] = {}
+        self._keys: Dict[Tuple[str, str], int] = {}
+        # Все задачи с run_at <= _loaded_until уже арендованы этим процессом
+        self._loaded_until = 0.0
+        self._next_refill = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Метрики
+        self.executed = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.lag_max = 0.0
+
+    def register(self, kind: str, handler: Handler):
+        """handler(job) — функция или корутина; None завершает задачу, время (unix или datetime) переносит ее"""
+        self._handlers[kind] = handler
+
+    def handler(self, kind: str):
+        """Декоратор для register"""
+        def decorate(func: Handler) -> Handler:
+            self.register(kind, func)
+            return func
+        return decorate
+
+    def schedule(self, kind: str, run_at: When, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None,
+                 max_attempts: int = 5, replace: bool = True) -> Optional[int]:
+        """Поставить задачу; задача с тем же (kind, key) переносится (replace=False — остается как есть)"""
+        run_at = _timestamp(run_at)
+        # Задача внутри уже загруженного окна сразу арендуется этим процессом
+        local = replace and self._task is not None and run_at <= self._loaded_until
+        lease_owner, lease_until = (self.owner, self.clock() + self.horizon + self.lease) if local else (None, 0.0)
+        job_id = self.db.schedule_job(kind, run_at, payload, key, max_attempts, lease_owner, lease_until, replace)
+        if job_id is None or not replace:
+            return job_id
+        if key is not None:
+            self._forget(self._keys.get((kind, key)))
+        if local:
+            self._push(Job(job_id, kind, key, payload or {}, run_at, 0, max_attempts))
+            if self._wakeup is not None:
+                self._wakeup.set()
+        return job_id
+
+    def cancel(self, kind: str, key: str) -> bool:
+        self._forget(self._keys.get((kind, key)))
+        return self.db.cancel_job(kind, key)
+
+    def _push(self, job: Job):
+        self._jobs[job.id] = job
+        if job.key is not None:
+            self._keys[(job.kind, job.key)] = job.id
+        heapq.heappush(self._heap, (job.run_at, job.id))
+
+    def _forget(self, job_id: Optional[int]):
+        job = self._jobs.pop(job_id, None)
+        if job is not None and job.key is not None:
+            self._keys.pop((job.kind, job.key), None)
+
+    async def start(self):
+        """Запустить обработку (dp.startup)"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self, grace: float = 10.0):
+        """Остановить обработку и вернуть невыполненные задачи другим процессам (dp.shutdown).
+
+        Текущая пачка дорабатывает до grace секунд, затем прерывается.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, grace)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+            self._task = None
+        self._heap.clear()
+        self._jobs.clear()
+        self._keys.clear()
+        self._loaded_until = self._next_refill = 0.0
+        await asyncio.to_thread(self.db.release_jobs, self.owner)
+
+    async def _run(self):
+        while not self._stopping:
+            now = self.clock()
+            if now >= self._next_refill:
+                await self._refill(now)
+            due = self._pop_due(now)
+            if due:
+                await self._execute(due, now)
+                await asyncio.sleep(0)
+                continue
+            if self._stopping:
+                break
+            wake_at = min(self._heap[0][0], self._next_refill) if self._heap else self._next_refill
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, wake_at - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, now: float):
+        due_before = now + self.horizon
+        rows = await asyncio.to_thread(self.db.lease_jobs, self.owner, due_before, now,
+                                       due_before + self.lease, self.batch_size)
+        for row in rows:
+            if row['id'] not in self._jobs:
+                self._push(Job(row['id'], row['kind'], row['key'], row['payload'], row['run_at'],
+                               row['attempts'], row['max_attempts']))
+        if len(rows) < self.batch_size:
+            self._loaded_until = due_before
+            self._next_refill = now + self.horizon / 2
+        else:
+            # Окно не поместилось в пачку: догрузим после выполнения этой
+            self._loaded_until = rows[-1]['run_at']
+            self._next_refill = now
+
+    def _pop_due(self, now: float) -> List[Job]:
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now and len(due) < self.batch_size:
+            run_at, job_id = heapq.heappop(heap)
+            job = self._jobs.get(job_id)
+            if job is None or job.run_at != run_at:
+                continue
+            self._forget(job_id)
+            due.append(job)
+        return due
+
+    async def _execute(self, jobs: List[Job], now: float):
+        done: List[Tuple[int, float]] = []
+        rescheduled: List[Tuple[float, int, float]] = []
+        retried: List[Tuple[float, str, int, float]] = []
+        pending = []
+        for job in jobs:
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                self._retry(job, f'нет обработчика {job.kind}', retried)
+                continue
+            try:
+                result = handler(job)
+            except Exception as e:
+                self._retry(job, repr(e), retried)
+                continue
+            if inspect.isawaitable(result):
+                pending.append((job, result))
+            else:
+                self._complete(job, result, done, rescheduled)
+        if pending:
+            results = await asyncio.gather(*(awaitable for _, awaitable in pending), return_exceptions=True)
+            for (job, _), result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    self._retry(job, repr(result), retried)
+                else:
+                    self._complete(job, result, done, rescheduled)
+        # Перенесенные внутрь загруженного окна остаются за этим процессом и сразу идут в кучу
+        keep_before = self._loaded_until
+        finished = await asyncio.to_thread(self.db.finish_jobs, self.owner, done, rescheduled, retried,
+                                           keep_before, self.clock() + self.horizon + self.lease)
+        if finished:
+            by_id = {job.id: job for job in jobs}
+            requeue = [(by_id[job_id], run_at, 0) for run_at, job_id, _ in rescheduled]
+            requeue += [(by_id[job_id], run_at, by_id[job_id].attempts + 1) for run_at, _, job_id, _ in retried]
+            for job, run_at, attempts in requeue:
+                # Задачу могли заново поставить через schedule, пока она выполнялась
+                if run_at <= keep_before and attempts < job.max_attempts and job.id not in self._jobs:
+                    self._push(Job(job.id, job.kind, job.key, job.payload, run_at, attempts, job.max_attempts))
+        self.batches += 1
+        self.lag_max = max(self.lag_max, now - jobs[0].run_at)
+
+    def _complete(self, job: Job, result: Optional[When], done: List[Tuple[int, float]],
+                  rescheduled: List[Tuple[float, int, float]]):
+        self.executed += 1
+        if result is None:
+            done.append((job.id, job.run_at))
+        else:
+            rescheduled.append((_timestamp(result), job.id, job.run_at))
+
+    def _retry(self, job: Job, error: str, retried: List[Tuple[float, str, int, float]]):
+        if job.attempts + 1 >= job.max_attempts:
+            self.failed += 1
+            logger.error(f"Задача {job!r} не выполнена за {job.max_attempts} попыток: {error}")
+        else:
+            self.retried += 1
+            logger.warning(f"Задача {job!r} упала, попытка {job.attempts + 1}: {error}")
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** job.attempts)
+        retried.append((self.clock() + delay, error, job.id, job.run_at))
+
+    def collect(self):
+        """Метрики для MetricsRegistry.add_collector"""
+        return [
+            ('bot_scheduler_jobs_total', {'result': 'done'}, self.executed),
+            ('bot_scheduler_jobs_total', {'result': 'retried'}, self.retried),
+            ('bot_scheduler_jobs_total', {'result': 'failed'}, self.failed),
+            ('bot_scheduler_batches_total', {}, self.batches),
+            ('bot_scheduler_leased_jobs', {}, len(self._jobs)),
+            ('bot_scheduler_lag_max_seconds', {}, self.lag_max),
+        ]
@@ -24,6 +24,18 @@ class Config:
 	bot_token: str
 	admin_ids: set[int]
 	db_path: str
+	# polling | webhook
+	mode: str = "polling"
+	webhook_base_url: str = ""
+	webhook_path: str = "/webhook"
+	webhook_secret: str = ""
+	webapp_host: str = "0.0.0.0"
+	webapp_port: int = 8080
+	health_path: str = "/health"
+	# Alternative Bot API base URL (local Bot API server or a fake API in tests)
+	api_url: str = ""
+	# memory | sqlite:///path/to/fsm.db (shared between processes)
+	fsm_storage: str = "memory"
 
 	@staticmethod
 	def load() -> "Config":
@@ -33,4 +45,20 @@ class Config:
 		admin_ids = _parse_admins(os.getenv("ADMINS"))
 		db_path = os.getenv("DB_PATH", "/workspace/data/bot.db")
 		os.makedirs(os.path.dirname(db_path), exist_ok=True)
-		return Config(bot_token=bot_token, admin_ids=admin_ids, db_path=db_path)
\ No newline at end of file
+		mode = os.getenv("BOT_MODE", "polling").strip().lower()
+		if mode not in ("polling", "webhook"):
+			raise RuntimeError(f"BOT_MODE must be 'polling' or 'webhook', got {mode!r}")
+		return Config(
+			bot_token=bot_token,
+			admin_ids=admin_ids,
+			db_path=db_path,
+			mode=mode,
+			webhook_base_url=os.getenv("WEBHOOK_BASE_URL", "").strip(),
+			webhook_path=os.getenv("WEBHOOK_PATH", "/webhook"),
+			webhook_secret=os.getenv("WEBHOOK_SECRET", ""),
+			webapp_host=os.getenv("WEBAPP_HOST", "0.0.0.0"),
+			webapp_port=int(os.getenv("WEBAPP_PORT", "8080")),
+			health_path=os.getenv("HEALTH_PATH", "/health"),
+			api_url=os.getenv("TELEGRAM_API_URL", "").strip(),
+			fsm_storage=os.getenv("FSM_STORAGE", "memory").strip(),
+		)
\ No newline at end of file
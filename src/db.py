@@ -1,6 +1,8 @@
 import aiosqlite
 from typing import Optional, Any
 
+from query_profiler import ProfiledConnection
+
 
 USER_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS users (
@@ -33,7 +35,7 @@ class Database:
 
 	async def connect(self) -> None:
 		if self._conn is None:
-			self._conn = await aiosqlite.connect(self._path)
+			self._conn = await aiosqlite.connect(self._path, factory=ProfiledConnection)
 			await self._conn.execute("PRAGMA journal_mode=WAL;")
 			await self._conn.execute("PRAGMA foreign_keys=ON;")
 			await self._conn.commit()
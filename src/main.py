@@ -11,18 +11,20 @@ import sys
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from .config import Config
 from .db import Database
 from .handlers_user import setup_user_handlers
 from .handlers_admin import setup_admin_handlers
+# FSM-хранилище и запуск (polling / webhook, health-эндпоинт) общие с игровым ботом
+from fsm_storage import create_storage
+from webhook import make_session, run_bot
 
 
 async def main() -> None:
 	config = Config.load()
-	bot = Bot(token=config.bot_token, parse_mode=ParseMode.HTML)
-	dp = Dispatcher(storage=MemoryStorage())
+	bot = Bot(token=config.bot_token, session=make_session(config.api_url), parse_mode=ParseMode.HTML)
+	dp = Dispatcher(storage=create_storage(config.fsm_storage))
 
 	db = Database(config.db_path)
 	await db.init(admin_ids=config.admin_ids)
@@ -31,8 +33,12 @@ async def main() -> None:
 	dp.include_router(setup_user_handlers(db))
 	dp.include_router(setup_admin_handlers(db, config.admin_ids))
 
-	print("Bot started.")
-	await dp.start_polling(bot, allowed_updates=None)
+	print(f"Bot started ({config.mode}).")
+	await run_bot(
+		dp, bot, mode=config.mode,
+		host=config.webapp_host, port=config.webapp_port, path=config.webhook_path,
+		secret=config.webhook_secret, health_path=config.health_path, base_url=config.webhook_base_url,
+	)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+Событийные достижения: выдача по изменениям, без дублей, backfill
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+from achievements import AchievementEngine
+from database import GameDatabase
+
+
+def _titles(db: GameDatabase, user_id: int):
+    return sorted(a['title'] for a in db.get_player_achievements(user_id))
+
+
+def test_awarded_on_change_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        engine = AchievementEngine(db)
+        db.add_player(1, 'p1', 'P1')
+        assert _titles(db, 1) == []
+
+        db.update_player_balance(1, 95000, 'test')
+        assert _titles(db, 1) == ['Сотня тысяч']
+        # за популярностью правила не следят: база не читается
+        evaluations = engine.evaluations
+        db.update_player_popularity(1, 0.5)
+        assert engine.evaluations == evaluations
+
+        for i in range(5):
+            db.add_business(1, 'coffee_shop', f'b{i}', 1000, 500)
+        assert _titles(db, 1) == ['Бизнес-магнат', 'Сотня тысяч']
+        assert engine.evaluate(1) == [] and engine.awarded == 2
+        db.add_achievement(1, 'balance', 'Сотня тысяч', 'повтор')
+        assert len(db.get_player_achievements(1)) == 2
+
+
+def test_duplicates_removed_and_backfill():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        conn = sqlite3.connect(path)
+        conn.execute('DROP INDEX idx_achievements_user_title')
+        conn.executemany('INSERT INTO achievements (user_id, achievement_type, title) VALUES (?, ?, ?)',
+                         [(7, 'balance', 'Сотня тысяч')] * 3)
+        # игроки изменены в обход GameDatabase: события не было
+        conn.executemany('INSERT INTO players (user_id, balance, level) VALUES (?, ?, ?)',
+                         [(7, 200000, 1), (8, 2000000, 10), (9, 500, 1)])
+        conn.executemany('INSERT INTO businesses (user_id, business_type, name) VALUES (?, ?, ?)',
+                         [(9, 'farm', str(i)) for i in range(10)])
+        conn.commit()
+        conn.close()
+
+        db = GameDatabase(path)
+        assert len(db.get_player_achievements(7)) == 1
+        engine = AchievementEngine(db)
+        assert engine.backfill() == 5
+        assert _titles(db, 8) == ['Миллионер', 'Сотня тысяч', 'Эксперт']
+        assert _titles(db, 9) == ['Бизнес-магнат', 'Империя']
+        assert engine.backfill() == 0
+
+
+def test_awarded_cache_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        engine = AchievementEngine(db, max_cached=3)
+        for user_id in range(1, 11):
+            db.add_player(user_id, f'p{user_id}', f'P{user_id}')
+            db.update_player_balance(user_id, 95000, 'test')
+        assert list(engine._awarded) == [8, 9, 10]
+        # вытесненный игрок перечитывается из базы, повторной выдачи нет
+        db.update_player_balance(1, 10, 'test')
+        assert list(engine._awarded) == [9, 10, 1] and engine.awarded == 10
+        assert _titles(db, 1) == ['Сотня тысяч']
+
+
+def test_cache_shared_between_threads():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        engine = AchievementEngine(db, max_cached=5)
+        for user_id in range(1, 41):
+            db.add_player(user_id, f'p{user_id}', f'P{user_id}')
+        errors = []
+
+        def worker(offset):
+            # как pvp_queue: события игроков из потока, пока другие потоки делают то же
+            try:
+                for i in range(200):
+                    engine.on_player_changed(1 + (offset + i) % 40, ('balance',))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n * 7,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors and len(engine._awarded) <= 5
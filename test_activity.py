@@ -0,0 +1,66 @@
+"""
+Учет активности: пакетная запись last_active, DAU/WAU, запись при остановке
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from activity import DAY_SECONDS, ActivityTracker
+from database import GameDatabase
+
+
+class Clock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_activity_batched_and_counted():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        for user_id in (1, 2, 3):
+            db.add_player(user_id, f'p{user_id}', f'P{user_id}')
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE players SET last_active = '2000-01-01 00:00:00'")
+        conn.commit()
+        clock = Clock()
+        tracker = ActivityTracker(db, clock=clock, stats_interval=0)
+
+        async def scenario():
+            # неделю назад: попадет в WAU только до смены окна
+            tracker.touch(3)
+            await tracker.flush()
+            clock.now += 6 * DAY_SECONDS
+            db.update_player_balance(1, 10, 'test')
+            assert conn.execute('SELECT last_active FROM players WHERE user_id = 1').fetchone()[0] == '2000-01-01 00:00:00'
+            for _ in range(100):
+                tracker.touch(1)
+                tracker.touch(2)
+            assert await tracker.flush() == 2
+            # строка, уже записанная сегодня, повторно не пишется, время только растет
+            clock.now += 60
+            tracker.touch(1)
+            await tracker.flush()
+            await tracker.start()
+            clock.now += 60
+            tracker.touch(2)
+            await tracker.close()
+
+        asyncio.run(scenario())
+        assert tracker.touches == 203 and tracker.rows_written == 5 and tracker.pending == 0
+        assert (tracker.dau, tracker.wau) == (2, 3)
+        rows = dict(conn.execute('SELECT user_id, last_active FROM players').fetchall())
+        assert rows[1] < rows[2] and rows[3] < rows[1]
+        assert conn.execute('SELECT COUNT(*) FROM player_activity').fetchone()[0] == 3
+
+        # через неделю строки старого дня удаляются при смене дня
+        clock.now += 2 * DAY_SECONDS
+        asyncio.run(tracker.flush())
+        assert (tracker.dau, tracker.wau) == (0, 2)
+        assert conn.execute('SELECT COUNT(*) FROM player_activity').fetchone()[0] == 2
+        conn.close()
@@ -0,0 +1,58 @@
+"""
+Резервные копии: копирование порциями под записью, проверка, ротация, восстановление
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from backup import BackupManager, restore_snapshot, verify_snapshot
+from database import GameDatabase
+
+
+def test_backup_rotate_and_restore():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        for user_id in range(1, 501):
+            db.add_player(user_id, f'p{user_id}', f'P{user_id}')
+        backups = BackupManager(path, os.path.join(tmp, 'backups'), keep=2, pages=4, pause=0.001, max_restarts=2)
+
+        stop = threading.Event()
+
+        def writer():
+            # запись идет, пока делается копия
+            while not stop.is_set():
+                db.update_player_balance(1, 1, 'test')
+                time.sleep(0.002)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            first = backups.run()
+        finally:
+            stop.set()
+            thread.join()
+        assert first['integrity'] == 'ok' and first['pages'] > 4 and first['steps'] > 1
+        assert first['restarts'] <= 3 and (first['restarts'] <= 2 or first['single_step'])
+        assert verify_snapshot(first['snapshot']) == 'ok'
+
+        for _ in range(2):
+            time.sleep(0.01)
+            report = backups.run()
+        snapshots = backups.snapshots()
+        assert len(snapshots) == 2 and snapshots[-1] == report['snapshot']
+        assert first['snapshot'] not in snapshots and report['removed'] == [first['snapshot']]
+        assert backups.completed == 3 and backups.failed == 0
+
+        balance = db.get_player(1)['balance']
+        db.update_player_balance(1, 1000, 'test')
+        db.add_player(5000, 'late', 'Late')
+        result = restore_snapshot(report['snapshot'], path)
+        assert result['pages'] > 0
+        assert db.get_player(1)['balance'] == balance
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT COUNT(*) FROM players').fetchone()[0] == 500
+        conn.close()
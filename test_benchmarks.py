@@ -0,0 +1,146 @@
+"""
+Бенчмарки игровой логики и горячих методов GameDatabase (pytest-benchmark).
+
+В обычный прогон pytest не входят (метка bench, см. pytest.ini). Проверка на
+регрессии относительно benchmarks/baseline.json — python bench_check.py.
+
+Размеры баз задаются через BENCH_SIZES (по умолчанию 1000 игроков):
+    BENCH_SIZES=1000,100000,1000000 pytest -m bench test_benchmarks.py --benchmark-only
+"""
+
+import os
+import random
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.bench
+
+from advanced_features import AdvancedGameFeatures
+from config import BUSINESS_TYPES, IMPROVEMENTS
+from database import GameDatabase
+from game_logic import GameLogic
+from matchmaking import MatchmakingIndex
+from worldgen import WorldSpec, generate_world
+
+SIZES = [int(x) for x in os.getenv('BENCH_SIZES', '1000').replace(' ', '').split(',') if x]
+
+
+def _player(user_id: int = 1, level: int = 5) -> dict:
+    return {'user_id': user_id, 'username': f'player{user_id}', 'first_name': f'Player{user_id}',
+            'balance': 250000.0, 'level': level, 'experience': 1200, 'popularity': 1.3}
+
+
+def _businesses(count: int, rng: random.Random) -> list:
+    types = list(BUSINESS_TYPES)
+    result = []
+    for i in range(count):
+        business_type = rng.choice(types)
+        info = BUSINESS_TYPES[business_type]
+        result.append({
+            'id': i + 1, 'user_id': 1, 'business_type': business_type, 'name': f"{info['name']} {i}",
+            'income': info['base_income'] * rng.uniform(1, 3), 'expenses': info['base_expenses'] * rng.uniform(1, 2),
+            'level': rng.randint(1, 10), 'popularity': rng.uniform(0.5, 2.0),
+            'improvements': rng.sample(list(IMPROVEMENTS), rng.randint(0, len(IMPROVEMENTS))),
+        })
+    return result
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: f'{size}p')
+def seeded_db(request, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('bench') / f'game_{request.param}.db')
+    generate_world(path, WorldSpec(request.param))
+    return GameDatabase(path), request.param
+
+
+# ------------------- Игровая логика -------------------
+def test_calculate_daily_progress(benchmark):
+    logic = GameLogic()
+    player, businesses = _player(), _businesses(10, random.Random(1))
+    result = benchmark(logic.calculate_daily_progress, player, businesses)
+    assert result['total_income'] > 0
+
+
+def test_calculate_empire_value(benchmark):
+    advanced = AdvancedGameFeatures()
+    player, businesses = _player(), _businesses(20, random.Random(2))
+    result = benchmark(advanced.calculate_empire_value, player, businesses)
+    assert result['empire_size'] == 20
+
+
+def test_simulate_visitors(benchmark):
+    advanced = AdvancedGameFeatures()
+    business = _businesses(1, random.Random(3))[0]
+    random.seed(3)
+    visitors = benchmark(advanced.simulate_visitors, business)
+    assert visitors
+
+
+def test_simulate_visitors_batch(benchmark):
+    np = pytest.importorskip('numpy')
+    from visitor_sim import VisitorSimulator
+    simulator = VisitorSimulator(seed=3)
+    businesses = _businesses(10000, random.Random(3))
+    type_codes = simulator.encode_types([b['business_type'] for b in businesses])
+    popularity = np.array([b['popularity'] for b in businesses])
+    batch = benchmark(simulator.simulate, type_codes, popularity)
+    assert len(batch.counts) == 10000
+
+
+def test_calculate_pvp_outcome(benchmark):
+    advanced = AdvancedGameFeatures()
+    result = benchmark(advanced.calculate_pvp_outcome, _player(1, 5), _player(2, 7), 10000)
+    assert result['outcome'] in ('win', 'loss', 'draw')
+
+
+# ------------------- GameDatabase -------------------
+def test_db_get_player(benchmark, seeded_db):
+    db, size = seeded_db
+    rng = random.Random(4)
+    benchmark.group = f'db {size}p'
+    assert benchmark(lambda: db.get_player(rng.randint(1, size))) is not None
+
+
+def test_db_get_player_businesses(benchmark, seeded_db):
+    db, size = seeded_db
+    rng = random.Random(5)
+    benchmark.group = f'db {size}p'
+    assert benchmark(lambda: db.get_player_businesses(rng.randint(1, size)))
+
+
+def test_db_get_top_players(benchmark, seeded_db):
+    db, size = seeded_db
+    benchmark.group = f'db {size}p'
+    assert len(benchmark(db.get_top_players, 10)) == min(10, size)
+
+
+def test_db_get_pvp_top(benchmark, seeded_db):
+    db, size = seeded_db
+    benchmark.group = f'db {size}p'
+    assert benchmark(db.get_pvp_top, 10)
+
+
+def test_db_get_top_businesses_by_reviews(benchmark, seeded_db):
+    db, size = seeded_db
+    benchmark.group = f'db {size}p'
+    benchmark(db.get_top_businesses_by_reviews, 10, 1)
+
+
+def test_db_update_player_balance(benchmark, seeded_db):
+    db, size = seeded_db
+    rng = random.Random(6)
+    benchmark.group = f'db {size}p'
+    # Запись с фиксацией на диск: ограниченное число раундов
+    result = benchmark.pedantic(lambda: db.update_player_balance(rng.randint(1, size), 100, 'bench'),
+                                rounds=50, iterations=1)
+    assert result is True
+
+
+def test_matchmaking_nearest(benchmark, seeded_db):
+    db, size = seeded_db
+    index = MatchmakingIndex(db, AdvancedGameFeatures()._calculate_player_power)
+    index.rebuild()
+    rng = random.Random(7)
+    benchmark.group = f'db {size}p'
+    assert benchmark(lambda: index.nearest(rng.randint(1, size), 8))
@@ -0,0 +1,49 @@
+"""
+Сжатие visitors: дневные итоги, свежие строки остаются, повторный запуск ничего не меняет
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from database import GameDatabase
+
+
+def _fill(path: str):
+    conn = sqlite3.connect(path)
+    rows = []
+    # 10 и 9 дней назад — к сжатию, 1 день назад — остается
+    for days, business_id, count in ((10, 1, 30), (10, 2, 5), (9, 1, 7), (1, 1, 4)):
+        for i in range(count):
+            rating = i % 6 or None
+            rows.append((business_id, 100.0, rating, rating is not None, f'-{days} days'))
+    conn.executemany('''
+        INSERT INTO visitors (business_id, spent, rating, reviewed, visited_at)
+        VALUES (?, ?, ?, ?, datetime('now', ?))
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+def test_compact_visitors():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        _fill(path)
+
+        report = db.compact_visitors(7, batch_size=8)
+        assert report['rows'] == 42
+        assert report['batches'] == 6
+        assert report['incremental_vacuum']
+
+        days = db.get_visitor_daily(1)
+        assert [d['visitors'] for d in days] == [30, 7]
+        assert days[0]['spent'] == 3000.0
+        assert days[0]['ratings'] == [5, 5, 5, 5, 5]
+        assert db.get_visitor_daily(2)[0]['ratings'] == [1, 1, 1, 1, 0]
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT COUNT(*) FROM visitors').fetchone()[0] == 4
+        conn.close()
+        assert db.compact_visitors(7)['rows'] == 0
+        assert [d['visitors'] for d in db.get_visitor_daily(1)] == [30, 7]
@@ -0,0 +1,32 @@
+"""
+Монте-Карло симулятор экономики
+"""
+
+import pytest
+
+from config import BUSINESS_TYPES, STARTING_BALANCE
+from economy_sim import Policy, apply_overrides, simulate
+
+
+def test_report_is_reproducible_and_flows_balance():
+    report = simulate(60, 20, seed=7, chunk_size=25)
+    # порции с фиксированным seed: число процессов не меняет результат
+    assert simulate(60, 20, seed=7, chunk_size=25, workers=2) == report
+    assert sorted(report['balance']) == [point['day'] for point in report['inflation']]
+    assert report['inflation'][-1]['day'] == 20
+    money_supply = report['inflation'][-1]['money_supply']
+    assert abs(money_supply - 60 * STARTING_BALANCE - sum(report['flows'].values())) < 1e-6 * money_supply
+    assert all(0 < level['reached'] <= 1 for level in report['time_to_level'].values())
+
+
+def test_overrides_change_economy():
+    quiet = Policy(improve=0, loan=0, invest=0, events_per_day=0)
+    base = simulate(20, 15, quiet, seed=3)
+    original = BUSINESS_TYPES['coffee_shop']['base_income']
+    try:
+        boosted = simulate(20, 15, quiet, seed=3, overrides=[f'business.coffee_shop.base_income={original * 3}'])
+    finally:
+        BUSINESS_TYPES['coffee_shop']['base_income'] = original
+    assert boosted['flows']['income'] > base['flows']['income']
+    with pytest.raises(ValueError):
+        apply_overrides(['business.casino.base_income=1'])
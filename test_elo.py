@@ -0,0 +1,68 @@
+"""
+Рейтинг Эло: живые матчи и пересчет истории дают одинаковый результат
+"""
+
+import os
+import random
+import tempfile
+
+from database import GameDatabase
+from elo import EloEngine, RatingState
+
+
+def _profiles(db: GameDatabase, user_ids):
+    return {uid: db.get_pvp_profile(uid) for uid in user_ids}
+
+
+def test_engine_is_zero_sum_and_tracks_streaks():
+    engine = EloEngine(k_factor=32)
+    a, b = RatingState(1200), RatingState(1000)
+    engine.apply(a, b)
+    assert a.rating + b.rating == 2200 and 0 < a.rating - 1200 < 16
+    engine.apply(b, a)
+    assert (a.wins, a.losses, a.streak) == (1, 1, -1) and (b.wins, b.losses, b.streak) == (1, 1, 1)
+
+
+def test_live_matches_and_replay_agree():
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        users = list(range(1, 9))
+        for uid in users:
+            db.add_player(uid, f'p{uid}', f'P{uid}')
+        for _ in range(60):
+            first, second = rng.sample(users, 2)
+            outcome = rng.choice(['win', 'loss', 'draw'])
+            winner, loser = (first, second) if outcome == 'win' else (second, first)
+            if outcome == 'draw':
+                db.record_pvp_match(first, second, None, None, 1000, 1, 1, 'draw')
+                continue
+            db.record_pvp_match(first, second, winner, loser, 1000, 1, 1, outcome)
+            db.update_pvp_ratings_after_match(winner, loser)
+        live = _profiles(db, users)
+
+        assert db.rebuild_pvp_ratings(batch_size=7)['players'] == len(users)
+        replayed = _profiles(db, users)
+        for uid in users:
+            for field in ('wins', 'losses', 'streak'):
+                assert replayed[uid][field] == live[uid][field]
+            assert abs(replayed[uid]['rating'] - live[uid]['rating']) < 1e-9
+
+        # другой K-фактор: сумма рейтингов сохраняется, сами рейтинги меняются
+        db.rebuild_pvp_ratings(EloEngine(k_factor=16))
+        halved = _profiles(db, users)
+        assert abs(sum(p['rating'] for p in halved.values()) - 1000 * len(users)) < 1e-6
+        assert any(abs(halved[uid]['rating'] - live[uid]['rating']) > 1e-6 for uid in users)
+
+
+def test_batch_equals_sequential():
+    results = [(1, 2), (2, 3), (1, 3), (3, 1), (2, 1)]
+    with tempfile.TemporaryDirectory() as tmp:
+        batched = GameDatabase(os.path.join(tmp, 'a.db'))
+        sequential = GameDatabase(os.path.join(tmp, 'b.db'))
+        ratings = batched.apply_pvp_results(results)
+        for winner, loser in results:
+            sequential.update_pvp_ratings_after_match(winner, loser)
+        for uid in (1, 2, 3):
+            assert abs(sequential.get_pvp_profile(uid)['rating'] - ratings[uid]) < 1e-9
+            assert batched.get_pvp_profile(uid)['streak'] == sequential.get_pvp_profile(uid)['streak']
@@ -0,0 +1,33 @@
+"""
+Кэш клавиатур bot.py
+"""
+
+from bench_keyboards import run
+from loadtest import import_bot
+
+
+def test_static_keyboards_are_shared():
+    app = import_bot()
+    assert app.get_main_menu_keyboard(1) is app.get_main_menu_keyboard(2)
+    assert app.get_business_choice_keyboard() is app.BUSINESS_CHOICE_KEYBOARD
+    assert app.get_main_menu_keyboard() == app._build_main_menu_keyboard()
+    assert app.get_business_management_keyboard(7) is app.get_business_management_keyboard(7)
+    assert app.get_business_management_keyboard(7) != app.get_business_management_keyboard(8)
+
+
+def test_improvements_keyboard_cached_by_affordability():
+    app = import_bot()
+    cheapest = min(info['cost'] for info in app.IMPROVEMENTS.values())
+    poor = app.get_improvements_keyboard(3, 0)
+    assert app.get_improvements_keyboard(3, cheapest - 1) is poor
+    rich = app.get_improvements_keyboard(3, 10 ** 9)
+    assert rich is not poor
+    def texts(markup):
+        return [button.text for row in markup.inline_keyboard for button in row][:len(app.IMPROVEMENTS)]
+    assert not any('❌' in text for text in texts(rich))
+    assert all('❌' in text for text in texts(poor))
+
+
+def test_bench_keyboards_smoke():
+    results = run(number=5)
+    assert [name for name, _, _ in results] == ['main_menu', 'business_choice', 'business_management', 'improvements']
@@ -0,0 +1,31 @@
+"""
+Короткий прогон нагрузочного теста против настоящего router из bot.py
+"""
+
+import asyncio
+
+from loadtest import DEFAULT_MIX, format_report, parse_mix, percentile, run_load
+
+
+def test_parse_mix_and_percentile():
+    assert parse_mix('profile=3,rating') == {'profile': 3.0, 'rating': 1.0}
+    try:
+        parse_mix('unknown=1')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("неизвестное действие должно отклоняться")
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 0.5) == 0.5 and percentile(values, 0.99) == 0.99 and percentile([], 0.5) == 0.0
+
+
+def test_short_load_run():
+    result = asyncio.run(run_load(users=6, duration=1.0, think=0.05, seed=3))
+    assert result['updates'] > 0 and result['throughput'] > 0
+    assert set(result['actions']) <= set(DEFAULT_MIX)
+    assert result['latency']['p50'] <= result['latency']['p99'] <= result['latency']['max']
+    assert result['db']['commits'] > 0
+    # каждое нажатие заканчивается ответом бота
+    assert sum(result['api_calls'].values()) > 0
+    assert result['throttled_api_calls'] >= 0 and 'ждали лимита' in format_report(result)
+    assert 'Пропускная способность' in format_report(result)
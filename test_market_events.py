@@ -0,0 +1,59 @@
+"""
+Мировые рыночные события: бросок, кэш множителей, окончание, другие процессы
+"""
+
+import os
+import random
+import tempfile
+
+from database import GameDatabase
+from game_logic import GameLogic
+from market_events import DAY_SECONDS, MarketEventEngine, event_multipliers
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_market_event_multipliers_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        clock = Clock()
+        engine = MarketEventEngine(db, chance=1.0, clock=clock, rng=random.Random(1))
+        other = MarketEventEngine(db, clock=clock, refresh_interval=60.0)
+        logic = GameLogic(engine)
+        business = {'income': 1000, 'expenses': 400}
+        assert other.multipliers() == (1.0, 1.0)
+
+        event = engine.roll()
+        assert event is not None and engine.roll() is None
+        income, expense = engine.multipliers()
+        assert (income, expense) != (1.0, 1.0)
+        refreshes = engine.refreshes
+        for _ in range(1000):
+            logic.calculate_daily_income(business)
+            logic.calculate_daily_expenses(business)
+        assert engine.refreshes == refreshes
+        assert logic.calculate_daily_income(business) == GameLogic().calculate_daily_income(business) * income
+        assert logic.calculate_daily_expenses(business) == GameLogic().calculate_daily_expenses(business) * expense
+
+        # другой процесс узнает о событии после refresh_interval
+        assert other.multipliers() == (1.0, 1.0)
+        clock.now += 61
+        assert other.multipliers() == (income, expense)
+        assert other.next_roll_at() == event['expires_at']
+
+        clock.now = event['expires_at']
+        assert engine.multipliers() == (1.0, 1.0) and engine.current() is None
+        assert engine.next_roll_at() == clock.now + engine.roll_interval
+        assert event['expires_at'] - event['started_at'] in {d * DAY_SECONDS for d in (2, 3, 4, 5)}
+
+
+def test_event_effects():
+    assert event_multipliers({'effect': 'income_multiplier', 'value': 1.5}) == (1.5, 1.0)
+    assert event_multipliers({'effect': 'expense_multiplier', 'value': 1.3}) == (1.0, 1.3)
+    assert event_multipliers({'effect': 'all_multiplier', 'value': 1.2}) == (1.2, 1.2)
@@ -0,0 +1,113 @@
+"""
+Индекс подбора PvP-соперников против полного перебора
+"""
+
+import asyncio
+import os
+import tempfile
+
+from advanced_features import AdvancedGameFeatures
+from database import GameDatabase
+from matchmaking import MatchmakingIndex
+from worldgen import WorldSpec, generate_world
+
+power = AdvancedGameFeatures()._calculate_player_power
+
+
+def _brute_force(db: GameDatabase, user_id: int, k: int, now: float):
+    rows = db.get_pvp_candidates(limit=10 ** 9)
+    target = power(next(r for r in rows if r['user_id'] == user_id))
+    others = [r for r in rows if r['user_id'] != user_id and r['cooldown_until'] <= now]
+    return sorted(abs(power(r) - target) for r in others)[:k]
+
+
+def test_nearest_matches_brute_force_and_follows_updates():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'world.db')
+        generate_world(path, WorldSpec(1500, seed=11))
+        db = GameDatabase(path)
+        index = MatchmakingIndex(db, power, page_size=400)
+        index.rebuild()
+        assert len(index) == 1500
+
+        def distances(user_id):
+            target = index.power_of(user_id)
+            return sorted(abs(index.power_of(uid) - target) for uid in index.nearest(user_id, 6))
+
+        now = index.clock()
+        for user_id in (1, 700, 1500):
+            assert distances(user_id) == _brute_force(db, user_id, 6, now)
+
+        # изменения игроков подхватываются без полной перестройки
+        db.update_player_balance(700, 5_000_000, 'test')
+        db.apply_level_up(3, 40, 0, 0, 0)
+        neighbour = index.nearest(700, 1)[0]
+        db.ensure_pvp_profile(neighbour)
+        db.set_pvp_cooldown(neighbour, 60)
+        db.add_player(99999, 'new', 'New')
+        now = index.clock()
+        assert index.power_of(700) == power(db.get_player(700))
+        assert neighbour not in index.nearest(700, 6)
+        for user_id in (3, 700, 99999):
+            assert distances(user_id) == _brute_force(db, user_id, 6, now)
+        db.admin_delete_player(99999)
+        assert index.power_of(99999) is None and len(index) == 1500
+
+        players = index.nearest_players(700, 3)
+        assert [p['user_id'] for p in players] == index.nearest(700, 3) and 'power' in players[0]
+
+
+def test_other_process_changes_and_bulk_merge():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'world.db')
+        generate_world(path, WorldSpec(300, seed=5))
+        db = GameDatabase(path)
+        # отдельный экземпляр — как база другого воркера: событий индекс не получает
+        other = GameDatabase(path)
+        index = MatchmakingIndex(db, power, merge_threshold=4)
+        index.rebuild()
+        assert len(index) == 300
+
+        other.add_player(77777, 'elsewhere', 'Elsewhere')
+        other.update_player_balance(10, 9_000_000, 'test')
+        assert index.power_of(77777) is None
+        asyncio.run(index.refresh())
+        assert index.power_of(77777) is not None and index.power_of(10) == power(db.get_player(10))
+
+        # больше merge_threshold отметок — слияние за один проход
+        for user_id in range(20, 40):
+            db.update_player_balance(user_id, user_id * 10_000, 'test')
+        now = index.clock()
+        assert len(index) == 301 and index._powers == sorted(index._powers)
+        for user_id in (20, 39, 77777):
+            target = index.power_of(user_id)
+            assert target == power(db.get_player(user_id))
+            found = sorted(abs(index.power_of(uid) - target) for uid in index.nearest(user_id, 5))
+            assert found == _brute_force(db, user_id, 5, now)
+
+
+def test_loaded_in_thread_on_start():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'world.db')
+        generate_world(path, WorldSpec(200, seed=3))
+        db = GameDatabase(path)
+        index = MatchmakingIndex(db, power, refresh_interval=0)
+        queries = []
+        candidates = db.get_pvp_candidates
+
+        def counted(*args, **kwargs):
+            queries.append(args)
+            return candidates(*args, **kwargs)
+
+        db.get_pvp_candidates = counted
+
+        async def scenario():
+            # до загрузки соперников нет, и таблица не читается в цикле событий
+            db.update_player_balance(5, 1000, 'test')
+            assert index.nearest(5, 3) == [] and not queries
+            await index.start()
+            assert len(index) == 200 and len(index.nearest(5, 3)) == 3
+            await index.close()
+
+        asyncio.run(scenario())
+        assert index.rebuilds == 1
@@ -0,0 +1,111 @@
+"""
+Проверка метрик обработчиков, БД и Telegram API
+"""
+
+import asyncio
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router, types
+
+from fake_telegram import FakeTelegramAPI, make_callback_update, make_message_update
+from metrics import REGISTRY, Histogram, MetricsRegistry, perf_summary, setup_metrics, timed_methods
+from test_webhook import _serve
+from webhook import build_webhook_app
+
+TOKEN = '42:TEST'
+
+
+def test_histogram_quantiles():
+    hist = Histogram(buckets=(0.01, 0.1, 1.0))
+    for _ in range(90):
+        hist.observe(0.005)
+    for _ in range(10):
+        hist.observe(0.5)
+    assert hist.count == 100 and abs(hist.sum - 5.45) < 1e-9
+    assert hist.quantile(0.5) <= 0.01
+    assert 0.1 < hist.quantile(0.99) <= 0.5
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_handler_db_and_api_timings():
+    registry = MetricsRegistry()
+
+    @timed_methods(registry=registry)
+    class SlowDatabase:
+        def get_player(self, user_id):
+            return self.get_rating(user_id)
+
+        def get_rating(self, user_id):
+            # вложенный вызов не должен учитываться дважды
+            sum(range(20000))
+            return user_id
+
+    slow_db = SlowDatabase()
+    router = Router()
+
+    @router.callback_query()
+    async def show_rating(callback: types.CallbackQuery):
+        slow_db.get_player(callback.from_user.id)
+        await callback.answer()
+
+    @router.message()
+    async def broken(message: types.Message):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        async with FakeTelegramAPI(latency=0.01) as api:
+            bot = Bot(TOKEN, session=api.session())
+            dp = Dispatcher()
+            dp.include_router(router)
+            setup_metrics(dp, bot, registry=registry)
+            for i in range(3):
+                await dp.feed_raw_update(bot, make_callback_update(i + 1, 100, 'rating'))
+            try:
+                await dp.feed_raw_update(bot, make_message_update(10, 100, 'x'))
+            except RuntimeError:
+                pass
+            await bot.session.close()
+
+    asyncio.run(scenario())
+
+    handler = registry.histogram('bot_handler_seconds', handler='show_rating')
+    assert handler.count == 3
+    db_total = registry.value('bot_handler_db_seconds_total', handler='show_rating')
+    api_total = registry.value('bot_handler_api_seconds_total', handler='show_rating')
+    assert 0 < db_total < handler.sum and api_total >= 0.03
+    assert db_total + api_total <= handler.sum
+    assert db_total <= registry.histogram('db_method_seconds', method='get_player').sum + 1e-9
+    assert registry.histogram('db_method_seconds', method='get_rating').count == 3
+    assert registry.histogram('telegram_api_seconds', method='AnswerCallbackQuery').count == 3
+    assert registry.value('bot_handler_errors_total', handler='broken', error='RuntimeError') == 1
+    assert registry.value('bot_update_errors_total', event_type='message') == 1
+    assert registry.value('bot_updates_in_flight') == 0
+
+    text = registry.render()
+    assert '# TYPE bot_handler_seconds histogram' in text
+    assert 'bot_handler_seconds_bucket{handler="show_rating",le="+Inf"} 3' in text
+    assert 'bot_handler_seconds_count{handler="show_rating"} 3' in text
+    summary = perf_summary(registry=registry)
+    assert 'show_rating: n=3' in summary and 'get_player' in summary
+
+
+def test_metrics_endpoint():
+    REGISTRY.inc('test_scrapes_total', help_text='Проверочный счетчик')
+
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            runner, base = await _serve(build_webhook_app(Dispatcher(), bot, metrics_path='/metrics'))
+            try:
+                async with aiohttp.ClientSession() as client:
+                    async with client.get(f"{base}/metrics") as resp:
+                        assert resp.status == 200
+                        assert resp.content_type == 'text/plain'
+                        text = await resp.text()
+                        assert '# TYPE test_scrapes_total counter' in text
+                        assert 'test_scrapes_total 1.0' in text
+            finally:
+                await runner.cleanup()
+                await bot.session.close()
+
+    asyncio.run(scenario())
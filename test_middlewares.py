@@ -0,0 +1,76 @@
+"""
+Проверка последовательной обработки обновлений одного игрока
+"""
+
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router, types
+
+from fake_telegram import FakeTelegramAPI, make_callback_update
+from middlewares import UserSerializationMiddleware
+
+TOKEN = '42:TEST'
+
+
+def _dispatcher(middleware: UserSerializationMiddleware, log: list, delay: float = 0.05) -> Dispatcher:
+    router = Router()
+    active = {}
+
+    @router.callback_query()
+    async def on_callback(callback: types.CallbackQuery):
+        user_id = callback.from_user.id
+        active[user_id] = active.get(user_id, 0) + 1
+        log.append(('start', user_id, callback.data, active[user_id], sum(active.values())))
+        await asyncio.sleep(delay)
+        active[user_id] -= 1
+        await callback.answer()
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(middleware)
+    dp.include_router(router)
+    return dp
+
+
+def test_same_user_serialized_other_users_concurrent():
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            middleware, log = UserSerializationMiddleware(), []
+            dp = _dispatcher(middleware, log)
+            updates = [make_callback_update(1, 1, 'a'), make_callback_update(2, 1, 'b'),
+                       make_callback_update(3, 2, 'a'), make_callback_update(4, 3, 'a')]
+            await asyncio.gather(*(dp.feed_raw_update(bot, u) for u in updates))
+            await bot.session.close()
+        # у одного игрока никогда не выполняется больше одного обработчика
+        assert all(per_user == 1 for _, _, _, per_user, _ in log)
+        # разные игроки обрабатываются одновременно
+        assert max(total for *_, total in log) >= 3
+        # второе нажатие игрока 1 дождалось первого
+        assert [data for _, user, data, _, _ in log if user == 1] == ['a', 'b']
+        stats = middleware.stats()
+        assert stats['processed'] == 4 and stats['queue_depth'] == 0 and stats['active_users'] == 0
+        assert stats['max_queue_depth'] == 1 and stats['wait_max'] > 0
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_and_overflow_dropped():
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            middleware, log = UserSerializationMiddleware(max_pending=3), []
+            dp = _dispatcher(middleware, log)
+            updates = [make_callback_update(1, 7, 'daily_income'), make_callback_update(2, 7, 'daily_income'),
+                       make_callback_update(3, 7, 'profile'), make_callback_update(4, 7, 'rating'),
+                       make_callback_update(5, 7, 'loans')]
+            await asyncio.gather(*(dp.feed_raw_update(bot, u) for u in updates))
+            # после завершения та же кнопка снова принимается
+            await dp.feed_raw_update(bot, make_callback_update(6, 7, 'daily_income'))
+            answers = [call.get('text') for call in api.calls_of('answerCallbackQuery')]
+            await bot.session.close()
+        assert [data for _, _, data, _, _ in log] == ['daily_income', 'profile', 'rating', 'daily_income']
+        assert middleware.dropped == {'duplicate': 1, 'overflow': 1}
+        # отброшенные нажатия тоже получают ответ, чтобы кнопка не "висела"
+        assert answers.count(middleware.busy_text) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+"""
+Уведомления о готовности: одно сообщение на строку, кнопка «Забрать», перенос пачки
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram import Bot
+
+from database import GameDatabase
+from fake_telegram import FakeTelegramAPI
+from notifier import ReadyNotifier
+from scheduler import JobScheduler
+
+
+def test_ready_notifications_sent_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        db.add_player(1, 'p1', 'P1')
+        db.add_player(2, 'p2', 'P2')
+        business_id = db.add_business(1, 'farm', 'Ферма', 1000, 500)
+        past = (datetime.now() - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+        ready = db.create_production(business_id, 'FARM', 'Урожай', 1, past, 200, meta={})
+        collected = db.create_production(business_id, 'FARM', 'Посев', 1, past, 100, meta={})
+        db.collect_production(collected, 1)
+        investment = db.create_investment(2, None, 'balanced', 20000, 2400, past)
+        # создана до уведомлений: задачу поставит backfill
+        forgotten = db.create_production(business_id, 'FARM', 'Старый урожай', 1, past, 50, meta={})
+
+        async def scenario():
+            async with FakeTelegramAPI() as api:
+                bot = Bot('42:TEST', session=api.session())
+                scheduler = JobScheduler(db)
+                notifier = ReadyNotifier(db, scheduler, bot, max_batch=2, retry_after=0.05)
+                notifier.production_started(ready, past)
+                notifier.production_started(ready, past)
+                notifier.production_started(collected, past)
+                notifier.investment_created(investment, past)
+                assert notifier.backfill() == 1
+                await scheduler.start()
+                for _ in range(200):
+                    if notifier.sent == 3 and not db.get_job_counts():
+                        break
+                    await asyncio.sleep(0.02)
+                # повторная задача по уже уведомленной строке ничего не отправляет
+                notifier.production_started(ready, past)
+                await asyncio.sleep(0.2)
+                await scheduler.close()
+                await bot.session.close()
+                return api.calls_of('sendMessage'), notifier
+
+        calls, notifier = asyncio.run(scenario())
+        assert notifier.sent == 3 and notifier.skipped == 2 and notifier.postponed >= 1
+        assert sorted(int(call['chat_id']) for call in calls) == [1, 1, 2]
+        markups = ' '.join(str(call['reply_markup']) for call in calls)
+        for callback_data in (f'prod_collect_{ready}', f'prod_collect_{forgotten}', f'inv_claim_{investment}'):
+            assert callback_data in markups
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT status, notified FROM investments').fetchall() == [('matured', 1)]
+        assert conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] == 0
+        conn.close()
+        assert db.claim_investment(2, investment) is not None
+
+
+def test_busy_claim_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        db.add_player(1, 'p1', 'P1')
+        past = (datetime.now() - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+        investment = db.create_investment(1, None, 'balanced', 20000, 2400, past)
+        # настоящая блокировка записи: ошибка не превращается в пустой ответ
+        writer = sqlite3.connect(path)
+        writer.execute('BEGIN IMMEDIATE')
+        connect = db._connect
+        db._connect = lambda: sqlite3.connect(path, timeout=0.01)
+        with pytest.raises(sqlite3.OperationalError):
+            db.claim_ready_notifications([], [investment])
+        writer.rollback()
+        writer.close()
+        db._connect = connect
+
+        claim, locked = db.claim_ready_notifications, [1]
+
+        def claim_once_locked(*args):
+            # другой воркер держит запись: пачка не должна считаться уже уведомленной
+            if locked:
+                locked.pop()
+                raise sqlite3.OperationalError('database is locked')
+            return claim(*args)
+
+        db.claim_ready_notifications = claim_once_locked
+
+        async def scenario():
+            async with FakeTelegramAPI() as api:
+                bot = Bot('42:TEST', session=api.session())
+                scheduler = JobScheduler(db, retry_delay=0.05)
+                notifier = ReadyNotifier(db, scheduler, bot)
+                notifier.investment_created(investment, past)
+                await scheduler.start()
+                for _ in range(200):
+                    if notifier.sent and not db.get_job_counts():
+                        break
+                    await asyncio.sleep(0.02)
+                await scheduler.close()
+                await bot.session.close()
+                return api.calls_of('sendMessage'), notifier, scheduler
+
+        calls, notifier, scheduler = asyncio.run(scenario())
+        assert not locked and len(calls) == 1
+        assert notifier.sent == 1 and notifier.skipped == 0 and scheduler.retried == 1
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT status, notified FROM investments').fetchall() == [('matured', 1)]
+        conn.close()
+
+
+def test_due_investment_before_notification():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        db.add_player(1, 'p1', 'P1')
+        past = (datetime.now() - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+        future = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        due = db.create_investment(1, None, 'balanced', 20000, 2400, past)
+        early = db.create_investment(1, None, 'balanced', 10000, 1200, future)
+        # задача уведомления еще не сработала: статус active, но срок наступил
+        investments = {i['id']: i for i in db.get_investments(1)}
+        assert investments[due]['status'] == 'active' and investments[due]['due']
+        assert not investments[early]['due']
+        assert db.withdraw_investment(1, due) == (20000, 'matured')
+        assert db.withdraw_investment(1, early) == (9500, 'active')
@@ -0,0 +1,146 @@
+"""
+Пропуск правок сообщений без изменений
+"""
+
+import asyncio
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from fake_telegram import FakeTelegramAPI, make_callback_update
+from loadtest import import_bot
+from outbound import EditDedupMiddleware, EditDigestCache, OutboundLimiter
+
+TOKEN = '42:TEST'
+
+
+def test_identical_edit_skipped_and_callback_answered():
+    # bot.py, как в loadtest.py: middleware сессии ставит bot.setup_session
+    app = import_bot()
+
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            app.setup_session(bot.session)
+            skipped, sent = app.edit_dedup.skipped, app.outbound_limiter.sent
+            # справка правит сообщение и сама на callback не отвечает
+            for update_id in range(1, 4):
+                await app.dp.feed_raw_update(bot, make_callback_update(update_id, 8801, 'help'))
+            await bot.session.close()
+            return api, app.edit_dedup.skipped - skipped, app.outbound_limiter.sent - sent
+
+    api, skipped, sent = asyncio.run(scenario())
+    assert api.counts['editMessageText'] == 1 and skipped == 2
+    # пропущенная правка не доходит до лимитера
+    assert sent == 1
+    # ответ за пропущенные правки, раз обработчик не ответил сам
+    assert [a['callback_query_id'] for a in api.calls_of('answerCallbackQuery')] == ['2', '3']
+
+
+def test_not_modified_error_absorbed():
+    app = import_bot()
+
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            # сообщение отрисовано до запуска процесса: в кэше дайджеста его нет
+            plain = Bot(TOKEN, session=api.session())
+            await app.dp.feed_raw_update(plain, make_callback_update(1, 8802, 'help'))
+            await plain.session.close()
+            bot = Bot(TOKEN, session=api.session())
+            app.setup_session(bot.session)
+            not_modified = app.edit_dedup.not_modified
+            await app.dp.feed_raw_update(bot, make_callback_update(2, 8802, 'help'))
+            await bot.session.close()
+            return api, app.edit_dedup.not_modified - not_modified
+
+    api, not_modified = asyncio.run(scenario())
+    # исключение не дошло до обработчика, на callback ответили
+    assert not_modified == 1
+    assert [a['callback_query_id'] for a in api.calls_of('answerCallbackQuery')] == ['2']
+
+
+def test_cache_is_bounded():
+    cache = EditDigestCache(max_size=2)
+    for message_id in range(3):
+        cache.put((1, message_id), b'x')
+    assert len(cache) == 2 and cache.get((1, 0)) is None and cache.get((1, 2)) == b'x'
+
+
+# ------------------- Ограничение частоты -------------------
+def _edit(bot: Bot, message_id: int, text: str, chat_id: int = 1):
+    return bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id)
+
+
+def test_limiter_keeps_under_fake_api_limits():
+    async def scenario():
+        async with FakeTelegramAPI(chat_limit=20, global_limit=40) as api:
+            unlimited = Bot(TOKEN, session=api.session())
+            results = await asyncio.gather(*(_edit(unlimited, i, 'x') for i in range(30)), return_exceptions=True)
+            await unlimited.session.close()
+            # без ограничителя часть запросов получает 429
+            assert any(isinstance(r, TelegramRetryAfter) for r in results)
+
+            api.rejected.clear()
+            await asyncio.sleep(1.0)
+            bot = Bot(TOKEN, session=api.session())
+            limiter = OutboundLimiter(global_rate=30, chat_rate=10, chat_burst=5)
+            bot.session.middleware(limiter)
+            await asyncio.gather(*(_edit(bot, 100 + i, 'x', chat_id=1 + i % 2) for i in range(30)))
+            await bot.session.close()
+        assert not api.rejected and limiter.sent == 30
+        assert limiter.throttled > 0 and limiter.retries == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_is_handled():
+    async def scenario():
+        async with FakeTelegramAPI(chat_limit=2, retry_after=1) as api:
+            bot = Bot(TOKEN, session=api.session())
+            # лимит ограничителя выше, чем у API: лишние запросы получат 429 и повторятся
+            limiter = OutboundLimiter(global_rate=0, chat_rate=0)
+            bot.session.middleware(limiter)
+            await asyncio.gather(*(_edit(bot, i, 'x') for i in range(4)))
+            await bot.session.close()
+        assert api.rejected['editMessageText'] == 2
+        assert limiter.retries == 2 and limiter.sent == 4
+
+    asyncio.run(scenario())
+
+
+def test_pending_edits_coalesced():
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            limiter = OutboundLimiter(chat_rate=5, chat_burst=1)
+            bot.session.middleware(limiter)
+            await _edit(bot, 1, 'v0')
+            # токен израсходован: три правки ждут очереди и сливаются в последнюю
+            results = await asyncio.gather(*(_edit(bot, 1, f'v{i}') for i in range(1, 4)))
+            await bot.session.close()
+        edits = api.calls_of('editMessageText')
+        assert [e['text'] for e in edits] == ['v0', 'v3']
+        assert all(r.text == 'v3' for r in results) and limiter.coalesced == 2
+
+    asyncio.run(scenario())
+
+
+def test_group_edits_not_deduplicated():
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            cache = EditDigestCache()
+            bot.session.middleware(EditDedupMiddleware(cache))
+            # в группе сообщение могут править разные воркеры: дайджест этого процесса не доказательство
+            await _edit(bot, 5, 'x', chat_id=-100)
+            try:
+                await _edit(bot, 5, 'x', chat_id=-100)
+            except TelegramBadRequest:
+                pass
+            await _edit(bot, 5, 'x', chat_id=9)
+            await _edit(bot, 5, 'x', chat_id=9)
+            await bot.session.close()
+        return api, cache
+
+    api, cache = asyncio.run(scenario())
+    assert api.counts['editMessageText'] == 3 and cache.skipped == 1 and len(cache) == 1
@@ -0,0 +1,54 @@
+"""
+Итоги зарплат и численности в businesses / players
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from database import GameDatabase
+
+
+def test_totals_follow_hire_fire_and_sale():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        db.add_player(1, 'p1', 'P1')
+        first = db.add_business(1, 'coffee_shop', 'A', 1000, 500)
+        second = db.add_business(1, 'farm', 'B', 1000, 500)
+        staff = [db.add_employee(first, f'e{i}', 'Бариста', 1000.0 * (i + 1)) for i in range(3)]
+        db.add_employee(second, 'f', 'Рабочий', 500.0)
+        assert db.get_total_employees_salary(1) == 6500
+        assert db.get_business_payroll(first) == {'payroll_total': 6000, 'headcount': 3}
+
+        assert db.delete_employee(staff[2])
+        assert not db.delete_employee(staff[2])
+        assert db.get_business_payroll(first) == {'payroll_total': 3000, 'headcount': 2}
+        assert [e['full_name'] for e in db.get_business_employees(first, limit=1)] == ['e1']
+
+        db.sell_business(1, first)
+        assert db.get_total_employees_salary(1) == 500
+        assert db.check_payroll_totals() == {'businesses': 0, 'players': 0}
+
+
+def test_checker_repairs_drift_and_migration_backfills():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        db.add_player(1, 'p1', 'P1')
+        business = db.add_business(1, 'coffee_shop', 'A', 1000, 500)
+        conn = sqlite3.connect(path)
+        # сотрудник добавлен в обход add_employee
+        conn.execute("INSERT INTO employees (business_id, full_name, salary) VALUES (?, 'x', 700)", (business,))
+        conn.commit()
+        assert db.check_payroll_totals() == {'businesses': 1, 'players': 1}
+        assert db.get_total_employees_salary(1) == 700
+
+        # база без колонок итогов: миграция заполняет их из employees
+        for table in ('businesses', 'players'):
+            conn.execute(f'ALTER TABLE {table} DROP COLUMN payroll_total')
+            conn.execute(f'ALTER TABLE {table} DROP COLUMN headcount')
+        conn.commit()
+        conn.close()
+        db = GameDatabase(path)
+        assert db.get_business_payroll(business) == {'payroll_total': 700, 'headcount': 1}
+        assert db.get_total_employees_salary(1) == 700
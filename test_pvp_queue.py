@@ -0,0 +1,78 @@
+"""
+Пакетное разрешение PvP-вызовов
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+
+from advanced_features import AdvancedGameFeatures
+from database import GameDatabase
+from pvp_queue import PvPQueue
+
+
+def test_challenges_resolved_in_one_batch():
+    random.seed(4)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        for uid in range(1, 11):
+            db.add_player(uid, f'p{uid}', f'P{uid}')
+        queue = PvPQueue(db, AdvancedGameFeatures(), max_delay=0.05)
+
+        async def scenario():
+            challenges = [(uid, uid + 5) for uid in range(1, 6)] + [(1, 2), (6, 404)]
+            results = await asyncio.gather(*(queue.submit(c, o) for c, o in challenges))
+            # после кулдауна пачки повторный вызов отклоняется
+            again = await queue.submit(2, 3)
+            await queue.close()
+            return results, again
+
+        results, again = asyncio.run(scenario())
+        assert [r['status'] for r in results] == ['done'] * 5 + ['cooldown', 'unavailable']
+        assert again['status'] == 'cooldown' and 0 < again['remaining'] <= 30
+        assert queue.batches == 2 and queue.fights == 5 and queue.max_batch_seen == 7
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT COUNT(*) FROM pvp_matches').fetchone()[0] == 5
+        # ставки только переходят между игроками
+        assert conn.execute('SELECT SUM(balance) FROM players').fetchone()[0] == 10 * 10000
+        decided = [r for r in results if r.get('outcome') in ('win', 'loss')]
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE type LIKE 'pvp_%'").fetchone()[0] == 2 * len(decided)
+        wins, losses = conn.execute('SELECT SUM(wins), SUM(losses) FROM pvp_profiles').fetchone()
+        assert wins == losses == len(decided)
+        assert db.pvp_cooldown_remaining(1) > 0 and db.pvp_cooldown_remaining(6) == 0
+
+
+def test_busy_database_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        for uid in range(1, 5):
+            db.add_player(uid, f'p{uid}', f'P{uid}')
+        queue = PvPQueue(db, AdvancedGameFeatures(), busy_retries=2, busy_delay=0.01)
+        apply_batch, locked = db.apply_pvp_batch, [1]
+
+        def flaky_apply(*args, **kwargs):
+            # первая попытка — как при записи другим процессом дольше timeout
+            if locked:
+                locked.pop()
+                raise sqlite3.OperationalError('database is locked')
+            return apply_batch(*args, **kwargs)
+
+        def always_locked(*args, **kwargs):
+            raise sqlite3.OperationalError('database is locked')
+
+        db.apply_pvp_batch = flaky_apply
+
+        async def scenario():
+            first = await queue.submit(1, 2)
+            db.apply_pvp_batch = always_locked
+            second = await queue.submit(3, 4)
+            await queue.close()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first['status'] == 'done' and second['status'] == 'busy'
+        assert queue.busy == 4 and queue.fights == 1
@@ -0,0 +1,72 @@
+"""
+Проверка профилировщика SQL-запросов
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+
+import aiosqlite
+
+from database import GameDatabase
+from query_profiler import PROFILER, ProfiledConnection, QueryProfiler, fingerprint
+
+
+def test_fingerprint_normalizes_literals():
+    assert fingerprint("SELECT * FROM players WHERE user_id = 42") == "SELECT * FROM players WHERE user_id = ?"
+    assert fingerprint("SELECT  *\n FROM t WHERE name = 'O''Brien' -- comment\n AND x IN (1, 2, 3);") == \
+        "SELECT * FROM t WHERE name = ? AND x IN (?+)"
+    assert fingerprint("SELECT level2 FROM t2 LIMIT ?") == "SELECT level2 FROM t2 LIMIT ?"
+
+
+def test_top_and_p99():
+    profiler = QueryProfiler(slow_threshold=10)
+    for _ in range(99):
+        profiler.record("SELECT 1", 0.001)
+    profiler.record("SELECT 1", 0.5)
+    for _ in range(10):
+        profiler.record("SELECT * FROM big", 0.02)
+    assert [s.fingerprint for s in profiler.top(2, 'total')] == ["SELECT ?", "SELECT * FROM big"]
+    assert profiler.top(1, 'p99')[0].fingerprint == "SELECT * FROM big"
+    assert profiler.top(1, 'count')[0].count == 100
+    assert "SELECT * FROM big" in profiler.report()
+
+
+def test_game_database_queries_profiled_with_slow_plan(caplog):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, 'game.db'))
+        PROFILER.reset()
+        threshold = PROFILER.slow_threshold
+        PROFILER.slow_threshold = 0
+        try:
+            with caplog.at_level(logging.WARNING, logger='query_profiler'):
+                db.add_player(1, 'u1', 'U1')
+                db.add_player(2, 'u2', 'U2')
+                db.get_player(1)
+                db.get_player(2)
+        finally:
+            PROFILER.slow_threshold = threshold
+        stats = {s.fingerprint: s for s in PROFILER.top(50)}
+        select = next(s for fp, s in stats.items() if fp.startswith("SELECT * FROM players WHERE user_id"))
+        assert select.count == 2
+        assert 'players' in select.plan
+        assert any('План' in record.message for record in caplog.records)
+
+
+def test_aiosqlite_connection_profiled():
+    async def scenario(path):
+        conn = await aiosqlite.connect(path, factory=ProfiledConnection)
+        await conn.execute("CREATE TABLE kv_store (key TEXT PRIMARY KEY, value TEXT)")
+        await conn.execute("INSERT INTO kv_store VALUES ('a', 'b')")
+        async with conn.execute("SELECT value FROM kv_store WHERE key = 'a'") as cur:
+            assert await cur.fetchall() == [('b',)]
+        await conn.close()
+
+    PROFILER.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(os.path.join(tmp, 'kv.db')))
+    fingerprints = [s.fingerprint for s in PROFILER.top(10)]
+    assert "SELECT value FROM kv_store WHERE key = ?" in fingerprints
+    assert isinstance(sqlite3.connect(':memory:', factory=ProfiledConnection), ProfiledConnection)
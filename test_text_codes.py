@@ -0,0 +1,58 @@
+"""
+Словарное кодирование имен посетителей и текстов отзывов
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from database import GameDatabase
+
+
+def test_reviews_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        db = GameDatabase(path)
+        db.add_review(1, 'Иванов Мария Сергеевна', 5, 'Замечательное место, 5 звезд! Приду еще.')
+        db.add_review(1, 'Гость', 2, 'Свой текст без шаблона')
+        db.add_review(1, None, 3, 'Неплохо, но есть куда расти.')
+        db.add_visitor(1, 'Петров Иван Иванович', 500.0, 4)
+        reviews = db.get_business_reviews(1)
+        assert [(r['visitor_name'], r['text']) for r in reversed(reviews)] == [
+            ('Иванов Мария Сергеевна', 'Замечательное место, 5 звезд! Приду еще.'),
+            ('Гость', 'Свой текст без шаблона'),
+            (None, 'Неплохо, но есть куда расти.'),
+        ]
+        # новые строки словаря видны другому экземпляру (процессу)
+        assert GameDatabase(path).get_business_reviews(1, limit=3)[1]['text'] == 'Свой текст без шаблона'
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT typeof(template_id), typeof(name_first) FROM reviews LIMIT 1').fetchone() == \
+            ('integer', 'integer')
+        assert conn.execute('SELECT name_last, name_first FROM visitors').fetchone()[1] is not None
+
+
+def test_migration_encodes_existing_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE reviews (id INTEGER PRIMARY KEY AUTOINCREMENT, business_id INTEGER NOT NULL, '
+                     'visitor_name TEXT, rating INTEGER NOT NULL, text TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+        conn.execute('CREATE TABLE visitors (id INTEGER PRIMARY KEY AUTOINCREMENT, business_id INTEGER NOT NULL, '
+                     'visitor_name TEXT, spent REAL DEFAULT 0, rating INTEGER, reviewed INTEGER DEFAULT 0, '
+                     'visited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+        rows = [(7, f'Смирнов Анна Ивановна', 1 + i % 5, 'Качество не соответствует цене. Возможно, вернусь.')
+                for i in range(25)]
+        conn.executemany('INSERT INTO reviews (business_id, visitor_name, rating, text) VALUES (?, ?, ?, ?)', rows)
+        conn.executemany('INSERT INTO visitors (business_id, visitor_name, spent) VALUES (?, ?, ?)',
+                         [(7, 'Волков Никита Никитич', 100.0)] * 30)
+        conn.commit()
+        conn.close()
+
+        db = GameDatabase(path)
+        reviews = db.get_business_reviews(7, limit=100)
+        assert len(reviews) == 25 and reviews[0]['id'] == 25
+        assert {(r['visitor_name'], r['text']) for r in reviews} == {(rows[0][1], rows[0][3])}
+        conn = sqlite3.connect(path)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info('visitors')")}
+        assert 'visitor_name' not in columns and 'name_middle' in columns
+        assert conn.execute('SELECT COUNT(*), SUM(spent) FROM visitors').fetchone() == (30, 3000.0)
@@ -0,0 +1,42 @@
+"""
+Пакетная симуляция посетителей
+"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from advanced_features import AdvancedGameFeatures, SPEND_RANGES
+from visitor_sim import VisitorSimulator
+
+
+def test_batch_matches_per_business_distribution():
+    simulator = VisitorSimulator(seed=3)
+    types = ['farm', 'factory', 'unknown'] * 4000
+    batch = simulator.simulate(simulator.encode_types(types), np.full(len(types), 1.3))
+    assert batch.counts.min() >= 1 and batch.counts.max() <= 10
+    assert int(batch.offsets[-1]) == len(batch) == batch.counts.sum()
+    farm = batch.spent[batch.business_index % 3 == 0]
+    assert farm.min() >= SPEND_RANGES['farm'][0] and farm.max() <= SPEND_RANGES['farm'][1]
+    unknown = batch.spent[batch.business_index % 3 == 2]
+    assert unknown.min() >= 300 and unknown.max() <= 1500
+    assert abs(batch.spent_per_business().sum() - batch.spent.sum()) < 1e-6
+    assert 0.35 < (batch.rating > 0).mean() < 0.45
+
+    random.seed(3)
+    features = AdvancedGameFeatures()
+    looped = [len(features.simulate_visitors({'business_type': 'farm', 'popularity': 1.3})) for _ in range(4000)]
+    assert abs(np.mean(looped) - batch.counts.mean()) < 0.15
+
+
+def test_materialize_only_requested_rows():
+    simulator = VisitorSimulator(seed=5)
+    batch = simulator.simulate_businesses([{'business_type': 'restaurant', 'popularity': 3.0}, {'business_type': 'farm'}])
+    shown = batch.materialize(0, limit=2)
+    assert len(shown) == min(2, batch.counts[0])
+    for visitor, spent, rating in zip(shown, batch.spent, batch.rating):
+        assert visitor['spent'] == spent and len(visitor['name'].split()) == 3
+        assert (visitor['review'] or {}).get('rating', 0) == rating
+    assert batch.reviews_per_business().sum() == (batch.rating > 0).sum()
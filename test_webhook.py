@@ -0,0 +1,151 @@
+"""
+Проверка webhook-режима и long polling против локального фейкового Bot API
+"""
+
+import asyncio
+import socket
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router, types
+from aiohttp import web
+
+from fake_telegram import FakeTelegramAPI, make_callback_update, make_message_update
+from webhook import build_webhook_app, run_bot
+
+TOKEN = '42:TEST'
+SECRET = 'test-secret'
+
+
+def _echo_dispatcher(received: list) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: types.Message):
+        received.append(message.text)
+        await message.answer(f"echo: {message.text}")
+
+    @router.callback_query()
+    async def on_callback(callback: types.CallbackQuery):
+        received.append(callback.data)
+        await callback.answer()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def _serve(app: web.Application):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+async def _wait_for(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("условие не выполнено за отведенное время")
+        await asyncio.sleep(0.01)
+
+
+def test_webhook_health_and_secret():
+    """Health-эндпоинт отвечает, запрос без секрета отклоняется, с секретом — доходит до обработчика"""
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            received = []
+            app = build_webhook_app(_echo_dispatcher(received), bot, path='/hook', secret=SECRET,
+                                    base_url='https://example.test')
+            runner, base = await _serve(app)
+            try:
+                async with aiohttp.ClientSession() as client:
+                    async with client.get(f"{base}/health") as resp:
+                        assert resp.status == 200
+                        assert (await resp.json())['status'] == 'ok'
+
+                    update = make_message_update(1, 777, 'привет')
+                    async with client.post(f"{base}/hook", json=update) as resp:
+                        assert resp.status == 401
+                    async with client.post(f"{base}/hook", json=update,
+                                           headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}) as resp:
+                        assert resp.status == 200
+
+                await _wait_for(lambda: api.counts['sendMessage'] == 1)
+                assert received == ['привет']
+                assert api.calls_of('sendMessage')[0]['text'] == 'echo: привет'
+                # webhook зарегистрирован при старте приложения с секретом
+                assert api.webhook['url'] == 'https://example.test/hook'
+                assert api.webhook['secret_token'] == SECRET
+            finally:
+                await runner.cleanup()
+                await bot.session.close()
+
+    asyncio.run(scenario())
+
+
+def test_polling_processes_updates():
+    """Long polling забирает обновления через getUpdates фейкового API"""
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            received = []
+            dp = _echo_dispatcher(received)
+            for i in range(5):
+                api.push_update(make_callback_update(i + 1, 500 + i, f"btn_{i}"))
+            polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+            try:
+                await _wait_for(lambda: len(received) == 5)
+            finally:
+                await dp.stop_polling()
+                await polling
+                await bot.session.close()
+            assert sorted(received) == [f"btn_{i}" for i in range(5)]
+            assert api.counts['answerCallbackQuery'] == 5
+
+    asyncio.run(scenario())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_polling_metrics_on_local_port():
+    """В режиме polling метрики отдает сервер на metrics_host:metrics_port; порт webhook не занимается"""
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            bot = Bot(TOKEN, session=api.session())
+            dp = _echo_dispatcher([])
+            webapp_port, metrics_port = _free_port(), _free_port()
+            polling = asyncio.create_task(run_bot(dp, bot, mode='polling', host='0.0.0.0', port=webapp_port,
+                                                  path='/hook', metrics_path='/metrics', metrics_port=metrics_port))
+            try:
+                async with aiohttp.ClientSession() as client:
+                    for _ in range(100):
+                        try:
+                            async with client.get(f"http://127.0.0.1:{metrics_port}/metrics") as resp:
+                                assert resp.status == 200
+                                break
+                        except aiohttp.ClientConnectionError:
+                            await asyncio.sleep(0.02)
+                    else:
+                        raise AssertionError("сервер метрик не поднялся")
+                    try:
+                        async with client.get(f"http://127.0.0.1:{webapp_port}/metrics"):
+                            raise AssertionError("порт webhook занят в режиме polling")
+                    except aiohttp.ClientConnectionError:
+                        pass
+            finally:
+                polling.cancel()
+                try:
+                    await polling
+                except asyncio.CancelledError:
+                    pass
+                # разбудить оборванный getUpdates, чтобы фейковый API остановился сразу
+                api.push_update(make_message_update(1, 777, 'стоп'))
+                await bot.session.close()
+
+    asyncio.run(scenario())
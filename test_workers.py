@@ -0,0 +1,190 @@
+"""
+Проверка общего FSM-хранилища и распределения обновлений по воркерам
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fake_telegram import FakeTelegramAPI, make_callback_update, make_message_update
+from fsm_storage import SQLiteStorage, create_storage, is_shared_storage
+from metrics import setup_metrics
+from test_webhook import _free_port
+from webhook import make_session
+from workers import _worker_loop, extract_user_id, partition_for
+
+
+def test_sqlite_storage_shared_between_instances():
+    """Состояние, записанное одним процессом, видно другому, открывшему тот же файл"""
+    async def scenario(path):
+        key = StorageKey(bot_id=42, chat_id=777, user_id=777)
+        first, second = SQLiteStorage(path), SQLiteStorage(path)
+        try:
+            await first.set_state(key, 'BusinessStates:naming')
+            await first.set_data(key, {'business_type': 'farm', 'имя': 'Ферма'})
+            assert await second.get_state(key) == 'BusinessStates:naming'
+            assert await second.get_data(key) == {'business_type': 'farm', 'имя': 'Ферма'}
+
+            await second.set_state(key, None)
+            assert await first.get_state(key) is None
+            assert await first.get_data(key) == {'business_type': 'farm', 'имя': 'Ферма'}
+            other = StorageKey(bot_id=42, chat_id=1, user_id=1)
+            assert await first.get_state(other) is None
+            assert await first.get_data(other) == {}
+        finally:
+            await first.close()
+            await second.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(os.path.join(tmp, 'fsm.db')))
+
+
+def test_sqlite_storage_does_not_block_loop():
+    """Пока другой процесс держит блокировку записи, цикл событий продолжает работать"""
+    async def scenario(path):
+        key = StorageKey(bot_id=42, chat_id=777, user_id=777)
+        storage = SQLiteStorage(path)
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute('BEGIN IMMEDIATE')
+        try:
+            write = asyncio.create_task(storage.set_state(key, 'BusinessStates:naming'))
+            ticks = 0
+            for _ in range(10):
+                await asyncio.sleep(0.02)
+                ticks += 1
+            assert ticks == 10 and not write.done()
+            blocker.execute('COMMIT')
+            await asyncio.wait_for(write, 5)
+            assert await storage.get_state(key) == 'BusinessStates:naming'
+        finally:
+            blocker.close()
+            await storage.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(os.path.join(tmp, 'fsm.db')))
+
+
+def test_create_storage_backends():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fsm.db')
+        storage = create_storage(f"sqlite:///{path}")
+        assert isinstance(storage, SQLiteStorage) and storage.db_path == path
+        assert is_shared_storage(storage)
+        asyncio.run(storage.close())
+
+    assert isinstance(create_storage('memory'), MemoryStorage)
+    assert not is_shared_storage(create_storage(''))
+    try:
+        create_storage('mongo://localhost')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("неизвестный бэкенд должен отклоняться")
+
+
+def test_partition_by_user():
+    message = make_message_update(1, 1001, '/start')
+    callback = make_callback_update(2, 1001, 'daily_income')
+    assert extract_user_id(message) == extract_user_id(callback) == 1001
+    # все обновления одного игрока попадают в один воркер
+    assert partition_for(message, 4) == partition_for(callback, 4) == 1001 % 4
+    assert partition_for({'update_id': 3}, 4) == 0
+    assert {partition_for(make_message_update(i, 2000 + i, 'x'), 4) for i in range(8)} == {0, 1, 2, 3}
+
+
+def _send_burst(url: str, count: int, results):
+    """Процесс-воркер: ограничитель собирается из config, как в bot.py"""
+    from config import OUTBOUND_CHAT_RATE, OUTBOUND_GLOBAL_RATE
+    from outbound import OutboundLimiter
+
+    async def run():
+        bot = Bot('42:TEST', session=make_session(url))
+        bot.session.middleware(OutboundLimiter(OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE))
+        started = time.perf_counter()
+        await asyncio.gather(*(bot.send_message(1000 + i, 'x') for i in range(count)))
+        await bot.session.close()
+        return time.perf_counter() - started
+
+    results.put(asyncio.run(run()))
+
+
+def test_global_rate_split_between_processes():
+    """Два процесса с общим лимитом 20 сообщений/с шлют по 20 сообщений: каждый укладывается в 10/с"""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    saved = {name: os.environ.get(name) for name in ('BOT_WORKERS', 'OUTBOUND_GLOBAL_RATE', 'OUTBOUND_CHAT_RATE')}
+    # так окружение воркеров задает WorkerPool.start
+    os.environ.update(BOT_WORKERS='2', OUTBOUND_GLOBAL_RATE='20', OUTBOUND_CHAT_RATE='0')
+
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            processes = [ctx.Process(target=_send_burst, args=(api.url, 20, results)) for _ in range(2)]
+            for process in processes:
+                process.start()
+            loop = asyncio.get_running_loop()
+            for process in processes:
+                await loop.run_in_executor(None, process.join, 60)
+            return api.counts['sendMessage']
+
+    try:
+        sent = asyncio.run(scenario())
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    elapsed = [results.get(timeout=5) for _ in range(2)]
+    # запас в 10 токенов уходит сразу, остальные 10 — со скоростью 10/с
+    assert sent == 40 and min(elapsed) >= 0.9
+
+
+def test_worker_serves_own_metrics():
+    """Воркер поднимает сервер метрик на своем порту: метрики обработчиков видны и при workers.py"""
+    async def scenario():
+        async with FakeTelegramAPI() as api:
+            router = Router()
+
+            @router.callback_query()
+            async def on_callback(callback):
+                await callback.answer()
+
+            app = types.ModuleType('worker_app')
+            app.dp, app.bot = Dispatcher(), Bot('42:TEST', session=api.session())
+            app.dp.include_router(router)
+            setup_metrics(app.dp)
+            sys.modules['worker_app'] = app
+            updates, port = queue.Queue(), _free_port()
+            updates.put(make_callback_update(1, 1001, 'daily_income'))
+            worker = asyncio.create_task(_worker_loop(1, updates, 'worker_app', port))
+            try:
+                async with aiohttp.ClientSession() as client:
+                    for _ in range(100):
+                        try:
+                            async with client.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                                text = await resp.text()
+                            if 'on_callback' in text:
+                                break
+                        except aiohttp.ClientConnectionError:
+                            pass
+                        await asyncio.sleep(0.02)
+                    else:
+                        raise AssertionError("метрики воркера недоступны")
+            finally:
+                updates.put(None)
+                await worker
+                del sys.modules['worker_app']
+            assert api.counts['answerCallbackQuery'] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+"""
+Проверка генератора синтетического мира
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from config import BUSINESS_TYPES
+from database import GameDatabase
+from worldgen import WorldSpec, generate_world
+
+
+def test_generate_world_counts_and_consistency():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'world.db')
+        counts = generate_world(path, WorldSpec(2000, seed=7), chunk_size=300)
+        conn = sqlite3.connect(path)
+        for table, count in counts.items():
+            assert conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] == count
+        assert counts['players'] == counts['pvp_profiles'] == 2000
+        assert 2000 <= counts['businesses'] <= 6000
+        # все ссылки указывают на существующие строки
+        assert conn.execute('SELECT COUNT(*) FROM businesses b LEFT JOIN players p ON p.user_id = b.user_id '
+                            'WHERE p.user_id IS NULL').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM reviews r LEFT JOIN businesses b ON b.id = r.business_id '
+                            'WHERE b.id IS NULL').fetchone()[0] == 0
+        types = {row[0] for row in conn.execute('SELECT DISTINCT business_type FROM businesses')}
+        assert types == set(BUSINESS_TYPES)
+        assert conn.execute('SELECT MIN(rating), MAX(rating) FROM reviews').fetchone() == (1, 5)
+        loan_user = conn.execute('SELECT user_id FROM loans LIMIT 1').fetchone()[0]
+        conn.close()
+
+        db = GameDatabase(path)
+        assert db.get_player(1500)['username'] == 'player1500'
+        assert db.get_player_businesses(1500)
+        assert len(db.get_top_players(10)) == 10
+        assert db.get_active_loans(loan_user)
+        # итоги зарплат сгенерированы согласованными с employees
+        assert db.check_payroll_totals() == {'businesses': 0, 'players': 0}
+
+
+def test_generate_world_is_deterministic_and_refuses_overwrite():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = os.path.join(tmp, 'a.db'), os.path.join(tmp, 'b.db')
+        assert generate_world(first, WorldSpec(300, seed=1)) == generate_world(second, WorldSpec(300, seed=1))
+        try:
+            generate_world(first, WorldSpec(10))
+        except FileExistsError:
+            pass
+        else:
+            raise AssertionError("существующий файл не должен перезаписываться")
@@ -0,0 +1,101 @@
+"""
+Словарное кодирование текстов посетителей и отзывов.
+
+Имена посетителей («Фамилия Имя Отчество») и тексты отзывов («шаблон» + «приписка»)
+собираются из небольших словарей AdvancedGameFeatures. В строках visitors и reviews
+хранятся только целые коды частей, сами строки — один раз в таблице text_codes
+(id, kind, text). Код — id строки словаря: он не зависит от порядка списков в
+коде и одинаков во всех процессах, новые строки добавляются INSERT OR IGNORE.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+from advanced_features import AdvancedGameFeatures, REVIEW_SUFFIXES
+
+NAME_KINDS = ('last', 'first', 'middle')
+# Приписки проверяются от длинных к коротким; пустая — последней
+_SUFFIXES = sorted((s for s in REVIEW_SUFFIXES if s), key=len, reverse=True)
+
+
+class TextDictionary:
+    """Коды строк text_codes с кэшем в памяти в обе стороны"""
+
+    def __init__(self):
+        self._codes: Dict[Tuple[str, str], int] = {}
+        self._texts: Dict[int, str] = {}
+
+    @staticmethod
+    def create_table(pizdabol: sqlite3.Cursor):
+        pizdabol.execute('''
+            CREATE TABLE IF NOT EXISTS text_codes (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                text TEXT NOT NULL,
+                UNIQUE (kind, text)
+            )
+        ''')
+
+    def seed(self, pizdabol: sqlite3.Cursor, features: Optional[AdvancedGameFeatures] = None):
+        """Внести словари генераторов и загрузить весь text_codes в кэш"""
+        features = features or AdvancedGameFeatures()
+        templates = (features.review_templates_positive + features.review_templates_neutral
+                     + features.review_templates_negative)
+        vocabulary = [('last', t) for t in features.last_names] + [('first', t) for t in features.first_names] \
+            + [('middle', t) for t in features.middle_names] + [('template', t) for t in templates] \
+            + [('suffix', t) for t in REVIEW_SUFFIXES]
+        pizdabol.executemany('INSERT OR IGNORE INTO text_codes (kind, text) VALUES (?, ?)', vocabulary)
+        pizdabol.execute('SELECT id, kind, text FROM text_codes')
+        for code, kind, text in pizdabol.fetchall():
+            self._codes[(kind, text)] = code
+            self._texts[code] = text
+
+    def encode(self, pizdabol: sqlite3.Cursor, kind: str, text: Optional[str]) -> Optional[int]:
+        if text is None:
+            return None
+        code = self._codes.get((kind, text))
+        if code is None:
+            pizdabol.execute('INSERT OR IGNORE INTO text_codes (kind, text) VALUES (?, ?)', (kind, text))
+            pizdabol.execute('SELECT id FROM text_codes WHERE kind = ? AND text = ?', (kind, text))
+            code = pizdabol.fetchone()[0]
+            self._codes[(kind, text)] = code
+            self._texts[code] = text
+        return code
+
+    def decode(self, pizdabol: sqlite3.Cursor, code: Optional[int]) -> Optional[str]:
+        if code is None:
+            return None
+        text = self._texts.get(code)
+        if text is None:
+            # Строка добавлена другим процессом
+            pizdabol.execute('SELECT text FROM text_codes WHERE id = ?', (code,))
+            row = pizdabol.fetchone()
+            text = row[0] if row else ''
+            self._texts[code] = text
+        return text
+
+    def encode_name(self, pizdabol: sqlite3.Cursor, name: Optional[str]) -> Tuple[Optional[int], ...]:
+        """(last, first, middle); имя не из трех слов целиком кодируется как last"""
+        if name is None:
+            return None, None, None
+        parts = name.split(' ')
+        if len(parts) != 3:
+            return self.encode(pizdabol, 'last', name), None, None
+        return tuple(self.encode(pizdabol, kind, part) for kind, part in zip(NAME_KINDS, parts))
+
+    def decode_name(self, pizdabol: sqlite3.Cursor, codes: Iterable[Optional[int]]) -> Optional[str]:
+        parts = [self.decode(pizdabol, code) for code in codes if code is not None]
+        return ' '.join(parts) if parts else None
+
+    def encode_review(self, pizdabol: sqlite3.Cursor, text: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+        """(template, suffix): текст делится на шаблон и известную приписку"""
+        if text is None:
+            return None, None
+        suffix = next((s for s in _SUFFIXES if text.endswith(s) and len(text) > len(s)), '')
+        return (self.encode(pizdabol, 'template', text[:len(text) - len(suffix)]),
+                self.encode(pizdabol, 'suffix', suffix))
+
+    def decode_review(self, pizdabol: sqlite3.Cursor, template: Optional[int], suffix: Optional[int]) -> Optional[str]:
+        if template is None:
+            return None
+        return self.decode(pizdabol, template) + (self.decode(pizdabol, suffix) or '')
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Пакетная симуляция посетителей для многих бизнесов сразу (NumPy).
+
+AdvancedGameFeatures.simulate_visitors строит посетителей по одному: имя, трата
+и отзыв на каждого. VisitorSimulator.simulate принимает массивы типов и
+популярности бизнесов и за один вызов возвращает массивы числа посетителей,
+трат и оценок — с тем же распределением, что у simulate_visitors. Имена и тексты
+отзывов создаются лениво, только для показываемых посетителей
+(VisitorBatch.materialize).
+
+Прогон по всем бизнесам базы: python visitor_sim.py --db game.db
+Нужен numpy (requirements-dev.txt).
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from advanced_features import AdvancedGameFeatures, DEFAULT_SPEND_RANGE, REVIEW_PROBABILITY, REVIEW_RATING_WEIGHTS, \
+    REVIEW_SUFFIXES, SPEND_RANGES
+
+
+class VisitorBatch:
+    """Посетители пачки бизнесов в плоских массивах.
+
+    counts[i] — посетителей бизнеса i, их строки — offsets[i]:offsets[i + 1] в массивах
+    business_index, spent и rating (0 — без отзыва).
+    """
+
+    def __init__(self, counts: np.ndarray, spent: np.ndarray, rating: np.ndarray,
+                 features: AdvancedGameFeatures, rng: random.Random):
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.business_index = np.repeat(np.arange(len(counts)), counts)
+        self.spent = spent
+        self.rating = rating
+        self._features = features
+        self._rng = rng
+
+    def __len__(self) -> int:
+        return len(self.spent)
+
+    def spent_per_business(self) -> np.ndarray:
+        return np.bincount(self.business_index, weights=self.spent, minlength=len(self.counts))
+
+    def reviews_per_business(self) -> np.ndarray:
+        return np.bincount(self.business_index, weights=self.rating > 0, minlength=len(self.counts)).astype(np.int64)
+
+    def materialize(self, index: int, limit: Optional[int] = None) -> List[Dict]:
+        """Посетители бизнеса index в формате simulate_visitors: {name, spent, review}"""
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        features, rng = self._features, self._rng
+        visitors = []
+        for spent, rating in zip(self.spent[start:end].tolist(), self.rating[start:end].tolist()):
+            name = f"{rng.choice(features.last_names)} {rng.choice(features.first_names)} {rng.choice(features.middle_names)}"
+            review = None
+            if rating:
+                if rating >= 4:
+                    text = rng.choice(features.review_templates_positive)
+                elif rating == 3:
+                    text = rng.choice(features.review_templates_neutral)
+                else:
+                    text = rng.choice(features.review_templates_negative)
+                review = {'rating': rating, 'text': text + rng.choice(REVIEW_SUFFIXES)}
+            visitors.append({'name': name, 'spent': spent, 'review': review})
+        return visitors
+
+
+class VisitorSimulator:
+    """Векторизованный аналог simulate_visitors для массивов бизнесов"""
+
+    def __init__(self, features: Optional[AdvancedGameFeatures] = None, seed: Optional[int] = None,
+                 max_visitors: int = 10):
+        self.features = features or AdvancedGameFeatures()
+        self.max_visitors = max_visitors
+        self.rng = np.random.default_rng(seed)
+        self._text_rng = random.Random(seed)
+        # Тип бизнеса -> код; последний код — диапазон трат по умолчанию
+        self.type_codes = {business_type: code for code, business_type in enumerate(SPEND_RANGES)}
+        ranges = list(SPEND_RANGES.values()) + [DEFAULT_SPEND_RANGE]
+        self._spend_low = np.array([low for low, _ in ranges], dtype=np.int64)
+        self._spend_high = np.array([high for _, high in ranges], dtype=np.int64)
+        weights = np.array(REVIEW_RATING_WEIGHTS, dtype=float)
+        self._rating_p = weights / weights.sum()
+
+    def encode_types(self, business_types: Sequence[str]) -> np.ndarray:
+        """Коды типов для simulate; неизвестные типы получают диапазон трат по умолчанию"""
+        values, inverse = np.unique(np.asarray(business_types, dtype=object), return_inverse=True)
+        lookup = np.array([self.type_codes.get(value, len(self.type_codes)) for value in values], dtype=np.int64)
+        return lookup[inverse.reshape(-1)]
+
+    def simulate(self, type_codes: np.ndarray, popularity: np.ndarray) -> VisitorBatch:
+        """Одна волна посетителей для бизнесов с кодами типов type_codes и популярностью popularity"""
+        type_codes = np.asarray(type_codes, dtype=np.int64)
+        popularity = np.asarray(popularity, dtype=float)
+        rng = self.rng
+        # Как в simulate_visitors: int(gauss(3 × популярность, 2)), ограничено 1..max_visitors
+        counts = np.clip(np.trunc(rng.normal(3 * popularity, 2)), 1, self.max_visitors).astype(np.int64)
+        codes = np.repeat(type_codes, counts)
+        spent = rng.integers(self._spend_low[codes], self._spend_high[codes], endpoint=True).astype(float)
+        total = len(codes)
+        rating = np.where(rng.random(total) < REVIEW_PROBABILITY,
+                          rng.choice(np.arange(1, 6, dtype=np.int8), size=total, p=self._rating_p),
+                          np.int8(0))
+        return VisitorBatch(counts, spent, rating, self.features, self._text_rng)
+
+    def simulate_businesses(self, businesses: Sequence[Dict]) -> VisitorBatch:
+        """simulate для списка словарей бизнесов (business_type, popularity)"""
+        return self.simulate(self.encode_types([b.get('business_type') for b in businesses]),
+                             [b.get('popularity', 1.0) for b in businesses])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='game.db', help='файл базы')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--rounds', type=int, default=1, help='волн посетителей')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    # Популярность бизнеса — популярность владельца
+    rows = conn.execute('''
+        SELECT b.business_type, COALESCE(p.popularity, 1.0)
+        FROM businesses b LEFT JOIN players p ON p.user_id = b.user_id
+    ''').fetchall()
+    conn.close()
+    simulator = VisitorSimulator(seed=args.seed)
+    type_codes = simulator.encode_types([row[0] for row in rows])
+    popularity = np.array([row[1] for row in rows], dtype=float)
+
+    started = time.perf_counter()
+    visitors, spent, reviews = 0, 0.0, 0
+    for _ in range(args.rounds):
+        batch = simulator.simulate(type_codes, popularity)
+        visitors += len(batch)
+        spent += float(batch.spent.sum())
+        reviews += int((batch.rating > 0).sum())
+    elapsed = time.perf_counter() - started
+    print(f"Бизнесов: {len(rows):,}, волн: {args.rounds}")
+    print(f"Посетителей: {visitors:,}, траты: {spent:,.0f} ₽, отзывов: {reviews:,}")
+    print(f"Время: {elapsed:.2f} с ({visitors / elapsed if elapsed else 0:,.0f} посетителей/с)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Запуск бота: long polling или webhook на aiohttp.
+
+Режим выбирается через BOT_MODE (polling | webhook). В режиме webhook поднимается
+aiohttp-приложение с маршрутом WEBHOOK_PATH (проверка секрета из заголовка
+X-Telegram-Bot-Api-Secret-Token) и эндпоинтом здоровья HEALTH_PATH.
+
+Модуль общий для игрового бота (bot.py) и админ-бота (src/main.py).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from metrics import add_metrics_route, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+
+def make_session(api_url: str = '') -> Optional[AiohttpSession]:
+    """Сессия для альтернативного Bot API (локальный сервер, фейковый API). None — стандартный api.telegram.org"""
+    if not api_url:
+        return None
+    return AiohttpSession(api=TelegramAPIServer.from_base(api_url.rstrip('/')))
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str = '/webhook', secret: str = '',
+                      health_path: str = '/health', base_url: str = '', metrics_path: str = '') -> web.Application:
+    """Создание aiohttp-приложения с webhook-обработчиком и health-эндпоинтом.
+
+    Если задан base_url, при старте регистрирует webhook {base_url}{path} в Telegram.
+    Если задан metrics_path, на нем отдаются метрики Prometheus.
+    """
+    app = web.Application()
+    started_at = time.time()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'mode': 'webhook', 'uptime': round(time.time() - started_at, 1)})
+
+    app.router.add_get(health_path, health)
+    if metrics_path:
+        add_metrics_route(app, metrics_path)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret or None).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+
+    if base_url:
+        async def on_startup(bot: Bot):
+            await bot.set_webhook(
+                f"{base_url.rstrip('/')}{path}",
+                secret_token=secret or None,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"Webhook зарегистрирован: {base_url.rstrip('/')}{path}")
+        dp.startup.register(on_startup)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, host: str = '0.0.0.0', port: int = 8080,
+                      path: str = '/webhook', secret: str = '', health_path: str = '/health',
+                      base_url: str = '', metrics_path: str = ''):
+    """Запуск aiohttp-сервера и ожидание до отмены задачи"""
+    app = build_webhook_app(dp, bot, path=path, secret=secret, health_path=health_path, base_url=base_url,
+                            metrics_path=metrics_path)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает {host}:{port}{path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, host: str = '127.0.0.1', port: int = 9100,
+                      health_path: str = '/health', metrics_path: str = '', **kwargs):
+    """Long polling; ранее зарегистрированный webhook снимается, иначе getUpdates вернет конфликт.
+
+    Если задан metrics_path, рядом поднимается HTTP-сервер с метриками и health-эндпоинтом на host:port.
+    """
+    runner = await start_metrics_server(host, port, metrics_path, health_path) if metrics_path else None
+    try:
+        await bot.delete_webhook(drop_pending_updates=False)
+        await dp.start_polling(bot, **kwargs)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+async def run_bot(dp: Dispatcher, bot: Bot, mode: str = 'polling', metrics_host: str = '127.0.0.1',
+                  metrics_port: int = 9100, **webhook_kwargs):
+    """Запуск в выбранном режиме: polling | webhook.
+
+    В режиме webhook метрики отдает webhook-сервер. В режиме polling из webhook_kwargs
+    используются только health_path и metrics_path: сервер метрик слушает metrics_host:metrics_port.
+    """
+    if mode == 'webhook':
+        await run_webhook(dp, bot, **webhook_kwargs)
+    elif mode == 'polling':
+        await run_polling(dp, bot, host=metrics_host, port=metrics_port,
+                          **{key: value for key, value in webhook_kwargs.items()
+                             if key in ('health_path', 'metrics_path')})
+    else:
+        raise ValueError(f"Неизвестный режим запуска: {mode}")
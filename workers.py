@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Запуск нескольких процессов-воркеров бота.
+
+Главный процесс получает обновления (long polling или webhook) и раскладывает их
+по воркерам по user_id: все нажатия одного игрока обрабатывает один и тот же
+процесс. Записи разных воркеров в game.db при этом пересекаются: PvP-бой меняет
+баланс и рейтинг соперника, которого ведет другой воркер, а задачи планировщика
+выполняет любой из них. Поэтому запись, наткнувшаяся на занятую базу, повторяется
+(pvp_queue, scheduler), а индекс подбора PvP периодически перестраивается из базы
+(matchmaking). FSM-состояния
+лежат в общем хранилище (FSM_STORAGE=sqlite:///fsm.db), поэтому переживают
+перезапуск и изменение числа воркеров.
+
+Лимит исходящих сообщений OUTBOUND_GLOBAL_RATE задан на весь бот: каждый воркер
+получает BOT_WORKERS (число воркеров) в окружении и ограничивает себя своей долей.
+
+Метрики у каждого воркера свои: воркер i отдает METRICS_PATH на
+METRICS_HOST:METRICS_PORT+i (--metrics-port 0 — не поднимать серверы метрик).
+
+Пример: FSM_STORAGE=sqlite:///fsm.db python workers.py --workers 4
+"""
+
+import argparse
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.methods import GetUpdates
+
+from config import (BOT_TOKEN, BOT_MODE, FSM_STORAGE, TELEGRAM_API_URL, WEBAPP_HOST, WEBAPP_PORT,
+                    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, HEALTH_PATH, METRICS_HOST, METRICS_PATH,
+                    METRICS_PORT)
+from metrics import start_metrics_server
+from webhook import make_session
+
+logger = logging.getLogger(__name__)
+
+# Поля Update, в которых лежит объект с отправителем ('from') или пользователем ('user')
+UPDATE_USER_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'message_reaction', 'business_message', 'edited_business_message',
+)
+
+
+def extract_user_id(update: Dict) -> Optional[int]:
+    """user_id инициатора обновления (для каналов и опросов без автора — id чата или None)"""
+    for field in UPDATE_USER_FIELDS:
+        obj = update.get(field)
+        if not obj:
+            continue
+        user = obj.get('from') or obj.get('user')
+        if user and 'id' in user:
+            return int(user['id'])
+        chat = obj.get('chat') or (obj.get('message') or {}).get('chat')
+        if chat and 'id' in chat:
+            return int(chat['id'])
+    return None
+
+
+def partition_for(update: Dict, workers: int) -> int:
+    """Номер воркера для обновления; обновления без пользователя идут в нулевой"""
+    user_id = extract_user_id(update)
+    return user_id % workers if user_id is not None else 0
+
+
+# ------------------- Воркер -------------------
+def worker_main(index: int, queue, app_module: str, metrics_port: int = 0):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(_worker_loop(index, queue, app_module, metrics_port))
+
+
+async def _worker_loop(index: int, queue, app_module: str, metrics_port: int = 0):
+    # Модуль приложения должен предоставлять dp (Dispatcher) и bot (Bot), как bot.py
+    app = importlib.import_module(app_module)
+    dp, bot = app.dp, app.bot
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    # Реестр метрик у процесса свой: воркер отдает их на собственном порту
+    metrics = None
+    if metrics_port:
+        metrics = await start_metrics_server(METRICS_HOST, metrics_port, METRICS_PATH, HEALTH_PATH)
+        logger.info(f"Метрики воркера {index}: {METRICS_HOST}:{metrics_port}{METRICS_PATH}")
+    logger.info(f"Воркер {index} запущен")
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            task = asyncio.create_task(dp.feed_raw_update(bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if metrics is not None:
+            await metrics.cleanup()
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await bot.session.close()
+        logger.info(f"Воркер {index} остановлен")
+
+
+class WorkerPool:
+    """Набор процессов-воркеров с очередью на каждый"""
+
+    def __init__(self, workers: int, app_module: str = 'bot', queue_size: int = 10000,
+                 metrics_port: int = METRICS_PORT):
+        if workers < 1:
+            raise ValueError("Нужен хотя бы один воркер")
+        self.workers = workers
+        self.app_module = app_module
+        self.queue_size = queue_size
+        # Порт метрик воркера i — metrics_port + i; 0 — без серверов метрик
+        self.metrics_port = metrics_port if METRICS_PATH else 0
+        self.queues: List = []
+        self.processes: List[multiprocessing.Process] = []
+        self.dispatched = [0] * workers
+
+    def start(self):
+        # spawn: дочерний процесс стартует с чистым интерпретатором, без унаследованного event loop
+        ctx = multiprocessing.get_context('spawn')
+        # Воркеры наследуют окружение: config делит OUTBOUND_GLOBAL_RATE на их число
+        os.environ['BOT_WORKERS'] = str(self.workers)
+        for index in range(self.workers):
+            queue = ctx.Queue(self.queue_size)
+            process = ctx.Process(target=worker_main, args=(index, queue, self.app_module, self.metrics_port_of(index)),
+                                  name=f"bot-worker-{index}", daemon=True)
+            process.start()
+            self.queues.append(queue)
+            self.processes.append(process)
+
+    def metrics_port_of(self, index: int) -> int:
+        return self.metrics_port + index if self.metrics_port else 0
+
+    async def dispatch(self, update: Dict):
+        """Передать сырое обновление воркеру; при заполненной очереди ждет (backpressure)"""
+        index = partition_for(update, self.workers)
+        self.dispatched[index] += 1
+        await asyncio.get_running_loop().run_in_executor(None, self.queues[index].put, update)
+
+    def stop(self, timeout: float = 30.0):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+# ------------------- Источники обновлений -------------------
+async def poll_into(pool: WorkerPool, bot: Bot, polling_timeout: int = 30):
+    """Long polling в главном процессе с раздачей обновлений воркерам"""
+    await bot.delete_webhook(drop_pending_updates=False)
+    offset = None
+    while True:
+        try:
+            updates = await bot(GetUpdates(offset=offset, timeout=polling_timeout),
+                                request_timeout=int(bot.session.timeout + polling_timeout))
+        except Exception as e:
+            logger.error(f"Ошибка getUpdates: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await pool.dispatch(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+def build_router_app(pool: WorkerPool, path: str, secret: str = '', health_path: str = '/health') -> web.Application:
+    """aiohttp-приложение, принимающее webhook и раздающее обновления воркерам"""
+    app = web.Application()
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token', '') != secret:
+            return web.Response(body='Unauthorized', status=401)
+        await pool.dispatch(await request.json())
+        return web.json_response({})
+
+    async def health(request: web.Request) -> web.Response:
+        alive = [p.is_alive() for p in pool.processes]
+        return web.json_response({'status': 'ok' if all(alive) else 'degraded', 'workers': alive,
+                                  'dispatched': pool.dispatched,
+                                  'metrics_ports': [pool.metrics_port_of(i) for i in range(pool.workers)]},
+                                 status=200 if all(alive) else 503)
+
+    app.router.add_post(path, handle)
+    app.router.add_get(health_path, health)
+    return app
+
+
+async def serve(pool: WorkerPool, mode: str):
+    bot = Bot(token=BOT_TOKEN, session=make_session(TELEGRAM_API_URL))
+    try:
+        if mode == 'webhook':
+            runner = web.AppRunner(build_router_app(pool, WEBHOOK_PATH, WEBHOOK_SECRET, HEALTH_PATH), access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+            if WEBHOOK_BASE_URL:
+                await bot.set_webhook(f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None)
+            logger.info(f"Webhook-маршрутизатор слушает {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+        else:
+            await poll_into(pool, bot)
+    finally:
+        await bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count()), help='число процессов')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default=BOT_MODE, help='источник обновлений')
+    parser.add_argument('--app', default='bot', help='модуль с dp и bot (по умолчанию bot.py)')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help='порт метрик первого воркера, у остальных следующие (0 — без метрик)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if FSM_STORAGE.strip().lower() == 'memory' and args.workers > 1:
+        logger.warning("FSM_STORAGE=memory: состояния не переживут перезапуск или смену числа воркеров; "
+                       "используйте FSM_STORAGE=sqlite:///fsm.db")
+    pool = WorkerPool(args.workers, app_module=args.app, metrics_port=args.metrics_port)
+    pool.start()
+    try:
+        asyncio.run(serve(pool, args.mode))
+    except KeyboardInterrupt:
+        logger.info("Остановка воркеров...")
+    finally:
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
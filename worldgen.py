@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетического мира для больших тестовых баз GameDatabase.
+
+Создает файл базы со схемой GameDatabase и заполняет его игроками, бизнесами
+(типы по распределению WORLD_BUSINESS_WEIGHTS), сотрудниками, отзывами, кредитами,
+инвестициями, PvP-профилями и историей боев. Строки генерируются порциями и
+вставляются executemany в одной транзакции с synchronous=OFF и без журнала,
+поэтому 1M игроков создаются меньше чем за минуту. Прерванная генерация оставляет
+испорченный файл — его нужно пересоздать.
+
+Пример: python worldgen.py bench.db --players 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from advanced_features import AdvancedGameFeatures
+from config import BUSINESS_TYPES
+from database import GameDatabase
+from text_codes import TextDictionary
+
+# Доля типов бизнеса: чем рискованнее, тем реже
+RISK_WEIGHTS = {'low': 4, 'medium': 3, 'high': 2, 'very_high': 1}
+WORLD_BUSINESS_WEIGHTS = {key: RISK_WEIGHTS.get(info['risk_level'], 1) for key, info in BUSINESS_TYPES.items()}
+EMPLOYEE_ROLES = ["Официант", "Бариста", "Менеджер", "Разработчик", "Рабочий", "Кассир"]
+INVESTMENT_STRATEGIES = {'conservative': (0.02, 1.05), 'balanced': (0.05, 1.12), 'aggressive': (0.10, 1.25)}
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class WorldSpec:
+    """Параметры мира: средние количества на игрока / бизнес"""
+
+    def __init__(self, players: int, businesses_per_player: Tuple[int, int] = (1, 3),
+                 employees_per_business: float = 1.0, reviews_per_business: float = 1.5,
+                 loans_per_player: float = 0.2, investments_per_player: float = 0.2,
+                 matches_per_player: float = 0.5, seed: int = 42):
+        self.players = players
+        self.businesses_per_player = businesses_per_player
+        self.employees_per_business = employees_per_business
+        self.reviews_per_business = reviews_per_business
+        self.loans_per_player = loans_per_player
+        self.investments_per_player = investments_per_player
+        self.matches_per_player = matches_per_player
+        self.seed = seed
+
+
+def _count(rng: random.Random, mean: float) -> int:
+    """Случайное целое со средним mean (целая часть + вероятность остатка)"""
+    whole = int(mean)
+    return whole + (rng.random() < mean - whole)
+
+
+def _chunks(iterator: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class WorldGenerator:
+    """Генерация строк по таблицам; id бизнесов назначаются явно, чтобы не читать их из базы"""
+
+    def __init__(self, spec: WorldSpec, now: Optional[datetime] = None):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.now = now or datetime.now()
+        features = AdvancedGameFeatures()
+        name_rng = random.Random(spec.seed + 1)
+        # Пулы готовых строк: выбор из списка дешевле генерации каждой строки
+        self.full_names = [f"{name_rng.choice(features.last_names)} {name_rng.choice(features.first_names)} "
+                           f"{name_rng.choice(features.middle_names)}" for _ in range(4096)]
+        # Пул (рейтинг, текст) с тем же распределением оценок, что и generate_review
+        self.review_ratings, self.review_texts = [], []
+        for rating, weight in zip(range(1, 6), (8, 10, 20, 30, 32)):
+            templates = (features.review_templates_positive if rating >= 4 else
+                         features.review_templates_neutral if rating == 3 else features.review_templates_negative)
+            for i in range(weight * 4):
+                self.review_ratings.append(rating)
+                self.review_texts.append(templates[i % len(templates)])
+        self.business_types = list(WORLD_BUSINESS_WEIGHTS)
+        self.business_cum_weights = []
+        total = 0
+        for key in self.business_types:
+            total += WORLD_BUSINESS_WEIGHTS[key]
+            self.business_cum_weights.append(total)
+        self.timestamps = [(self.now - timedelta(minutes=m)).strftime(TIME_FORMAT) for m in range(0, 60 * 24 * 30, 7)]
+        self.days_ago = [(self.now - timedelta(days=d)).strftime(TIME_FORMAT) for d in range(31)]
+        self.days_ahead = [(self.now + timedelta(days=d)).strftime(TIME_FORMAT) for d in range(31)]
+        self.next_business_id = 1
+        # Коды text_codes для строк пулов (encode_texts); строки отзывов хранятся кодами
+        self.name_codes: List[Tuple] = []
+        self.review_codes: List[Tuple] = []
+
+    def encode_texts(self, codes: TextDictionary, pizdabol: sqlite3.Cursor):
+        """Закодировать пулы имен и текстов отзывов словарем базы"""
+        self.name_codes = [codes.encode_name(pizdabol, name) for name in self.full_names]
+        self.review_codes = [codes.encode_review(pizdabol, text) for text in self.review_texts]
+
+    def _timestamp(self) -> str:
+        return self.timestamps[int(self.rng.random() * len(self.timestamps))]
+
+    def player_chunk(self, first_id: int, last_id: int) -> Dict[str, List[tuple]]:
+        """Строки всех таблиц для игроков first_id..last_id включительно"""
+        rng, spec = self.rng, self.spec
+        random_ = rng.random
+        rows: Dict[str, List[tuple]] = {name: [] for name in
+                                        ('players', 'businesses', 'employees', 'reviews', 'loans', 'investments', 'pvp_profiles')}
+        players, businesses, employees, reviews = rows['players'], rows['businesses'], rows['employees'], rows['reviews']
+        low, high = spec.businesses_per_player
+        business_types = rng.choices(self.business_types, cum_weights=self.business_cum_weights,
+                                     k=(last_id - first_id + 1) * high)
+        type_index = 0
+        names, n_names = self.full_names, len(self.full_names)
+        timestamps, n_timestamps = self.timestamps, len(self.timestamps)
+        roles, n_roles = EMPLOYEE_ROLES, len(EMPLOYEE_ROLES)
+        review_ratings, review_codes, name_codes = self.review_ratings, self.review_codes, self.name_codes
+        span = high - low + 1
+        employees_whole, employees_frac = divmod(spec.employees_per_business, 1)
+        reviews_whole, reviews_frac = divmod(spec.reviews_per_business, 1)
+        for user_id in range(first_id, last_id + 1):
+            level = 1 + int(random_() ** 2 * 30)
+            created = timestamps[int(random_() * n_timestamps)]
+            player = [user_id, f'player{user_id}', f'Player{user_id}',
+                      float(10000 + int(random_() ** 3 * 2_000_000)), level,
+                      int(random_() * 1000 * level), 0.5 + int(random_() * 1500) / 1000, created, created, 0.0, 0]
+            # Сумма трех равномерных — дешевое приближение нормального рейтинга около 1000
+            rows['pvp_profiles'].append((user_id, float(int(700 + (random_() + random_() + random_()) * 200)),
+                                         int(random_() * 40), int(random_() * 40)))
+            for _ in range(low + int(random_() * span)):
+                business_type = business_types[type_index]
+                type_index += 1
+                info = BUSINESS_TYPES[business_type]
+                business_id = self.next_business_id
+                self.next_business_id += 1
+                business_level = 1 + int(random_() * min(level, 10))
+                # Итоги зарплат бизнеса и игрока считаются сразу, как их ведет add_employee
+                payroll, headcount = 0.0, 0
+                for _ in range(int(employees_whole) + (random_() < employees_frac)):
+                    salary = float(int(20000 + random_() * 60000))
+                    employees.append((business_id, names[int(random_() * n_names)], roles[int(random_() * n_roles)],
+                                      salary, 0.8 + int(random_() * 50) / 100))
+                    payroll += salary
+                    headcount += 1
+                businesses.append((business_id, user_id, business_type, info['name'],
+                                   info['base_income'] * (1 + 0.2 * (business_level - 1)),
+                                   info['base_expenses'] * (1 + 0.1 * (business_level - 1)),
+                                   business_level, created, payroll, headcount))
+                player[9] += payroll
+                player[10] += headcount
+                for _ in range(int(reviews_whole) + (random_() < reviews_frac)):
+                    index = int(random_() * len(review_ratings))
+                    reviews.append((business_id, *name_codes[int(random_() * n_names)], review_ratings[index],
+                                    *review_codes[index], timestamps[int(random_() * n_timestamps)]))
+            players.append(tuple(player))
+            for _ in range(_count(rng, spec.loans_per_player)):
+                amount = float(int(10000 + random_() * 200000))
+                term = (7, 14, 30)[int(random_() * 3)]
+                issued = int(random_() * term)
+                rows['loans'].append((user_id, amount, 0.05, term, self.days_ago[issued],
+                                      self.days_ahead[term - issued], amount, self.days_ago[issued]))
+            for _ in range(_count(rng, spec.investments_per_player)):
+                strategy = ('conservative', 'balanced', 'aggressive')[int(random_() * 3)]
+                volatility, multiplier = INVESTMENT_STRATEGIES[strategy]
+                amount = float(int(5000 + random_() * 100000))
+                rows['investments'].append((user_id, strategy, amount, amount * multiplier,
+                                            self.days_ahead[1 + int(random_() * 7)], amount, volatility))
+        return rows
+
+    def matches(self) -> Iterator[tuple]:
+        """История PvP-боев между случайными игроками"""
+        rng, players = self.rng, self.spec.players
+        random_ = rng.random
+        for _ in range(int(players * self.spec.matches_per_player)):
+            challenger = 1 + int(random_() * players)
+            opponent = 1 + int(random_() * players)
+            if opponent == challenger:
+                opponent = opponent % players + 1
+            power1, power2 = round(50 + random_() * 150, 2), round(50 + random_() * 150, 2)
+            roll = random_()
+            if roll < 0.05 or players == 1:
+                winner, loser, outcome = None, None, 'draw'
+            elif power1 * (0.85 + roll * 0.3) >= power2:
+                winner, loser, outcome = challenger, opponent, 'win'
+            else:
+                winner, loser, outcome = opponent, challenger, 'loss'
+            yield (challenger, opponent, winner, loser, float(int(1000 + random_() * 9000)), power1, power2,
+                   outcome, self._timestamp())
+
+
+INSERTS = {
+    'players': 'INSERT INTO players (user_id, username, first_name, balance, level, experience, popularity, '
+               'created_at, last_active, payroll_total, headcount) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'businesses': 'INSERT INTO businesses (id, user_id, business_type, name, income, expenses, level, created_at, '
+                  'payroll_total, headcount) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'employees': 'INSERT INTO employees (business_id, full_name, role, salary, performance) VALUES (?, ?, ?, ?, ?)',
+    'reviews': 'INSERT INTO reviews (business_id, name_last, name_first, name_middle, rating, template_id, suffix_id, '
+               'created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+    'loans': "INSERT INTO loans (user_id, amount, interest_rate, term_days, issued_at, due_date, remaining, status, "
+             "last_interest_update, penalty_rate, overdue) VALUES (?, ?, ?, ?, ?, ?, ?, 'active', ?, 0.01, 0)",
+    'investments': "INSERT INTO investments (user_id, strategy, amount, expected_return, matures_at, status, "
+                   "current_value, volatility, last_price_update) VALUES (?, ?, ?, ?, ?, 'active', ?, ?, CURRENT_TIMESTAMP)",
+    'pvp_profiles': 'INSERT INTO pvp_profiles (user_id, rating, wins, losses) VALUES (?, ?, ?, ?)',
+    'pvp_matches': 'INSERT INTO pvp_matches (challenger_id, opponent_id, winner_id, loser_id, bet, challenger_power, '
+                   'opponent_power, outcome, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+}
+
+
+def generate_world(path: str, spec: WorldSpec, chunk_size: int = 20000,
+                   progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """Создание базы path (файла еще не должно быть); возвращает число строк по таблицам"""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} уже существует")
+    db = GameDatabase(path)  # схема и миграции — как у бота
+    generator = WorldGenerator(spec)
+    counts = {table: 0 for table in INSERTS}
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    generator.encode_texts(db.text_codes, conn.cursor())
+    # Только на время загрузки: без журнала и fsync, большой кэш страниц
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    try:
+        conn.execute('BEGIN')
+        for first_id in range(1, spec.players + 1, chunk_size):
+            last_id = min(spec.players, first_id + chunk_size - 1)
+            for table, rows in generator.player_chunk(first_id, last_id).items():
+                conn.executemany(INSERTS[table], rows)
+                counts[table] += len(rows)
+            if progress:
+                progress(last_id, spec.players)
+        for rows in _chunks(generator.matches(), chunk_size):
+            conn.executemany(INSERTS['pvp_matches'], rows)
+            counts['pvp_matches'] += len(rows)
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='файл создаваемой базы')
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--businesses', default='1-3', help='бизнесов на игрока: min-max')
+    parser.add_argument('--employees', type=float, default=1.0, help='сотрудников на бизнес (в среднем)')
+    parser.add_argument('--reviews', type=float, default=1.5, help='отзывов на бизнес (в среднем)')
+    parser.add_argument('--loans', type=float, default=0.2, help='кредитов на игрока (в среднем)')
+    parser.add_argument('--investments', type=float, default=0.2, help='инвестиций на игрока (в среднем)')
+    parser.add_argument('--matches', type=float, default=0.5, help='PvP-боев на игрока (в среднем)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help='перезаписать существующий файл')
+    args = parser.parse_args()
+
+    low, _, high = args.businesses.partition('-')
+    spec = WorldSpec(args.players, (int(low), int(high or low)), args.employees, args.reviews,
+                     args.loans, args.investments, args.matches, args.seed)
+    if args.force and os.path.exists(args.path):
+        os.remove(args.path)
+
+    started = time.perf_counter()
+
+    def progress(done: int, total: int):
+        print(f"\r{done:,}/{total:,} игроков, {time.perf_counter() - started:.1f} с", end='', file=sys.stderr)
+
+    counts = generate_world(args.path, spec, progress=progress)
+    print(file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"{table:<14}{count:>12,}")
+    print(f"Готово за {elapsed:.1f} с: {args.path} ({os.path.getsize(args.path) / 2 ** 20:.0f} МБ)")
+
+
+if __name__ == '__main__':
+    main()